@@ -0,0 +1,177 @@
+"""
+Chunk texts in Qdrant payloads vs the external compressed chunk store.
+
+Loads the same chunks (random vectors, text with a Zipf word distribution)
+through `RAGPipeline.write_vectors` once with texts in the payload and once
+with CHUNK_STORE_DIR set, each in a fresh process, then runs the same
+`retrieve` queries against both. Reports:
+
+- payload bytes held by Qdrant (JSON size of all payloads)
+- RAM: Qdrant's resident memory growth with `--url`, otherwise this
+  process's RSS growth (local mode keeps points in Python objects, and
+  freed text memory isn't necessarily returned to the OS, so prefer `--url`)
+- bytes per search response, `retrieve` p50/p99 and the p50 of its search
+  and text fetch stages
+- chunk store size on disk and compression ratio
+
+    python app/benchmarks/bench_chunk_store.py --points 50000
+    python app/benchmarks/bench_chunk_store.py --url http://localhost:6333 --points 200000
+"""
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+import numpy as np
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from common import make_vectors, percentile
+from metrics import collect_timings
+
+def make_vocabulary(size: int = 20000, seed: int = 0) -> list:
+    letters = random.Random(seed)
+    return [
+        "".join(letters.choice("etaoinshrdlucmfwypvbgkqjxz") for _ in range(letters.randint(2, 10)))
+        for _ in range(size)
+    ]
+
+def make_texts(vocabulary: list, start: int, count: int, words: int) -> list:
+    """Chunk texts whose word frequencies follow Zipf's law, like natural language."""
+    ranks = np.minimum(np.random.default_rng(start).zipf(1.2, size=(count, words)), len(vocabulary)) - 1
+    return [" ".join(vocabulary[rank] for rank in row) + f". Reference {start + i}." for i, row in enumerate(ranks)]
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def qdrant_resident_bytes(url: str):
+    """Qdrant's own resident memory from its /metrics endpoint, if it reports it."""
+    for line in httpx.get(f"{url}/metrics").text.splitlines():
+        if line.startswith("memory_resident_bytes"):
+            return float(line.split()[-1])
+    return None
+
+class QueryVectors:
+    """Embeddings stand-in: query "i" is the i-th precomputed query vector."""
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def get_embedding(self, text: str):
+        return self.vectors[int(text)].tolist()
+
+def run_mode(args) -> dict:
+    from rag import RAGPipeline
+
+    store_dir = None
+    if args.mode == "store":
+        store_dir = tempfile.mkdtemp(prefix="bench_chunk_store_")
+        os.environ["CHUNK_STORE_DIR"] = store_dir
+    client = QdrantClient(":memory:") if args.url == ":memory:" else QdrantClient(url=args.url)
+    collection = f"bench_chunk_store_{args.mode}"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+
+    vectors = make_vectors(args.points, args.dim)
+    queries = make_vectors(args.queries, args.dim, seed=1)
+    vocabulary = make_vocabulary()
+    pipeline = RAGPipeline(client=client, embeddings=QueryVectors(queries))
+    pipeline.lexical_enabled = False
+    pipeline.create_collection_if_not_exists(collection, dim=args.dim)
+
+    rss_before = rss_bytes()
+    server_before = qdrant_resident_bytes(args.url) if args.url != ":memory:" else None
+    started = time.perf_counter()
+    text_bytes = 0
+    # Texts are generated per batch so only the payloads (or the store) keep them alive
+    for start in range(0, args.points, args.batch_size):
+        texts = make_texts(vocabulary, start, min(args.batch_size, args.points - start), args.words)
+        text_bytes += sum(len(text.encode()) for text in texts)
+        docs = [
+            {"id": start + i, "text": text, "tenant": "bench", "doc_id": f"doc-{(start + i) // 10}", "chunk_index": (start + i) % 10}
+            for i, text in enumerate(texts)
+        ]
+        pipeline.write_vectors(collection, docs, vectors[start:start + args.batch_size], batch_size=256)
+    load_seconds = time.perf_counter() - started
+    del texts, docs
+    gc.collect()
+    if server_before is not None:
+        time.sleep(2)
+        ram_mb = (qdrant_resident_bytes(args.url) - server_before) / 2**20
+    else:
+        ram_mb = (rss_bytes() - rss_before) / 2**20
+
+    payload_bytes, offset = 0, None
+    while True:
+        records, offset = client.scroll(collection, limit=1000, offset=offset, with_payload=True)
+        payload_bytes += sum(len(json.dumps(record.payload)) for record in records)
+        if offset is None:
+            break
+
+    response_bytes, latencies, searches, fetches = [], [], [], []
+    for i in range(args.queries):
+        response = client.query_points(
+            collection, query=queries[i], limit=args.top_k, with_payload=not pipeline.external_texts
+        )
+        response_bytes.append(len(response.model_dump_json()))
+        with collect_timings() as timings:
+            pipeline.retrieve(collection, str(i), top_k=args.top_k)
+        latencies.append(timings["total"])
+        searches.append(timings["search"])
+        fetches.append(timings.get("chunk_fetch", 0.0) + timings.get("fetch", 0.0))
+
+    row = {
+        "mode": args.mode,
+        "points": args.points,
+        "text_mb": round(text_bytes / 2**20, 1),
+        "payload_mb": round(payload_bytes / 2**20, 1),
+        "ram_mb": round(ram_mb, 1),
+        "response_bytes": int(np.mean(response_bytes)),
+        "retrieve_p50_ms": round(percentile(latencies, 50), 2),
+        "retrieve_p99_ms": round(percentile(latencies, 99), 2),
+        "search_p50_ms": round(percentile(searches, 50), 2),
+        # Chunk store read (plus Qdrant fallback fetch); 0 when texts come with the search response
+        "text_fetch_p50_ms": round(percentile(fetches, 50), 3),
+        "load_seconds": round(load_seconds, 1),
+    }
+    if store_dir is not None:
+        stats = pipeline.chunk_store(collection).stats()
+        row["store_disk_mb"] = round((stats["file_bytes"] + os.path.getsize(os.path.join(store_dir, collection, "index.db"))) / 2**20, 1)
+        row["compression_ratio"] = round(stats["compression_ratio"], 2)
+        shutil.rmtree(store_dir, ignore_errors=True)
+    client.delete_collection(collection)
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=":memory:", help="Qdrant URL, or :memory: for local mode")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--words", type=int, default=150, help="words per chunk (~1 KB of text)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256, help="points per write, as in ingestion")
+    parser.add_argument("--mode", choices=["payload", "store"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        print(json.dumps(run_mode(args)))
+        return
+    # Each mode in its own process, so RSS growth isn't muddied by the other run
+    results = []
+    for mode in ("payload", "store"):
+        output = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--mode", mode], check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
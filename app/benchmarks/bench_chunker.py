@@ -0,0 +1,77 @@
+"""
+Chunker throughput and memory on large streamed inputs.
+
+Generates `--mb` megabytes of synthetic prose as 1 MB segments (never held in
+memory at once) and runs the fixed-window and the sentence chunkers over it.
+Reports MB/s, chunks produced and the peak RSS growth, which should stay flat
+as `--mb` grows.
+
+    python app/benchmarks/bench_chunker.py --mb 300
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ingestion import chunk_sentences, chunk_stream
+
+WORDS = "vector database embedding retrieval chunk query latency throughput index payload".split()
+SEGMENT_SIZE = 1024 * 1024
+
+def iter_segments(total_mb: int, seed: int = 0):
+    """Yield ~1 MB pieces of sentences and paragraphs; segment breaks fall mid-sentence."""
+    rng = random.Random(seed)
+    # A pool of paragraphs sampled at random keeps generation cheap relative to chunking
+    paragraphs = []
+    for _ in range(64):
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+                     for _ in range(rng.randint(2, 10))]
+        paragraphs.append(" ".join(sentences) + "\n\n")
+    buffer = ""
+    emitted = 0
+    while emitted < total_mb:
+        while len(buffer) < SEGMENT_SIZE:
+            buffer += rng.choice(paragraphs)
+        yield buffer[:SEGMENT_SIZE]
+        buffer = buffer[SEGMENT_SIZE:]
+        emitted += 1
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=200)
+    parser.add_argument("--chunk-tokens", type=int, default=128)
+    parser.add_argument("--overlap-tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    chunkers = {
+        "fixed": lambda segments: chunk_stream(segments),
+        "sentence": lambda segments: chunk_sentences(segments, args.chunk_tokens, args.overlap_tokens),
+    }
+    results = []
+    for name, chunker in chunkers.items():
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        chunks = 0
+        for _ in chunker(iter_segments(args.mb)):
+            chunks += 1
+        elapsed = time.perf_counter() - started
+        results.append({
+            "chunker": name,
+            "mb": args.mb,
+            "chunks": chunks,
+            "seconds": round(elapsed, 2),
+            "mb_per_sec": round(args.mb / elapsed, 1),
+            "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+        })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
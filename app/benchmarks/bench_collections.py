@@ -0,0 +1,94 @@
+"""
+Collection profiles compared: recall@k vs latency vs memory.
+
+Loads the same clustered random vectors into one collection per profile,
+waits for indexing, then runs the same queries against each. Recall is
+measured against exact NumPy cosine search; memory is the profile's
+estimate for vectors + HNSW links resident in RAM.
+
+Local mode (`--url :memory:`, the default) is a brute-force Python engine
+that ignores HNSW and quantization settings, so it only checks that the
+profiles work end to end. Point `--url` at a real Qdrant for numbers:
+
+    docker run -p 6333:6333 qdrant/qdrant
+    python app/benchmarks/bench_collections.py --url http://localhost:6333 --points 200000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from rag import RAGPipeline
+from collection_profiles import PROFILES
+from common import make_vectors, percentile
+
+def wait_for_index(client: QdrantClient, collection: str, timeout: float = 600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.get_collection(collection).status == "green":
+            return
+        time.sleep(0.5)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=":memory:")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    args = parser.parse_args()
+
+    client = QdrantClient(":memory:") if args.url == ":memory:" else QdrantClient(url=args.url)
+    vectors = make_vectors(args.points, args.dim)
+    queries = make_vectors(args.queries, args.dim, seed=1)
+    # Exact top-k by cosine (vectors are unit length)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+    docs = [{"id": i, "text": ""} for i in range(args.points)]
+
+    results = []
+    for name in args.profiles:
+        profile = PROFILES[name]
+        pipeline = RAGPipeline(client=client, embeddings=object(), profile=profile)
+        pipeline.lexical_enabled = False
+        collection = f"bench_profile_{name}"
+        if client.collection_exists(collection):
+            client.delete_collection(collection)
+        pipeline.create_collection_if_not_exists(collection, dim=args.dim)
+
+        started = time.perf_counter()
+        pipeline.write_vectors(collection, docs, vectors, batch_size=512)
+        wait_for_index(client, collection)
+        load_seconds = time.perf_counter() - started
+
+        hits, latencies = 0, []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            response = client.query_points(
+                collection_name=collection,
+                query=query,
+                limit=args.top_k,
+                search_params=profile.search_params(),
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len({point.id for point in response.points} & set(expected.tolist()))
+
+        results.append({
+            "profile": name,
+            "points": args.points,
+            f"recall@{args.top_k}": round(hits / (len(queries) * args.top_k), 4),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "load_seconds": round(load_seconds, 1),
+            "estimated_ram_mb": round(profile.estimated_ram_bytes(args.points, args.dim) / 2**20, 1),
+        })
+        client.delete_collection(collection)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
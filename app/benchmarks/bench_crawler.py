@@ -0,0 +1,132 @@
+"""
+Site crawl into the ingestion pipeline: first crawl vs conditional re-crawl, and HTML parsers.
+
+Serves a synthetic site (sitemap + interlinked pages with ETags and a
+configurable response delay) from a local server, then crawls it into an
+in-memory Qdrant collection twice through `crawl_site`, the same path as
+`/ingest_url?background=true` with `"crawl": true`. The second crawl should
+be answered with 304s and ingest nothing. Also times text + link extraction
+with the available parsers (selectolax/lexbor if installed, BeautifulSoup).
+
+    python app/benchmarks/bench_crawler.py --pages 500 --hash-embeddings
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request, Response
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import ingestion
+from rag import RAGPipeline
+from ingest_pipeline import IngestionPipeline
+from crawler import FetchCache, crawl_site
+from common import make_embeddings
+from fake_ollama import serve_in_thread
+
+WORDS = "crawler sitemap etag page link host rate limit parser chunk embedding vector query".split()
+
+def make_page(i: int, pages: int, rng: random.Random) -> str:
+    paragraphs = "".join(
+        "<p>" + " ".join(rng.choice(WORDS) for _ in range(60)) + "</p>" for _ in range(12)
+    )
+    links = "".join(f'<li><a href="/page/{rng.randrange(pages)}">related</a></li>' for _ in range(10))
+    return (
+        f"<html><head><title>Page {i}</title><script>var x = {i};</script></head><body>"
+        f"<header><nav><a href='/'>Home</a></nav></header><main><h1>Page {i}</h1>{paragraphs}<ul>{links}</ul></main>"
+        f"<footer>Footer</footer></body></html>"
+    )
+
+def create_site(pages: int, delay_ms: float) -> FastAPI:
+    rng = random.Random(0)
+    content = {f"/page/{i}": make_page(i, pages, rng) for i in range(pages)}
+    content["/"] = "<html><body>" + "".join(f'<a href="/page/{i}">{i}</a>' for i in range(0, pages, 10)) + "</body></html>"
+    app = FastAPI()
+
+    @app.get("/sitemap.xml")
+    async def sitemap():
+        urls = "".join(f"<url><loc>{app.state.base_url}/page/{i}</loc></url>" for i in range(pages))
+        return Response(f'<?xml version="1.0"?><urlset>{urls}</urlset>', media_type="application/xml")
+
+    @app.get("/{path:path}")
+    async def page(path: str, request: Request):
+        await asyncio.sleep(delay_ms / 1000.0)
+        body = content.get("/" + path)
+        if body is None:
+            return Response(status_code=404)
+        etag = f'"{hash(body) & 0xffffffff:x}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="text/html", headers={"ETag": etag})
+
+    app.state.content = content
+    return app
+
+def bench_parsers(documents, runs: int = 3):
+    rows = []
+    parsers = [("selectolax", ingestion.LexborHTMLParser), ("beautifulsoup", None)]
+    available = ingestion.LexborHTMLParser
+    try:
+        for name, parser in parsers:
+            if name == "selectolax" and parser is None:
+                continue
+            ingestion.LexborHTMLParser = parser
+            best = float("inf")
+            for _ in range(runs):
+                started = time.perf_counter()
+                for doc in documents:
+                    ingestion.extract_html(doc, "http://site/")
+                best = min(best, time.perf_counter() - started)
+            rows.append({"parser": name, "pages_per_sec": round(len(documents) / best, 1)})
+    finally:
+        ingestion.LexborHTMLParser = available
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--delay-ms", type=float, default=20.0, help="server response delay per page")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--host-rps", type=float, default=0, help="per-host limit; 0 = unlimited")
+    parser.add_argument("--hash-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    site = create_site(args.pages, args.delay_ms)
+    base_url = serve_in_thread(site)
+    # Sitemap entries are absolute URLs
+    site.state.base_url = base_url
+
+    rag = RAGPipeline(client=QdrantClient(":memory:"), embeddings=make_embeddings(args.hash_embeddings))
+    rag.create_collection_if_not_exists("bench_crawl")
+    pipeline = IngestionPipeline(rag, upsert_workers=1)
+    cache = FetchCache(":memory:")
+
+    results = {"crawls": []}
+    for label in ("first", "recrawl"):
+        started = time.perf_counter()
+        stats = crawl_site(
+            pipeline, "bench_crawl", base_url + "/", cache,
+            max_pages=args.pages + 1, max_depth=3, concurrency=args.concurrency, host_rps=args.host_rps,
+        )
+        crawl = stats["crawl"]
+        results["crawls"].append({
+            "crawl": label,
+            "pages_fetched": crawl["pages"] + crawl["not_modified"],
+            "changed": crawl["changed"],
+            "not_modified": crawl["not_modified"],
+            "pages_per_sec": round(crawl["pages_per_sec"], 1),
+            "chunks": stats["chunks"],
+            "mb_downloaded": round(crawl["bytes_downloaded"] / 2**20, 2),
+            "mb_saved": round(crawl["bytes_saved"] / 2**20, 2),
+            "seconds": round(time.perf_counter() - started, 2),
+        })
+    results["parsers"] = bench_parsers([page.encode() for path, page in site.state.content.items() if path != "/"])
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
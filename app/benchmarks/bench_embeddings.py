@@ -0,0 +1,80 @@
+"""
+Embedding backends compared: sentence-transformers (torch) vs ONNX Runtime (fp32 and int8).
+
+For each backend reports bulk throughput (texts/s), single-text p50/p99
+latency, and cosine agreement with the torch backend on the same texts.
+Requires the model files (downloaded from the Hugging Face hub on first run)
+and `pip install onnxruntime` for the onnx backends.
+
+    python app/benchmarks/bench_embeddings.py --texts 2000 --threads 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from embeddings import load_embedding_backend
+from common import percentile
+
+WORDS = "vector database embedding retrieval chunk query latency throughput index payload".split()
+
+def make_texts(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    # Mixed lengths, like real chunks, so length sorting has something to do
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 120))) for _ in range(count)]
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--singles", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    reference = None
+    results = []
+    for name in args.backends:
+        backend = name.split("-")[0]
+        model = load_embedding_backend(args.model, backend=backend, threads=args.threads, quantize=name.endswith("int8"))
+        model.encode(texts[:8])  # warm up
+
+        started = time.perf_counter()
+        vectors = np.asarray(model.encode(texts, batch_size=args.batch_size, convert_to_numpy=True), dtype=np.float32)
+        bulk_seconds = time.perf_counter() - started
+
+        latencies = []
+        for text in texts[:args.singles]:
+            started = time.perf_counter()
+            model.encode([text], convert_to_numpy=True)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        vectors = unit(vectors)
+        if reference is None and backend == "torch":
+            reference = vectors
+        row = {
+            "backend": name,
+            "texts_per_sec": round(len(texts) / bulk_seconds, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+        if reference is not None:
+            agreement = (vectors * reference).sum(axis=1)
+            row["cosine_vs_torch_mean"] = round(float(agreement.mean()), 5)
+            row["cosine_vs_torch_min"] = round(float(agreement.min()), 5)
+        results.append(row)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Dense-only vs hybrid (BM25 + vector, reciprocal-rank fusion) retrieval.
+
+Builds a synthetic corpus where every document mentions a unique error code
+amid shared topical filler, then asks one question per code. Reports
+recall@k (did the document with that code come back?) and p50/p99 latency.
+
+    python app/benchmarks/bench_hybrid.py --docs 2000 --queries 200
+    python app/benchmarks/bench_hybrid.py --hash-embeddings   # no model download
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from rag import RAGPipeline
+from ingest_pipeline import IngestionPipeline
+from common import make_embeddings, percentile
+
+TOPICS = [
+    "The payment service rejected the request while processing checkout.",
+    "The deployment failed because a health check timed out.",
+    "Authentication tokens expired before the session was refreshed.",
+    "The vector index rebuild stalled under heavy write load.",
+]
+
+def build_corpus(docs: int, seed: int = 0):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(docs):
+        code = f"ERR-{10000 + i}"
+        filler = " ".join(rng.choice(TOPICS) for _ in range(3))
+        corpus.append({"id": code, "text": f"{filler} Operators see {code} in the logs when this happens."})
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hash-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    rag = RAGPipeline(client=QdrantClient(":memory:"), embeddings=make_embeddings(args.hash_embeddings))
+    rag.lexical_dir = None
+    collection = "bench_hybrid"
+    rag.create_collection_if_not_exists(collection)
+    corpus = build_corpus(args.docs)
+    IngestionPipeline(rag, batch_size=256).run(collection, corpus)
+
+    rng = random.Random(1)
+    targets = rng.sample(corpus, min(args.queries, len(corpus)))
+    results = []
+    for mode in ("dense", "hybrid"):
+        hits, latencies = 0, []
+        for doc in targets:
+            started = time.perf_counter()
+            retrieved = rag.retrieve(collection, f"What does {doc['id']} mean?", args.top_k, mode=mode)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += any(doc["id"] in text for _, _, text in retrieved)
+        results.append({
+            "mode": mode,
+            "queries": len(targets),
+            f"recall@{args.top_k}": round(hits / len(targets), 3),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
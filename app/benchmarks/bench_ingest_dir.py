@@ -0,0 +1,100 @@
+"""
+Directory ingestion benchmark: text extraction + chunking throughput and peak RSS.
+
+Generates a synthetic corpus of multi-page PDFs and text files, then runs
+`iter_directory_chunks` with an increasing number of worker processes.
+Embedding and Qdrant are not involved.
+
+    python app/benchmarks/bench_ingest_dir.py --pdfs 40 --pages 50 --workers 1 2 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ingestion import iter_directory_chunks
+
+WORDS = "vector database embedding retrieval chunk query latency throughput index payload".split()
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + "."
+
+def write_pdf(path: str, pages: int, lines_per_page: int, rng: random.Random):
+    """Write a minimal valid PDF with one Helvetica text stream per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        text = "".join(f"({_sentence(rng)}) Tj T* " for _ in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def build_corpus(directory: str, pdfs: int, pages: int, texts: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    for i in range(pdfs):
+        write_pdf(os.path.join(directory, f"doc_{i}.pdf"), pages, 40, rng)
+    for i in range(texts):
+        with open(os.path.join(directory, f"note_{i}.txt"), "w") as f:
+            f.write("\n".join(_sentence(rng) for _ in range(2000)))
+    return pdfs * pages
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--texts", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        build_corpus(directory, args.pdfs, args.pages, args.texts)
+        for workers in args.workers:
+            stats: dict = {}
+            started = time.perf_counter()
+            chunks = sum(1 for _ in iter_directory_chunks(directory, workers=workers, stats=stats))
+            elapsed = time.perf_counter() - started
+            results.append({
+                "workers": workers,
+                "files": stats["files"],
+                "pages": stats["pages"],
+                "chunks": chunks,
+                "seconds": round(elapsed, 3),
+                "pages_per_sec": round(stats["pages"] / elapsed, 1),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+            })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
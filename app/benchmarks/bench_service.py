@@ -0,0 +1,232 @@
+"""
+End-to-end service benchmark against local stand-ins.
+
+Runs the real app code with an in-memory Qdrant and a fake Ollama server
+(fake_ollama.py) generating at a configurable token rate, and measures:
+
+- ingestion chunks/s (chunk -> embed -> upsert pipeline)
+- embedding texts/s (bulk) and single-query p50/p99
+- retrieval p50/p99 (dense and hybrid)
+- `/query` latency and throughput at increasing concurrency, through the
+  full ASGI stack (middleware, routing, validation) with the pooled LLM client,
+  through the LLM scheduler (`--llm-concurrency` slots, `--llm-queue` places)
+
+Everything is emitted as one JSON document (with the git commit) so runs can
+be compared across commits:
+
+    python app/benchmarks/bench_service.py --hash-embeddings --output before.json
+    python app/benchmarks/bench_service.py --hash-embeddings --concurrency 1 8 32 128 --tokens-per-second 0
+
+The load generator shares the event loop with the app, so at high
+concurrency part of the measured latency is client overhead; compare runs
+made with the same settings on the same machine.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import httpx
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ingest_pipeline import IngestionPipeline
+from common import ThreadedAsyncQdrant, make_embeddings, percentile
+from fake_ollama import create_app, serve_in_thread
+
+WORDS = "vector database embedding retrieval chunk query latency throughput index payload service replica shard".split()
+
+def build_corpus(docs: int, sentences: int, seed: int = 0):
+    """Documents of topical filler, each with one unique code to ask about."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(docs):
+        body = [" ".join(rng.choice(WORDS) for _ in range(14)).capitalize() + "." for _ in range(sentences)]
+        body.insert(rng.randrange(len(body) + 1), f"Operators see ERR-{10000 + i} when shard {i} stalls.")
+        corpus.append({"id": f"doc-{i}", "text": " ".join(body)})
+    return corpus
+
+def latency_summary(latencies_ms):
+    return {
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def bench_ingest(rag, collection, corpus, batch_size):
+    # Local-mode Qdrant isn't safe for concurrent writers
+    stats = IngestionPipeline(rag, batch_size=batch_size, upsert_workers=1).run(collection, corpus)
+    rag.flush_lexical(collection)
+    return {
+        "documents": len(corpus),
+        "chunks": stats["chunks"],
+        "chunks_per_sec": round(stats["chunks_per_sec"], 1),
+        "embed_seconds": round(stats["embed_seconds"], 3),
+        "upsert_seconds": round(stats["upsert_seconds"], 3),
+    }
+
+def bench_embeddings(embeddings, texts, queries):
+    # Measure the encoder, not the cache the ingestion phase just filled
+    cache, embeddings.cache = embeddings.cache, None
+    try:
+        started = time.perf_counter()
+        embeddings.encode_array(texts)
+        bulk_seconds = time.perf_counter() - started
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            embeddings.get_embedding(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        embeddings.cache = cache
+    return {"texts": len(texts), "texts_per_sec": round(len(texts) / bulk_seconds, 1), **latency_summary(latencies)}
+
+def bench_retrieval(rag, collection, queries, top_k):
+    rows = []
+    for mode in ("dense", "hybrid"):
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            rag.retrieve(collection, query, top_k, mode=mode)
+            latencies.append((time.perf_counter() - started) * 1000)
+        rows.append({"mode": mode, "queries": len(queries), **latency_summary(latencies)})
+    return rows
+
+async def bench_query(app, queries, levels, requests_per_level, top_k, mode, scheduler):
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            while (await client.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+            # Warm up pools and lazily created clients
+            await client.post("/query", json={"query": queries[0], "top_k": top_k})
+            for concurrency in levels:
+                pending = iter(range(requests_per_level))
+                latencies, errors, shed = [], 0, 0
+                before = scheduler.stats()
+
+                async def worker():
+                    nonlocal errors, shed
+                    for i in pending:
+                        started = time.perf_counter()
+                        response = await client.post(
+                            "/query",
+                            json={"query": queries[i % len(queries)], "top_k": top_k, "retrieval_mode": mode}
+                        )
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        if response.status_code in (429, 503, 504):
+                            shed += 1
+                        elif response.status_code != 200 or response.json()["answer"].startswith("Error"):
+                            errors += 1
+
+                started = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - started
+                after = scheduler.stats()
+                rows.append({
+                    "concurrency": concurrency,
+                    "requests": requests_per_level,
+                    "errors": errors,
+                    # 429/503/504 from the LLM scheduler, and answers shared with an identical in-flight query
+                    "shed": shed,
+                    "coalesced": after["coalesced"] - before["coalesced"],
+                    "avg_llm_queue_ms": round(
+                        (after["queue_wait_seconds"] - before["queue_wait_seconds"]) * 1000
+                        / max(1, after["started"] - before["started"]), 2
+                    ),
+                    "throughput_rps": round(requests_per_level / elapsed, 2),
+                    **latency_summary(latencies),
+                })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--sentences", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="/query requests per concurrency level")
+    parser.add_argument("--retrieval-mode", choices=["dense", "hybrid"], default="dense")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake LLM speed; 0 = instant")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--first-token-ms", type=float, default=20.0)
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="generations sent to the LLM at once (OLLAMA_CONCURRENCY)")
+    parser.add_argument("--llm-queue", type=int, default=256, help="requests allowed to wait for the LLM (LLM_QUEUE_SIZE)")
+    parser.add_argument("--query-cache", action="store_true", help="keep the answer cache on (off by default)")
+    parser.add_argument("--hash-embeddings", action="store_true")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    ollama_url = serve_in_thread(create_app(args.tokens_per_second, args.answer_tokens, args.first_token_ms))
+    workdir = tempfile.mkdtemp(prefix="bench_service_")
+    os.environ.update({
+        "OLLAMA_BASE_URL": ollama_url,
+        "QUERY_CACHE": "true" if args.query_cache else "false",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "MANIFEST_DB_PATH": os.path.join(workdir, "manifest.db"),
+    })
+    os.environ.pop("LEXICAL_INDEX_DIR", None)
+    os.environ.pop("EMBED_CACHE_DIR", None)
+
+    # Importing main is cheap: Qdrant clients and the model are created on first use
+    import main as service
+    # generation is imported with ingest_pipeline, before the environment above is set
+    scheduler = service.scheduler_for()
+    scheduler.concurrency, scheduler.max_queue = args.llm_concurrency, args.llm_queue
+    rag = service.rag_pipeline
+    client = QdrantClient(":memory:")
+    rag.client = client
+    rag._async_client = ThreadedAsyncQdrant(client)
+    if args.hash_embeddings:
+        rag.embeddings = make_embeddings(True)
+
+    collection = service.COLLECTION_NAME
+    rag.create_collection_if_not_exists(collection)
+    corpus = build_corpus(args.docs, args.sentences)
+    rng = random.Random(1)
+    queries = [f"What happens when operators see ERR-{10000 + rng.randrange(args.docs)}?" for _ in range(args.queries)]
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+    }
+    results["ingest"] = bench_ingest(rag, collection, corpus, args.batch_size)
+    texts = [doc["text"][:1000] for doc in corpus]
+    results["embedding"] = bench_embeddings(rag.embeddings, texts, queries[:100])
+    results["retrieval"] = bench_retrieval(rag, collection, queries, args.top_k)
+    results["query"] = asyncio.run(bench_query(
+        service.app, queries, args.concurrency, args.requests, args.top_k, args.retrieval_mode,
+        scheduler,
+    ))
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Cold start and per-worker memory, with and without preloading the model before fork.
+
+Measures `import main` time in a fresh interpreter, then starts serve.py
+with N workers in each mode and reports seconds until /health answers
+(live) and until /ready turns 200 (models warm, collection present), and
+each process's RSS, PSS and USS from /proc/<pid>/smaps_rollup (Linux).
+PSS splits shared pages between the processes sharing them, so the PSS
+total is the real memory cost of the server; with preloading, the model
+weights are counted once across workers instead of once per worker.
+
+Needs a reachable Qdrant (QDRANT_HOST/QDRANT_PORT) for /ready:
+
+    docker run -p 6333:6333 qdrant/qdrant
+    python app/benchmarks/bench_startup.py --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def import_seconds(runs: int) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+def children_of(pid: int):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after its closing parenthesis
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+def memory_mb(pid: int):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": round(values.get("Rss", 0), 1),
+        "pss_mb": round(values.get("Pss", 0), 1),
+        "uss_mb": round(values.get("Private_Clean", 0) + values.get("Private_Dirty", 0), 1),
+    }
+
+def wait_for(url: str, deadline: float, consecutive: int = 1):
+    """Seconds until `url` returned 200 `consecutive` times in a row, or None at the deadline."""
+    started = time.perf_counter()
+    streak = 0
+    while time.perf_counter() < deadline:
+        try:
+            streak = streak + 1 if httpx.get(url, timeout=1).status_code == 200 else 0
+        except httpx.HTTPError:
+            streak = 0
+        if streak >= consecutive:
+            return round(time.perf_counter() - started, 2)
+        time.sleep(0.05)
+    return None
+
+def run_server(workers: int, port: int, preload: bool, timeout: float):
+    command = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    if not preload:
+        command.append("--no-preload")
+    started = time.perf_counter()
+    # Server logs go to stderr; stdout is kept for this script's JSON
+    server = subprocess.Popen(command, cwd=APP_DIR, stdout=subprocess.DEVNULL)
+    try:
+        deadline = started + timeout
+        live = wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        # Connections land on arbitrary workers; several 200s in a row make it likely all are ready
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", deadline, consecutive=workers * 3)
+        ready_seconds = round(time.perf_counter() - started, 2) if ready is not None else None
+        if server.poll() is not None:
+            return {"preload": preload, "workers": workers, "error": f"server exited with code {server.returncode}"}
+        workers_memory = [memory_mb(pid) for pid in children_of(server.pid)]
+        return {
+            "preload": preload,
+            "workers": workers,
+            "live_seconds": live,
+            "ready_seconds": ready_seconds,
+            "parent": memory_mb(server.pid),
+            "per_worker": workers_memory,
+            "total_pss_mb": round(memory_mb(server.pid)["pss_mb"] + sum(w["pss_mb"] for w in workers_memory), 1),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--import-runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for /ready per mode")
+    args = parser.parse_args()
+
+    results = {"import_main_seconds": round(import_seconds(args.import_runs), 3), "servers": []}
+    for preload in (False, True):
+        results["servers"].append(run_server(args.workers, args.port, preload, args.timeout))
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
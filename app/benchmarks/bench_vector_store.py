@@ -0,0 +1,118 @@
+"""
+Embedded vector store vs Qdrant: load time, query latency, recall@k and disk size.
+
+Writes the same clustered random vectors through `RAGPipeline.write_vectors`
+in ingestion-sized batches (so the embedded store goes through its segment
+merges), compacts, then runs the same queries one at a time and as
+`query_batch_points` batches. Recall is measured against exact NumPy cosine
+search. Embedded variants:
+
+- exact: brute-force float32 over memory-mapped segments
+- exact-int8: brute force over int8 vectors (4x smaller files)
+- ivf-N: IVF index (segments of 20000+ points) probing N lists per query
+
+Qdrant defaults to local mode (`--url :memory:`), a brute-force Python
+engine; point `--url` at a server for a fair comparison:
+
+    docker run -p 6333:6333 qdrant/qdrant
+    python app/benchmarks/bench_vector_store.py --url http://localhost:6333 --points 200000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from rag import RAGPipeline
+from vector_store import EmbeddedVectorStore
+from common import make_vectors, percentile
+
+def directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return round(total / 2**20, 1)
+
+def run(name, client, vectors, queries, truth, args):
+    pipeline = RAGPipeline(client=client, embeddings=object())
+    pipeline.lexical_enabled = False
+    collection = "bench_vector_store"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    pipeline.create_collection_if_not_exists(collection, dim=args.dim)
+    docs = [{"id": i, "text": ""} for i in range(len(vectors))]
+
+    started = time.perf_counter()
+    for start in range(0, len(docs), args.batch_size):
+        pipeline.write_vectors(collection, docs[start:start + args.batch_size], vectors[start:start + args.batch_size], batch_size=512)
+    if isinstance(client, EmbeddedVectorStore):
+        client.compact(collection)
+    load_seconds = time.perf_counter() - started
+
+    hits, latencies = 0, []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        response = client.query_points(collection_name=collection, query=query, limit=args.top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({point.id for point in response.points} & set(expected.tolist()))
+
+    requests = pipeline._batch_requests(queries, args.top_k, None)
+    started = time.perf_counter()
+    for start in range(0, len(requests), args.query_batch):
+        client.query_batch_points(collection_name=collection, requests=requests[start:start + args.query_batch])
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "backend": name,
+        "points": len(vectors),
+        f"recall@{args.top_k}": round(hits / (len(queries) * args.top_k), 4),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "batch_queries_per_sec": round(len(queries) / batch_seconds, 1),
+        "load_seconds": round(load_seconds, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=":memory:", help="Qdrant URL, or :memory: for local mode")
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256, help="points per write, as in ingestion")
+    parser.add_argument("--query-batch", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--skip-qdrant", action="store_true")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.points, args.dim)
+    queries = make_vectors(args.queries, args.dim, seed=1)
+    # Exact top-k by cosine (vectors are unit length)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+
+    variants = [("exact", {"ivf_min_points": args.points + 1}), ("exact-int8", {"ivf_min_points": args.points + 1, "dtype": "int8"})]
+    variants += [(f"ivf-{nprobe}", {"nprobe": nprobe}) for nprobe in args.nprobe]
+    results = []
+    for name, settings in variants:
+        path = tempfile.mkdtemp(prefix="bench_vector_store_")
+        try:
+            row = run(f"embedded/{name}", EmbeddedVectorStore(path, **settings), vectors, queries, truth, args)
+            row["disk_mb"] = directory_mb(path)
+            results.append(row)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if not args.skip_qdrant:
+        client = QdrantClient(":memory:") if args.url == ":memory:" else QdrantClient(url=args.url)
+        name = "qdrant/local" if args.url == ":memory:" else "qdrant"
+        results.append(run(name, client, vectors, queries, truth, args))
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+List vs NumPy vector path: time and peak Python allocations for upserting N chunks.
+
+"list"  - what `upsert_documents` does: encoder output -> .tolist() -> PointStruct -> upsert
+"array" - what the ingestion pipeline does: float32 matrix -> upload_collection
+
+Random vectors stand in for the encoder. Runs against an in-memory Qdrant by
+default; pass --host to measure against a real server (add --grpc for gRPC).
+
+    python app/benchmarks/bench_vectors.py --chunks 100000
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tracemalloc
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+def make_client(args) -> QdrantClient:
+    if args.host:
+        return QdrantClient(host=args.host, port=args.port, prefer_grpc=args.grpc)
+    return QdrantClient(":memory:")
+
+def reset(client: QdrantClient, name: str, dim: int):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(name, vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE))
+
+def list_path(client, name, ids, texts, vectors, batch_size):
+    for start in range(0, len(ids), batch_size):
+        rows = vectors[start:start + batch_size].tolist()
+        points = [
+            models.PointStruct(id=point_id, vector=row, payload={"text": text})
+            for point_id, row, text in zip(ids[start:start + batch_size], rows, texts[start:start + batch_size])
+        ]
+        client.upsert(collection_name=name, points=points)
+
+def array_path(client, name, ids, texts, vectors, batch_size):
+    for start in range(0, len(ids), batch_size):
+        client.upload_collection(
+            collection_name=name,
+            vectors=vectors[start:start + batch_size],
+            payload=[{"text": text} for text in texts[start:start + batch_size]],
+            ids=ids[start:start + batch_size],
+            batch_size=batch_size,
+            wait=True,
+        )
+
+def measure(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=6333)
+    parser.add_argument("--grpc", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dim), dtype=np.float32)
+    ids = [str(uuid.uuid4()) for _ in range(args.chunks)]
+    texts = [f"chunk {i}" for i in range(args.chunks)]
+    client = make_client(args)
+
+    results = []
+    for label, fn in (("list", list_path), ("array", array_path)):
+        name = f"bench_vectors_{label}"
+        reset(client, name, args.dim)
+        elapsed, peak = measure(fn, client, name, ids, texts, vectors, args.batch_size)
+        results.append({
+            "path": label,
+            "chunks": args.chunks,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(args.chunks / elapsed, 1),
+            "peak_alloc_mb": round(peak / 2**20, 1),
+        })
+        client.delete_collection(name)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+import re
+import hashlib
+from typing import List
+
+import numpy as np
+
+# Re-exported for the benchmarks that wrap a sync client
+from vector_store import ThreadedAsyncQdrant
+
+class HashEmbeddings:
+    """
+    Deterministic bag-of-words hashing embedder with the `EmbeddingsUtils` interface.
+
+    Lets benchmarks run without downloading a model. Retrieval quality is
+    weaker than a real encoder, so use it for latency numbers and relative
+    comparisons only.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.cache = None
+        self.batcher = None
+
+    def encode_array(self, texts: List[str], normalize: bool = False) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                digest = hashlib.md5(token.encode()).digest()
+                out[row, int.from_bytes(digest[:4], "little") % self.dim] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1, norms)
+
+    def batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.encode_array(texts).tolist()
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.encode_array([text])[0].tolist()
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
+
+def make_embeddings(use_hash: bool):
+    if use_hash:
+        return HashEmbeddings()
+    from embeddings import EmbeddingsUtils
+    return EmbeddingsUtils()
+
+def make_vectors(points: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random centroids, roughly like text embeddings."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centroids[rng.integers(0, clusters, points)] + 0.6 * rng.normal(size=(points, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
@@ -0,0 +1,75 @@
+"""
+Stand-in for Ollama's /api/chat with a configurable generation speed.
+
+Answers every prompt with `answer_tokens` words after `first_token_ms`,
+emitting `tokens_per_second` words per second, streamed (NDJSON) or not,
+the way Ollama does. Run standalone to point a dev server at it:
+
+    python app/benchmarks/fake_ollama.py --port 11434 --tokens-per-second 40
+"""
+import time
+import json
+import socket
+import asyncio
+import argparse
+import threading
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+def create_app(tokens_per_second: float = 50.0, answer_tokens: int = 64, first_token_ms: float = 50.0) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    async def tokens():
+        await asyncio.sleep(first_token_ms / 1000.0)
+        for i in range(answer_tokens):
+            if i and tokens_per_second > 0:
+                await asyncio.sleep(1.0 / tokens_per_second)
+            yield f"token{i} "
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        model = body.get("model", "fake")
+        if not body.get("stream", True):
+            content = "".join([token async for token in tokens()])
+            return {"model": model, "message": {"role": "assistant", "content": content}, "done": True}
+
+        async def events():
+            async for token in tokens():
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    return app
+
+def serve_in_thread(app: FastAPI, host: str = "127.0.0.1", port: int = 0) -> str:
+    """
+    Serve `app` from a daemon thread and return its base URL once it accepts connections.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://{host}:{sock.getsockname()[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    app = create_app(args.tokens_per_second, args.answer_tokens, args.first_token_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
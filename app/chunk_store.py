@@ -0,0 +1,445 @@
+import os
+import re
+import mmap
+import zlib
+import fcntl
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional: blocks are zlib-compressed without it
+    zstandard = None
+
+from metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    block_offset INTEGER NOT NULL,
+    block_size INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    length INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Data file per generation; compaction writes the next generation's file
+DATA_FILE = "blocks.{}.bin"
+DATA_FILE_PATTERN = re.compile(r"blocks\.(\d+)\.bin$")
+INDEX_FILE = "index.db"
+LOCK_FILE = "write.lock"
+# SQLite's default limit on bound parameters per statement
+MAX_PARAMS = 999
+# Dead bytes tolerated regardless of the live size before compacting
+COMPACT_MIN_DEAD_BYTES = 1 << 20
+# Lookups retried when a compaction removes the data file between lookup and read
+READ_ATTEMPTS = 3
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+class ChunkStore:
+    """
+    Chunk texts kept outside the vector database, keyed by chunk (point) ID.
+
+    Texts are packed into compressed blocks (zstd, or zlib without
+    `zstandard`) appended to one data file, which is memory-mapped for reads.
+    An SQLite index maps each ID to its block's offset and size and the
+    text's position inside the decompressed block, so fetching the texts of a
+    query's top-k is one index lookup plus one decompression per distinct
+    block. Recently read blocks are kept decompressed in a small LRU.
+
+    Several processes (e.g. `serve.py` workers) can share a directory: writes
+    take an exclusive file lock and append at the file's current end. Overwritten
+    and deleted texts stay in the data file until `compact`, which writes the
+    live texts to a new data file and bumps the index's generation, so readers
+    never resolve offsets against the wrong file. It runs in the background once
+    more than half of the written bytes are dead.
+    """
+    def __init__(
+        self,
+        path: str,
+        codec: Optional[str] = None,
+        level: int = 3,
+        block_bytes: int = 16384,
+        cache_blocks: int = 256,
+    ):
+        """
+        Args:
+            path (str): Directory holding the data file and its index.
+            codec (Optional[str]): "zstd" or "zlib" for new blocks. Defaults to zstd if installed.
+            level (int): Compression level.
+            block_bytes (int): Uncompressed bytes per block; larger compresses better, smaller reads less.
+            cache_blocks (int): Decompressed blocks kept in memory.
+        """
+        self.codec = codec or default_codec()
+        if self.codec == "zstd" and zstandard is None:
+            raise ValueError("codec 'zstd' requires the zstandard package")
+        if self.codec not in ("zstd", "zlib"):
+            raise ValueError(f"Unknown chunk store codec: {self.codec}")
+        self.path = path
+        self.level = level
+        self.block_bytes = block_bytes
+        self.cache_blocks = cache_blocks
+        os.makedirs(path, exist_ok=True)
+        # Guards the read connection, the mapping and the block cache
+        self._lock = threading.RLock()
+        # Serializes this process's writers; the file lock serializes processes
+        self._write_lock = threading.Lock()
+        self._lock_file = open(os.path.join(path, LOCK_FILE), "a")
+        index_path = os.path.join(path, INDEX_FILE)
+        # Separate connections so index lookups don't wait behind a long write transaction
+        self._writer = sqlite3.connect(index_path, check_same_thread=False)
+        with self._writer:
+            self._writer.execute("PRAGMA journal_mode=WAL")
+            self._writer.executescript(SCHEMA)
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._file = None
+        self._file_generation = None
+        # Read-only mapping of one generation's data file, remapped when reads go past its end
+        self._reader = None
+        self._map: Optional[mmap.mmap] = None
+        self._map_generation = None
+        self._blocks: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+        self._compactor: Optional[threading.Thread] = None
+        self._zstd_compressor = zstandard.ZstdCompressor(level=level) if self.codec == "zstd" else None
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        """
+        Store texts, replacing any already stored under the same IDs.
+
+        Args:
+            items (Iterable[Tuple[str, str]]): (chunk_id, text) pairs.
+        """
+        with self._exclusive() as data:
+            # The file's real size, not this handle's position: other processes append too
+            rows, _ = self._write_blocks(data, items, os.fstat(data.fileno()).st_size)
+            if not rows:
+                return
+            written = sum(row[5] for row in rows)
+            # The last text wins when an ID repeats within the batch
+            rows = list({row[0]: row for row in rows}.values())
+            # Data before index: an ID never points past what's on disk
+            data.flush()
+            with self._writer:
+                replaced = self._stored_bytes([row[0] for row in rows])
+                self._writer.executemany(
+                    "INSERT OR REPLACE INTO chunks (id, block_offset, block_size, codec, start, length) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._add_meta("written_bytes", written)
+                self._add_meta("live_bytes", sum(row[5] for row in rows) - replaced)
+        metrics.batch("chunk_store_put", len(rows))
+        self._maybe_compact()
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Texts for the given IDs in one bulk read. IDs that aren't stored are left out.
+
+        Args:
+            ids (Iterable[str]): Chunk IDs.
+
+        Returns:
+            Dict[str, str]: chunk_id -> text.
+        """
+        ids = list(dict.fromkeys(str(chunk_id) for chunk_id in ids))
+        if not ids:
+            return {}
+        with metrics.stage("chunk_fetch"):
+            texts, hits, misses = self._read(ids, cache=True)
+            metrics.cache("chunk_blocks", hits=hits, misses=misses)
+        return texts
+
+    def delete_many(self, ids: Iterable[str]):
+        """
+        Forget texts by ID. Their bytes are reclaimed by the next compaction.
+        """
+        ids = list(dict.fromkeys(str(chunk_id) for chunk_id in ids))
+        with self._exclusive():
+            with self._writer:
+                removed = self._stored_bytes(ids)
+                for start in range(0, len(ids), MAX_PARAMS):
+                    batch = ids[start:start + MAX_PARAMS]
+                    self._writer.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+                self._add_meta("live_bytes", -removed)
+        self._maybe_compact()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Stored chunks, live vs written text bytes and the data file's size.
+        """
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            live = self._meta(self._conn, "live_bytes")
+            written = self._meta(self._conn, "written_bytes")
+            data_path = self._data_path(self._meta(self._conn, "generation"))
+        file_bytes = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        return {
+            "chunks": count,
+            "live_bytes": live,
+            "written_bytes": written,
+            "file_bytes": file_bytes,
+            # Text bytes per data-file byte, dead bytes included on both sides
+            "compression_ratio": written / file_bytes if file_bytes else None,
+        }
+
+    def compact(self):
+        """
+        Rewrite the live texts into a new data file, dropping dead bytes.
+        """
+        with self._exclusive():
+            self._compact()
+
+    def close(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._write_lock, self._lock:
+            self._close_map()
+            if self._file is not None:
+                self._file.close()
+            self._writer.close()
+            self._conn.close()
+            self._lock_file.close()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator:
+        """
+        Hold the store's write lock, across threads and processes, and yield the
+        current generation's data file opened for appending.
+        """
+        with self._write_lock:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                generation = self._meta(self._writer, "generation")
+                if self._file is None or self._file_generation != generation:
+                    # First write, or another process compacted since our last one
+                    if self._file is not None:
+                        self._file.close()
+                    self._file = open(self._data_path(generation), "ab")
+                    self._file_generation = generation
+                yield self._file
+            finally:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _compact(self):
+        """Compact under the write lock; readers keep working on the old file until the swap."""
+        generation = self._meta(self._writer, "generation")
+        ids = [row[0] for row in self._writer.execute("SELECT id FROM chunks ORDER BY block_offset, start")]
+
+        def live():
+            # Read back in file order, one index batch at a time, so memory stays bounded
+            for start in range(0, len(ids), MAX_PARAMS):
+                batch = ids[start:start + MAX_PARAMS]
+                texts, _, _ = self._read(batch, cache=False)
+                yield from ((chunk_id, texts[chunk_id]) for chunk_id in batch)
+
+        with open(self._data_path(generation + 1), "wb") as target:
+            rows, _ = self._write_blocks(target, live(), 0)
+            target.flush()
+            os.fsync(target.fileno())
+        live_bytes = sum(row[5] for row in rows)
+        with self._writer:
+            self._writer.execute("DELETE FROM chunks")
+            self._writer.executemany(
+                "INSERT INTO chunks (id, block_offset, block_size, codec, start, length) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            for key, value in (("written_bytes", live_bytes), ("live_bytes", live_bytes), ("generation", generation + 1)):
+                self._writer.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        # Readers that already mapped an old file keep reading it; later lookups see the new generation
+        for name in os.listdir(self.path):
+            match = DATA_FILE_PATTERN.match(name)
+            if match and int(match.group(1)) != generation + 1:
+                os.remove(os.path.join(self.path, name))
+        self._file.close()
+        self._file = None
+
+    def _maybe_compact(self):
+        with self._lock:
+            if not self._needs_compaction(self._conn):
+                return
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self._background_compact, name="chunk-store-compact", daemon=True)
+            self._compactor.start()
+
+    def _background_compact(self):
+        try:
+            with self._exclusive():
+                # Another process may have compacted while we waited for the lock
+                if self._needs_compaction(self._writer):
+                    self._compact()
+        except Exception as e:
+            print(f"Chunk store compaction in {self.path} failed: {e}")
+
+    def _needs_compaction(self, conn: sqlite3.Connection) -> bool:
+        live = self._meta(conn, "live_bytes")
+        return self._meta(conn, "written_bytes") - live > max(live, COMPACT_MIN_DEAD_BYTES)
+
+    def _write_blocks(self, target, items: Iterable[Tuple[str, str]], offset: int) -> Tuple[list, int]:
+        """
+        Pack texts into compressed blocks of about `block_bytes` and append them to `target`.
+
+        Returns the index rows for the texts and the offset after the last block.
+        """
+        rows: list = []
+        block: List[Tuple[str, bytes]] = []
+        size = 0
+
+        def flush(offset: int) -> int:
+            compressed = self._compress(b"".join(data for _, data in block))
+            target.write(compressed)
+            start = 0
+            for chunk_id, data in block:
+                rows.append((chunk_id, offset, len(compressed), self.codec, start, len(data)))
+                start += len(data)
+            return offset + len(compressed)
+
+        for chunk_id, text in items:
+            data = text.encode("utf-8")
+            block.append((str(chunk_id), data))
+            size += len(data)
+            if size >= self.block_bytes:
+                offset = flush(offset)
+                block, size = [], 0
+        if block:
+            offset = flush(offset)
+        return rows, offset
+
+    def _compress(self, raw: bytes) -> bytes:
+        if self.codec == "zstd":
+            return self._zstd_compressor.compress(raw)
+        return zlib.compress(raw, self.level)
+
+    @staticmethod
+    def _decompress(compressed: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Chunk store blocks are zstd-compressed; install zstandard to read them")
+            return zstandard.ZstdDecompressor().decompress(compressed)
+        return zlib.decompress(compressed)
+
+    def _read(self, ids: List[str], cache: bool) -> Tuple[Dict[str, str], int, int]:
+        """
+        Texts for `ids`, plus block cache hits and misses.
+        """
+        for attempt in range(READ_ATTEMPTS):
+            try:
+                return self._read_once(ids, cache)
+            except FileNotFoundError:
+                # Compacted, and the old file removed, between our lookup and opening it
+                if attempt == READ_ATTEMPTS - 1:
+                    raise
+
+    def _read_once(self, ids: List[str], cache: bool) -> Tuple[Dict[str, str], int, int]:
+        blocks: Dict[Tuple[int, int], bytes] = {}
+        pending: Dict[Tuple[int, int], Tuple[bytes, str]] = {}
+        with self._lock:
+            generation, rows = self._lookup(ids)
+            for _, block_offset, block_size, codec, _, _ in rows:
+                key = (generation, block_offset)
+                if key in blocks or key in pending:
+                    continue
+                block = self._blocks.get(key) if cache else None
+                if block is not None:
+                    self._blocks.move_to_end(key)
+                    blocks[key] = block
+                else:
+                    pending[key] = (self._compressed(generation, block_offset, block_size), codec)
+        hits = len(blocks)
+        # Decompressed outside the lock, so concurrent readers don't queue behind each other
+        for key, (compressed, codec) in pending.items():
+            blocks[key] = self._decompress(compressed, codec)
+        if cache and pending:
+            with self._lock:
+                for key in pending:
+                    self._blocks[key] = blocks[key]
+                while len(self._blocks) > self.cache_blocks:
+                    self._blocks.popitem(last=False)
+        texts = {
+            chunk_id: blocks[(generation, block_offset)][start:start + length].decode("utf-8")
+            for chunk_id, block_offset, _, _, start, length in rows
+        }
+        return texts, hits, len(pending)
+
+    def _compressed(self, generation: int, offset: int, size: int) -> bytes:
+        if self._map is None or self._map_generation != generation or offset + size > len(self._map):
+            # Not mapped yet, compacted since, or the file has grown since it was mapped
+            self._close_map()
+            self._reader = open(self._data_path(generation), "rb")
+            self._map = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_generation = generation
+        return self._map[offset:offset + size]
+
+    def _lookup(self, ids: List[str]) -> Tuple[int, list]:
+        """
+        The index generation and the rows for `ids`, read from the same index state.
+        """
+        while True:
+            generation = self._meta(self._conn, "generation")
+            rows = []
+            for start in range(0, len(ids), MAX_PARAMS):
+                batch = ids[start:start + MAX_PARAMS]
+                rows.extend(self._conn.execute(
+                    "SELECT id, block_offset, block_size, codec, start, length FROM chunks "
+                    f"WHERE id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ))
+            # A compaction commits its rows and generation together, so an unchanged
+            # generation means none ran in between
+            if self._meta(self._conn, "generation") == generation:
+                return generation, rows
+
+    def _stored_bytes(self, ids: List[str]) -> int:
+        total = 0
+        for start in range(0, len(ids), MAX_PARAMS):
+            batch = ids[start:start + MAX_PARAMS]
+            total += self._writer.execute(
+                f"SELECT COALESCE(SUM(length), 0) FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+            ).fetchone()[0]
+        return total
+
+    def _data_path(self, generation: int) -> str:
+        return os.path.join(self.path, DATA_FILE.format(generation))
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, key: str) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _add_meta(self, key: str, amount: int):
+        self._writer.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+            (key, amount),
+        )
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._reader.close()
+            self._map = None
+            self._map_generation = None
+
+def chunk_store_from_env(collection_name: str) -> Optional[ChunkStore]:
+    """
+    The collection's chunk store under CHUNK_STORE_DIR, or None when texts stay in the payload.
+    """
+    root = os.getenv("CHUNK_STORE_DIR")
+    if not root:
+        return None
+    return ChunkStore(
+        os.path.join(root, collection_name),
+        codec=os.getenv("CHUNK_STORE_CODEC") or None,
+        level=int(os.getenv("CHUNK_STORE_LEVEL", 3)),
+        block_bytes=int(os.getenv("CHUNK_STORE_BLOCK_BYTES", 16384)),
+    )
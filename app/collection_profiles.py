@@ -0,0 +1,171 @@
+import os
+from typing import Any, Dict, Optional
+from qdrant_client.http import models
+
+PAYLOAD_SCHEMAS = {
+    # Keyword index flagged as the tenant key, so Qdrant co-locates each tenant's points
+    "tenant": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+    "keyword": models.PayloadSchemaType.KEYWORD,
+    "integer": models.PayloadSchemaType.INTEGER,
+    "float": models.PayloadSchemaType.FLOAT,
+    "bool": models.PayloadSchemaType.BOOL,
+    "datetime": models.PayloadSchemaType.DATETIME,
+    "text": models.PayloadSchemaType.TEXT,
+}
+
+class CollectionProfile:
+    """
+    Storage and search settings for a Qdrant collection.
+
+    Covers the HNSW graph (`m`, `ef_construct`), the per-query `hnsw_ef`,
+    int8 scalar or binary quantization (searched in RAM, then rescored with
+    the original vectors fetched with `oversampling`), on-disk storage of the
+    original vectors and payload, and payload indexes for filtered search.
+    Graph, quantization and storage settings apply when a collection is
+    created; search settings apply to every query.
+    """
+    def __init__(
+        self,
+        name: str = "default",
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construct: Optional[int] = None,
+        hnsw_ef: Optional[int] = None,
+        quantization: Optional[str] = None,
+        rescore: bool = True,
+        oversampling: float = 2.0,
+        on_disk_vectors: bool = False,
+        on_disk_payload: bool = False,
+        payload_indexes: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            name (str): Profile name, for logs and benchmarks.
+            hnsw_m (Optional[int]): Edges per HNSW node. Qdrant's default (16) if None.
+            hnsw_ef_construct (Optional[int]): Build-time candidate list size. Qdrant's default (100) if None.
+            hnsw_ef (Optional[int]): Search-time candidate list size. Qdrant's default if None.
+            quantization (Optional[str]): None, "scalar" (int8) or "binary".
+            rescore (bool): Re-rank quantized candidates with the original vectors.
+            oversampling (float): Candidates fetched per result before rescoring.
+            on_disk_vectors (bool): Keep original vectors on disk (memmap) instead of RAM.
+            on_disk_payload (bool): Keep payloads on disk instead of RAM.
+            payload_indexes (Optional[Dict[str, str]]): Field -> schema ("keyword", "integer", ...,
+                or "tenant" for the tenant key). Metadata fields are "metadata.<name>".
+        """
+        if quantization not in (None, "scalar", "binary"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.name = name
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.hnsw_ef = hnsw_ef
+        self.quantization = quantization
+        self.rescore = rescore
+        self.oversampling = oversampling
+        self.on_disk_vectors = on_disk_vectors
+        self.on_disk_payload = on_disk_payload
+        if payload_indexes is None:
+            payload_indexes = {"doc_id": "keyword", "tenant": "tenant"}
+        self.payload_indexes = payload_indexes
+
+    def create_kwargs(self, dim: int) -> Dict[str, Any]:
+        """
+        Keyword arguments for `create_collection` (everything but the name).
+        """
+        kwargs: Dict[str, Any] = {
+            "vectors_config": models.VectorParams(
+                size=dim,
+                distance=models.Distance.COSINE,
+                on_disk=self.on_disk_vectors or None,
+            ),
+        }
+        if self.hnsw_m is not None or self.hnsw_ef_construct is not None:
+            kwargs["hnsw_config"] = models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+        if self.on_disk_payload:
+            kwargs["on_disk_payload"] = True
+        if self.quantization == "scalar":
+            kwargs["quantization_config"] = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        elif self.quantization == "binary":
+            kwargs["quantization_config"] = models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+        return kwargs
+
+    def payload_schemas(self) -> Dict[str, Any]:
+        return {field: PAYLOAD_SCHEMAS[schema] for field, schema in self.payload_indexes.items()}
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        """
+        Per-query search parameters, or None to use the collection defaults.
+        """
+        quantization = None
+        if self.quantization is not None:
+            quantization = models.QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        if self.hnsw_ef is None and quantization is None:
+            return None
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def estimated_ram_bytes(self, points: int, dim: int) -> int:
+        """
+        Rough resident memory for vectors + HNSW links (payload excluded).
+        """
+        ram = 0 if self.on_disk_vectors else points * dim * 4
+        if self.quantization == "scalar":
+            ram += points * dim
+        elif self.quantization == "binary":
+            ram += points * dim // 8
+        # Layer 0 has 2*m links per node, 4 bytes each
+        ram += points * 2 * (self.hnsw_m or 16) * 4
+        return ram
+
+PROFILES: Dict[str, CollectionProfile] = {
+    # Qdrant defaults: everything in RAM, no quantization
+    "default": CollectionProfile("default"),
+    # Originals on disk, int8 copies in RAM: ~4x less vector memory, rescored for accuracy
+    "balanced": CollectionProfile(
+        "balanced", hnsw_m=16, hnsw_ef_construct=128, hnsw_ef=128,
+        quantization="scalar", on_disk_vectors=True,
+    ),
+    # For tens of millions of chunks: 1 bit per dimension in RAM, payloads on disk
+    "low_memory": CollectionProfile(
+        "low_memory", hnsw_m=16, hnsw_ef_construct=100, hnsw_ef=128,
+        quantization="binary", oversampling=3.0, on_disk_vectors=True, on_disk_payload=True,
+    ),
+    # Denser graph and wider search when recall matters more than RAM and latency
+    "high_recall": CollectionProfile("high_recall", hnsw_m=32, hnsw_ef_construct=256, hnsw_ef=256),
+}
+
+def profile_from_env() -> CollectionProfile:
+    """
+    The QDRANT_PROFILE profile, with any QDRANT_HNSW_* / QDRANT_QUANTIZATION / QDRANT_ON_DISK_* overrides.
+    """
+    name = os.getenv("QDRANT_PROFILE", "default")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown QDRANT_PROFILE: {name} (choose from {', '.join(PROFILES)})")
+    base = PROFILES[name]
+
+    def env_int(key: str, default: Optional[int]) -> Optional[int]:
+        value = os.getenv(key)
+        return int(value) if value else default
+
+    def env_bool(key: str, default: bool) -> bool:
+        value = os.getenv(key)
+        return value.lower() == "true" if value else default
+
+    quantization = os.getenv("QDRANT_QUANTIZATION", base.quantization or "none")
+    payload_indexes = base.payload_indexes
+    if os.getenv("QDRANT_PAYLOAD_INDEXES"):
+        # "doc_id:keyword,chunk_index:integer"
+        payload_indexes = dict(item.split(":", 1) for item in os.getenv("QDRANT_PAYLOAD_INDEXES").split(","))
+    return CollectionProfile(
+        name,
+        hnsw_m=env_int("QDRANT_HNSW_M", base.hnsw_m),
+        hnsw_ef_construct=env_int("QDRANT_HNSW_EF_CONSTRUCT", base.hnsw_ef_construct),
+        hnsw_ef=env_int("QDRANT_HNSW_EF", base.hnsw_ef),
+        quantization=None if quantization == "none" else quantization,
+        rescore=env_bool("QDRANT_RESCORE", base.rescore),
+        oversampling=float(os.getenv("QDRANT_OVERSAMPLING", base.oversampling)),
+        on_disk_vectors=env_bool("QDRANT_ON_DISK_VECTORS", base.on_disk_vectors),
+        on_disk_payload=env_bool("QDRANT_ON_DISK_PAYLOAD", base.on_disk_payload),
+        payload_indexes=payload_indexes,
+    )
@@ -0,0 +1,186 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from generation import assemble_prompt, estimate_tokens
+from metrics import metrics
+
+WORD_RE = re.compile(r"\w+")
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks into a compact, token-bounded prompt.
+
+    - Chunks of the same document whose text overlaps (the tail of one is the
+      head of the next, as produced by the chunkers' overlap) are merged into
+      a single passage.
+    - Near-duplicates (word-shingle Jaccard >= `dedup_threshold`) are dropped,
+      keeping the higher-ranked copy.
+    - Passages are admitted in relevance order until `token_budget` is reached;
+      the first passage that doesn't fit is truncated if enough budget remains.
+    - The admitted passages are written in a stable order (by document, then
+      position in it), so the same sources always produce the same prompt
+      prefix, chunks of a document read in order, and the LLM server can reuse
+      its prompt cache.
+
+    Tokens are counted with the Hugging Face tokenizer named by `tokenizer_name`
+    when `transformers` is installed, otherwise with a character heuristic.
+    """
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        tokenizer_name: Optional[str] = None,
+        min_overlap: int = 20,
+        dedup_threshold: float = 0.9,
+    ):
+        """
+        Args:
+            token_budget (int): Maximum tokens of document context in the prompt.
+            tokenizer_name (Optional[str]): Hugging Face tokenizer matching the target model.
+            min_overlap (int): Shortest shared text (in characters) treated as chunk overlap.
+            dedup_threshold (float): Shingle similarity above which a passage is a duplicate.
+        """
+        self.token_budget = token_budget
+        self.tokenizer_name = tokenizer_name
+        self.min_overlap = min_overlap
+        self.dedup_threshold = dedup_threshold
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+
+    @property
+    def tokenizer(self):
+        if not self._tokenizer_loaded:
+            self._tokenizer_loaded = True
+            if self.tokenizer_name:
+                try:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                except Exception as e:
+                    print(f"Could not load tokenizer {self.tokenizer_name}, estimating tokens: {e}")
+        return self._tokenizer
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return estimate_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most `max_tokens` tokens."""
+        if self.tokenizer is None:
+            return text[:max_tokens * 4]
+        ids = self.tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+        return self.tokenizer.decode(ids)
+
+    @metrics.timed("prompt")
+    def build(
+        self,
+        query: str,
+        results: List[Tuple[Any, float, str]],
+        positions: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> Tuple[str, Dict[str, int]]:
+        """
+        Assemble the prompt for a query from (id, score, text) results, best first.
+
+        Args:
+            query (str): The user's query.
+            results (List[Tuple[Any, float, str]]): Retrieved chunks in relevance order.
+            positions (Optional[Dict[str, Tuple[str, int]]]): Chunk id -> (doc_id, chunk_index),
+                as filled by `RAGPipeline.retrieve`. Chunks without a position are
+                treated as one unknown document and written after the others, by ID.
+
+        Returns:
+            Tuple[str, Dict[str, int]]: The prompt, and token stats ("prompt_tokens",
+                "naive_prompt_tokens", "prompt_tokens_saved", "passages", "merged", "duplicates").
+        """
+        positions = positions or {}
+        passages = [
+            {"key": str(doc_id), "text": text, "position": positions.get(str(doc_id))}
+            for doc_id, _, text in results if text
+        ]
+        before = len(passages)
+        passages = self._merge_overlaps(passages)
+        merged = before - len(passages)
+        before = len(passages)
+        passages = self._drop_duplicates(passages)
+        duplicates = before - len(passages)
+
+        kept = []
+        used = 0
+        for passage in passages:
+            tokens = self.count_tokens(passage["text"])
+            if used + tokens > self.token_budget:
+                remaining = self.token_budget - used
+                if remaining >= 32:
+                    kept.append(dict(passage, text=self.truncate(passage["text"], remaining)))
+                break
+            kept.append(passage)
+            used += tokens
+
+        kept.sort(key=self._order)
+        prompt = assemble_prompt(query, [passage["text"] for passage in kept])
+        prompt_tokens = self.count_tokens(prompt)
+        naive_tokens = self.count_tokens(assemble_prompt(query, [text for _, _, text in results]))
+        metrics.tokens("prompt", prompt_tokens)
+        return prompt, {
+            "prompt_tokens": prompt_tokens,
+            "naive_prompt_tokens": naive_tokens,
+            "prompt_tokens_saved": max(0, naive_tokens - prompt_tokens),
+            "passages": len(kept),
+            "merged": merged,
+            "duplicates": duplicates,
+        }
+
+    def _overlap(self, left: str, right: str) -> int:
+        """Length of the longest suffix of `left` that is a prefix of `right` (0 if < min_overlap)."""
+        if len(left) < self.min_overlap or len(right) < self.min_overlap:
+            return 0
+        head = right[:self.min_overlap]
+        start = max(0, len(left) - len(right))
+        pos = left.find(head, start)
+        while pos != -1:
+            if right.startswith(left[pos:]):
+                return len(left) - pos
+            pos = left.find(head, pos + 1)
+        return 0
+
+    @staticmethod
+    def _order(passage: Dict[str, Any]) -> tuple:
+        position = passage["position"]
+        if position is None:
+            return (1, "", 0, passage["key"])
+        return (0, position[0], position[1], passage["key"])
+
+    @staticmethod
+    def _document(passage: Dict[str, Any]) -> Optional[str]:
+        return passage["position"][0] if passage["position"] is not None else None
+
+    def _merge_overlaps(self, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        merged = True
+        while merged:
+            merged = False
+            for i, first in enumerate(passages):
+                for j, second in enumerate(passages):
+                    if i == j or self._document(first) != self._document(second):
+                        continue
+                    overlap = self._overlap(first["text"], second["text"])
+                    if overlap:
+                        # Keep the higher-ranked passage's slot and the earlier chunk's key and position
+                        keep, drop = (i, j) if i < j else (j, i)
+                        passages[keep] = dict(first, text=first["text"] + second["text"][overlap:])
+                        del passages[drop]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return passages
+
+    def _drop_duplicates(self, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept: List[Dict[str, Any]] = []
+        shingles: List[set] = []
+        for passage in passages:
+            words = WORD_RE.findall(passage["text"].lower())
+            current = {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+            if any(len(current & other) / (len(current | other) or 1) >= self.dedup_threshold for other in shingles):
+                continue
+            kept.append(passage)
+            shingles.append(current)
+        return kept
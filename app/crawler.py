@@ -0,0 +1,431 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urldefrag, urlsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import httpx
+
+from ingestion import content_hash, extract_html
+from http_clients import SCRAPER_HEADERS
+from metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetch_cache (
+    scope TEXT NOT NULL,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    links TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    PRIMARY KEY (scope, url)
+);
+"""
+
+_DONE = object()
+
+class FetchCache:
+    """
+    Validators (ETag / Last-Modified), text hash and links of every crawled page.
+
+    Lets a re-crawl send conditional requests and skip pages that didn't
+    change. Entries are scoped (e.g. per collection and tenant) so a page
+    already ingested into one collection is still ingested into another.
+    """
+    def __init__(self, path: str = "crawl_cache.db"):
+        """
+        Args:
+            path (str): SQLite database file. ":memory:" for tests.
+        """
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def get(self, scope: str, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, size, links FROM fetch_cache WHERE scope = ? AND url = ?",
+                (scope, url),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, digest, size, links = row
+        return {"etag": etag, "last_modified": last_modified, "content_hash": digest, "size": size, "links": json.loads(links)}
+
+    def put_many(self, scope: str, entries: Dict[str, Dict[str, Any]]):
+        """
+        Record pages by URL, each with "etag", "last_modified", "content_hash", "size" and "links".
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fetch_cache (scope, url, etag, last_modified, content_hash, size, links, fetched) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (scope, url, e["etag"], e["last_modified"], e["content_hash"], e["size"], json.dumps(e["links"]), now)
+                    for url, e in entries.items()
+                ],
+            )
+
+class HostRateLimiter:
+    """
+    Spaces request starts to each host at least 1 / `requests_per_second` apart.
+
+    Each caller reserves the next free slot for its host and sleeps until
+    then, so concurrent workers share a host's budget without a lock
+    (everything runs on one event loop).
+    """
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next: Dict[str, float] = {}
+
+    async def wait(self, host: str):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        start = max(now, self._next.get(host, now))
+        self._next[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def back_off(self, host: str, seconds: float):
+        """Push the host's next slot out, e.g. after a 429 with Retry-After."""
+        self._next[host] = max(self._next.get(host, 0.0), time.monotonic() + seconds)
+
+def same_site(url: str, host: str) -> bool:
+    parts = urlsplit(url)
+    return parts.scheme in ("http", "https") and parts.netloc == host
+
+class SiteCrawler:
+    """
+    Concurrent crawler for one site, yielding the text of new and changed pages.
+
+    Starts from the site's sitemaps (from robots.txt, else /sitemap.xml) and
+    the start URL, then follows links on the same host up to `max_depth`
+    hops and `max_pages` pages. `concurrency` workers fetch in parallel,
+    each host is rate limited, and robots.txt is honored. Pages are sent
+    with If-None-Match / If-Modified-Since from the fetch cache: a 304, or
+    a 200 whose extracted text hashes the same as last time, is not yielded
+    (cached links are still followed). Pages are yielded as soon as they are
+    parsed, through a bounded queue, so the consumer's chunking and
+    embedding overlap with fetching and a slow consumer throttles the crawl.
+    """
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        cache: Optional[FetchCache] = None,
+        scope: str = "",
+        concurrency: int = 8,
+        host_rps: float = 4.0,
+        max_pages: int = 100,
+        max_depth: int = 2,
+        sitemaps: bool = True,
+        respect_robots: bool = True,
+        max_retries: int = 2,
+    ):
+        """
+        Args:
+            client (httpx.AsyncClient): Client to fetch with (should follow redirects).
+            cache (Optional[FetchCache]): Enables conditional requests and skipping unchanged pages.
+            scope (str): Fetch cache scope, e.g. the target collection and tenant.
+            concurrency (int): Pages fetched at once.
+            host_rps (float): Requests per second per host; 0 for no limit.
+            max_pages (int): Most pages to fetch.
+            max_depth (int): Link hops followed from the start URL and sitemap entries.
+            sitemaps (bool): Seed the crawl from the site's sitemaps.
+            respect_robots (bool): Skip URLs disallowed by robots.txt.
+            max_retries (int): Retries after a 429/503, waiting for Retry-After.
+        """
+        self.client = client
+        self.cache = cache
+        self.scope = scope
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(host_rps)
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.sitemaps = sitemaps
+        self.respect_robots = respect_robots
+        self.max_retries = max_retries
+        self.robots: Optional[RobotFileParser] = None
+        self.seen: set = set()
+        self._fetched: Dict[str, Dict[str, Any]] = {}
+        self._started = 0.0
+        self.stats: Dict[str, float] = {
+            "pages": 0,
+            "changed": 0,
+            "unchanged": 0,
+            "not_modified": 0,
+            "skipped": 0,
+            "errors": 0,
+            "sitemap_urls": 0,
+            "bytes_downloaded": 0,
+            "bytes_saved": 0,
+            "elapsed_seconds": 0.0,
+            "pages_per_sec": 0.0,
+        }
+
+    async def crawl(self, start_url: str) -> AsyncIterator[Dict[str, str]]:
+        """
+        Crawl from `start_url`.
+
+        Yields:
+            Dict[str, str]: {"url", "text"} for each new or changed page.
+        """
+        self._started = time.perf_counter()
+        start_url = urldefrag(start_url)[0]
+        host = urlsplit(start_url).netloc
+        frontier: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        pages: "asyncio.Queue" = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        def enqueue(url: str, depth: int):
+            url = urldefrag(url)[0]
+            if url in self.seen or len(self.seen) >= self.max_pages or not same_site(url, host):
+                return
+            if self.robots is not None and not self.robots.can_fetch(SCRAPER_HEADERS["User-Agent"], url):
+                self.stats["skipped"] += 1
+                return
+            self.seen.add(url)
+            frontier.put_nowait((url, depth))
+
+        origin = f"{urlsplit(start_url).scheme}://{host}"
+        if self.respect_robots:
+            await self._load_robots(origin)
+        enqueue(start_url, 0)
+        if self.sitemaps:
+            for url in await self._sitemap_urls(origin):
+                enqueue(url, 0)
+
+        async def worker():
+            while True:
+                url, depth = await frontier.get()
+                try:
+                    page, links = await self._fetch_page(url)
+                    if depth < self.max_depth:
+                        for link in links:
+                            enqueue(link, depth + 1)
+                    if page is not None:
+                        await pages.put(page)
+                except Exception as e:
+                    print(f"Error crawling {url}: {e}")
+                    self.stats["errors"] += 1
+                    metrics.error("crawl_fetch")
+                finally:
+                    frontier.task_done()
+
+        async def finish():
+            await frontier.join()
+            await pages.put(_DONE)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        tasks.append(asyncio.create_task(finish()))
+        try:
+            while True:
+                page = await pages.get()
+                if page is _DONE:
+                    break
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            elapsed = time.perf_counter() - self._started
+            fetched = self.stats["pages"] + self.stats["not_modified"]
+            self.stats["elapsed_seconds"] = elapsed
+            self.stats["pages_per_sec"] = fetched / elapsed if elapsed > 0 else 0.0
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """GET with the host's rate limit, retrying 429/503 after Retry-After."""
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.wait(host)
+            response = await metrics.measure("crawl_fetch", self.client.get(url, headers=headers))
+            self.stats["bytes_downloaded"] += response.num_bytes_downloaded
+            if response.status_code not in (429, 503) or attempt == self.max_retries:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            self.limiter.back_off(host, float(retry_after) if retry_after.isdigit() else 2.0 ** attempt)
+        return response
+
+    async def _load_robots(self, origin: str):
+        try:
+            response = await self._get(f"{origin}/robots.txt")
+        except httpx.HTTPError:
+            return
+        if response.status_code == 200:
+            self.robots = RobotFileParser()
+            self.robots.parse(response.text.splitlines())
+
+    async def _sitemap_urls(self, origin: str, max_sitemaps: int = 50) -> List[str]:
+        """Page URLs listed in the site's sitemaps, following sitemap indexes."""
+        pending = list((self.robots.site_maps() if self.robots is not None else None) or [f"{origin}/sitemap.xml"])
+        urls: List[str] = []
+        visited = set()
+        while pending and len(visited) < max_sitemaps and len(urls) < self.max_pages:
+            sitemap = pending.pop(0)
+            if sitemap in visited:
+                continue
+            visited.add(sitemap)
+            try:
+                response = await self._get(sitemap)
+                if response.status_code != 200:
+                    continue
+                content = response.content
+                if content[:2] == b"\x1f\x8b":
+                    content = gzip.decompress(content)
+                root = ElementTree.fromstring(content)
+            except (httpx.HTTPError, ElementTree.ParseError, OSError) as e:
+                print(f"Error reading sitemap {sitemap}: {e}")
+                continue
+            locs = [element.text.strip() for element in root.iter() if element.tag.endswith("loc") and element.text]
+            if root.tag.endswith("sitemapindex"):
+                pending.extend(locs)
+            else:
+                urls.extend(locs)
+        self.stats["sitemap_urls"] = len(urls)
+        return urls
+
+    async def _fetch_page(self, url: str) -> Tuple[Optional[Dict[str, str]], List[str]]:
+        """
+        Fetch and parse one page. Returns the page to ingest (None if unchanged or not HTML) and its links.
+        """
+        cached = self.cache.get(self.scope, url) if self.cache is not None else None
+        headers = {}
+        if cached is not None and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached is not None and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self._get(url, headers)
+        if response.status_code == 304 and cached is not None:
+            self.stats["not_modified"] += 1
+            self.stats["bytes_saved"] += cached["size"]
+            return None, cached["links"]
+        if response.status_code >= 400:
+            print(f"Error crawling {url}: HTTP {response.status_code}")
+            self.stats["errors"] += 1
+            metrics.error("crawl_fetch")
+            return None, []
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            self.stats["skipped"] += 1
+            return None, []
+
+        self.stats["pages"] += 1
+        # Parsing is CPU-bound; keep it off the event loop
+        text, links = await asyncio.to_thread(extract_html, response.content, str(response.url))
+        digest = content_hash(text)
+        self._fetched[url] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": digest,
+            "size": len(response.content),
+            "links": links,
+        }
+        if not text:
+            self.stats["skipped"] += 1
+            return None, links
+        if cached is not None and cached["content_hash"] == digest:
+            self.stats["unchanged"] += 1
+            return None, links
+        self.stats["changed"] += 1
+        return {"url": url, "text": text}, links
+
+    def save_cache(self):
+        """
+        Record validators and hashes of the pages fetched. Call once the yielded pages are stored,
+        so a failed ingestion isn't mistaken for an unchanged site next time.
+        """
+        if self.cache is not None and self._fetched:
+            self.cache.put_many(self.scope, self._fetched)
+            self._fetched = {}
+
+def crawl_scope(collection: str, tenant: Optional[str] = None) -> str:
+    return f"{collection}/{tenant or ''}"
+
+def crawler_settings() -> Dict[str, Any]:
+    """SiteCrawler settings from CRAWL_CONCURRENCY, CRAWL_HOST_RPS and CRAWL_RESPECT_ROBOTS."""
+    return {
+        "concurrency": int(os.getenv("CRAWL_CONCURRENCY", 8)),
+        "host_rps": float(os.getenv("CRAWL_HOST_RPS", 4)),
+        "respect_robots": os.getenv("CRAWL_RESPECT_ROBOTS", "true").lower() == "true",
+    }
+
+def iter_crawled_documents(
+    pages: AsyncIterator[Dict[str, str]],
+    loop: asyncio.AbstractEventLoop,
+    tenant: Optional[str] = None,
+    metadata: Optional[dict] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Documents for `IngestionPipeline.run` from a crawl running on `loop`, pulled one page at a time.
+
+    Call from a thread other than the loop's (the pipeline runs in a worker thread).
+    """
+    while True:
+        try:
+            page = asyncio.run_coroutine_threadsafe(pages.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+        yield {"id": page["url"], "text": page["text"], "tenant": tenant, "metadata": metadata}
+
+@contextmanager
+def background_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    """An event loop running in a daemon thread, for async crawling from sync code."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="crawl-loop", daemon=True)
+    thread.start()
+    try:
+        yield loop
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+def crawl_site(
+    pipeline,
+    collection: str,
+    url: str,
+    cache: Optional[FetchCache] = None,
+    tenant: Optional[str] = None,
+    metadata: Optional[dict] = None,
+    **options,
+) -> Dict[str, Any]:
+    """
+    Crawl a site and ingest its new and changed pages, from synchronous code (ingestion jobs).
+
+    Args:
+        pipeline (IngestionPipeline): Chunks, embeds and upserts the pages.
+        collection (str): Target collection.
+        url (str): Start URL.
+        cache (Optional[FetchCache]): Fetch cache for conditional requests.
+        tenant (Optional[str]): Tenant the chunks are stored for.
+        metadata (Optional[dict]): Metadata stored with every chunk.
+        **options: `SiteCrawler` arguments (max_pages, max_depth, sitemaps, ...).
+
+    Returns:
+        Dict[str, Any]: Ingestion stats, with the crawl stats under "crawl".
+    """
+    with background_loop() as loop:
+        client = httpx.AsyncClient(
+            headers=SCRAPER_HEADERS,
+            timeout=httpx.Timeout(float(os.getenv("SCRAPE_TIMEOUT", 10))),
+            follow_redirects=True,
+        )
+        crawler = SiteCrawler(client, cache, scope=crawl_scope(collection, tenant), **{**crawler_settings(), **options})
+        pages = crawler.crawl(url)
+        try:
+            stats = pipeline.run(collection, iter_crawled_documents(pages, loop, tenant, metadata))
+        finally:
+            asyncio.run_coroutine_threadsafe(pages.aclose(), loop).result()
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+    crawler.save_cache()
+    return {**stats, "crawl": crawler.stats}
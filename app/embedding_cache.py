@@ -0,0 +1,202 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+
+from metrics import metrics
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace so trivially re-formatted chunks share a cache entry.
+    """
+    return " ".join(text.split())
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache with an in-memory LRU tier and an
+    optional on-disk tier that survives restarts.
+
+    Keys are sha256(model name, normalized text). The disk tier is a fixed
+    capacity memory-mapped float32 matrix (`vectors.f32`) plus an append-only
+    key index (`index.log`); when it is full the least recently inserted slot
+    is reused.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        memory_entries: int = 10000,
+        disk_entries: int = 1000000,
+    ):
+        """
+        Args:
+            model_name (str): Embedding model name, part of every key.
+            cache_dir (Optional[str]): Directory for the disk tier. Memory only if None.
+            memory_entries (int): Capacity of the in-memory LRU tier.
+            disk_entries (int): Capacity (rows) of the disk tier.
+        """
+        self.model_name = model_name
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._dir = None
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._log = None
+        self._log_lines = 0
+        if cache_dir:
+            safe_name = model_name.replace("/", "_")
+            self._dir = os.path.join(cache_dir, safe_name)
+            os.makedirs(self._dir, exist_ok=True)
+            self._load_disk_tier()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for a list of texts.
+
+        Args:
+            texts (List[str]): Texts to look up.
+
+        Returns:
+            List[Optional[np.ndarray]]: Cached vector per text, None on a miss.
+        """
+        results: List[Optional[np.ndarray]] = []
+        misses = 0
+        with self._lock:
+            for text in texts:
+                k = self.key(text)
+                vector = self._memory.get(k)
+                if vector is not None:
+                    self._memory.move_to_end(k)
+                elif k in self._slots:
+                    vector = np.array(self._vectors[self._slots[k]])
+                    self._remember(k, vector)
+                if vector is None:
+                    misses += 1
+                results.append(vector)
+            self.misses += misses
+            self.hits += len(texts) - misses
+        metrics.cache("embedding", hits=len(texts) - misses, misses=misses)
+        return results
+
+    def put_many(self, texts: List[str], vectors) -> None:
+        """
+        Store embeddings for a list of texts in both tiers.
+
+        Args:
+            texts (List[str]): Texts that were embedded.
+            vectors: Matching vectors (array-like, one row per text).
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            new_slots = []
+            for text, vector in zip(texts, vectors):
+                k = self.key(text)
+                self._remember(k, vector)
+                if self._dir is not None and k not in self._slots:
+                    new_slots.append((k, self._store(k, vector)))
+            if new_slots:
+                # Vectors hit the mmap before the index points at them
+                self._vectors.flush()
+                self._log.write("".join(f"{k} {slot}\n" for k, slot in new_slots))
+                self._log.flush()
+                self._log_lines += len(new_slots)
+                if self._log_lines > 2 * self.disk_entries:
+                    self._compact_log()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss counters and tier sizes.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._slots),
+        }
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._vectors is not None:
+            self._vectors.flush()
+
+    def _remember(self, k: str, vector: np.ndarray):
+        self._memory[k] = vector
+        self._memory.move_to_end(k)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, k: str, vector: np.ndarray) -> int:
+        if self._vectors is None:
+            self._open_vectors(vector.shape[0])
+        if len(self._slots) < self.disk_entries:
+            slot = len(self._slots)
+        else:
+            _, slot = self._slots.popitem(last=False)
+        self._vectors[slot] = vector
+        self._slots[k] = slot
+        return slot
+
+    def _open_vectors(self, dim: int):
+        self._dim = dim
+        path = os.path.join(self._dir, "vectors.f32")
+        mode = "r+" if os.path.exists(path) else "w+"
+        self._vectors = np.memmap(path, dtype=np.float32, mode=mode, shape=(self.disk_entries, dim))
+        with open(os.path.join(self._dir, "meta.json"), "w") as f:
+            json.dump({"dim": dim, "capacity": self.disk_entries}, f)
+
+    def _load_disk_tier(self):
+        meta_path = os.path.join(self._dir, "meta.json")
+        log_path = os.path.join(self._dir, "index.log")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("capacity") != self.disk_entries:
+                # Layout changed; start over rather than misread rows
+                for name in ("vectors.f32", "index.log", "meta.json"):
+                    path = os.path.join(self._dir, name)
+                    if os.path.exists(path):
+                        os.remove(path)
+            else:
+                self._open_vectors(meta["dim"])
+                owner: Dict[int, str] = {}
+                if os.path.exists(log_path):
+                    with open(log_path) as f:
+                        for line in f:
+                            parts = line.split()
+                            if len(parts) != 2:
+                                continue  # torn write from a crash
+                            k, slot = parts[0], int(parts[1])
+                            previous = owner.get(slot)
+                            if previous is not None:
+                                self._slots.pop(previous, None)
+                            owner[slot] = k
+                            self._slots.pop(k, None)
+                            self._slots[k] = slot
+                            self._log_lines += 1
+        self._log = open(log_path, "a")
+
+    def _compact_log(self):
+        log_path = os.path.join(self._dir, "index.log")
+        tmp_path = log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join(f"{k} {slot}\n" for k, slot in self._slots.items()))
+        self._log.close()
+        os.replace(tmp_path, log_path)
+        self._log = open(log_path, "a")
+        self._log_lines = len(self._slots)
@@ -1,19 +1,336 @@
-from typing import List
-from sentence_transformers import SentenceTransformer
+import os
+import time
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+from metrics import metrics
+
+class OnnxEmbeddingBackend:
+    """
+    ONNX Runtime implementation of a sentence-transformers mean-pooling model.
+
+    Exposes the same `encode` call as `SentenceTransformer`, but runs on
+    onnxruntime + tokenizers, so torch is never imported. Texts are sorted by
+    length before batching so each batch pads to similar lengths, and the
+    session's intra-op thread count is configurable. With `quantize=True` the
+    model is dynamically quantized to int8 once and the result is reused.
+    """
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        model_path: Optional[str] = None,
+        quantize: bool = False,
+        intra_op_threads: int = 0,
+        batch_size: int = 32,
+        max_length: int = 256,
+        normalize: bool = True,
+        session: Any = None,
+        tokenizer: Any = None,
+    ):
+        """
+        Args:
+            model_name (str): Hugging Face model ("sentence-transformers/" is implied without an org).
+            model_path (Optional[str]): Local .onnx file instead of the model's hub export.
+            quantize (bool): Use a dynamically int8-quantized copy of the model.
+            intra_op_threads (int): onnxruntime intra-op threads; 0 lets the runtime decide.
+            batch_size (int): Texts per inference call.
+            max_length (int): Token truncation length (all-MiniLM-L6-v2 was trained with 256).
+            normalize (bool): L2-normalize outputs, as the sentence-transformers pipeline does.
+            session: Prebuilt onnxruntime session (skips loading).
+            tokenizer: Prebuilt `tokenizers.Tokenizer` (skips loading).
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.normalize = normalize
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+        if tokenizer is None:
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=max_length)
+        tokenizer.enable_padding()
+        self.tokenizer = tokenizer
+
+        if session is None:
+            import onnxruntime as ort
+            if model_path is None:
+                from huggingface_hub import hf_hub_download
+                model_path = hf_hub_download(repo_id, "onnx/model.onnx")
+            if quantize:
+                model_path = self._quantized(model_path)
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = intra_op_threads
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.session = session
+        self._input_names = {i.name for i in session.get_inputs()}
+
+    @staticmethod
+    def _quantized(model_path: str) -> str:
+        quantized_path = os.path.splitext(model_path)[0] + "_int8.onnx"
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            print(f"Quantizing {model_path} to int8...")
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: Optional[int] = None,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        """
+        Embed one text (1-D result) or a list of texts (2-D float32 result).
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = batch_size or self.batch_size
+        out: Optional[np.ndarray] = None
+
+        # Longest first, so batches pad to similar lengths and the first allocates the output
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            pooled = self._embed_batch([texts[i] for i in indices])
+            if out is None:
+                out = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            out[indices] = pooled
+        if out is None:
+            out = np.empty((0, 0), dtype=np.float32)
+
+        if self.normalize or normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms == 0, 1, norms)
+        return out[0] if single else out
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real (unpadded) tokens
+        mask = attention_mask[:, :, None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+# Models loaded in this process. Loading one before forking workers (see serve.py)
+# lets every worker reuse the parent's copy, shared copy-on-write.
+_backends: Dict[tuple, Any] = {}
+_backends_lock = threading.Lock()
+
+def load_embedding_backend(
+    model_name: str,
+    backend: str = "torch",
+    threads: int = 0,
+    quantize: bool = False,
+    model_path: Optional[str] = None,
+):
+    """
+    Build the embedding model for a backend, or return the one already loaded with the same settings.
+
+    Every backend exposes sentence-transformers' `encode(texts, convert_to_numpy=..., normalize_embeddings=...)`.
+
+    Args:
+        model_name (str): Embedding model name.
+        backend (str): "torch" (sentence-transformers) or "onnx" (onnxruntime).
+        threads (int): CPU threads for inference; 0 keeps the library default.
+        quantize (bool): int8-quantize the model (onnx only).
+        model_path (Optional[str]): Local .onnx file (onnx only).
+    """
+    key = (model_name, backend, threads, quantize, model_path)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = _build_backend(model_name, backend, threads, quantize, model_path)
+        return _backends[key]
+
+def _build_backend(model_name: str, backend: str, threads: int, quantize: bool, model_path: Optional[str]):
+    if backend == "onnx":
+        return OnnxEmbeddingBackend(model_name, model_path=model_path, quantize=quantize, intra_op_threads=threads)
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    # Imported here so the onnx backend never loads torch
+    from sentence_transformers import SentenceTransformer
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name)
+
+def backend_settings(model_name: str = "all-MiniLM-L6-v2", backend: Optional[str] = None) -> Dict[str, Any]:
+    """
+    `load_embedding_backend` arguments from EMBED_BACKEND / EMBED_THREADS / EMBED_ONNX_* settings.
+    """
+    return {
+        "model_name": model_name,
+        "backend": backend or os.getenv("EMBED_BACKEND", "torch"),
+        "threads": int(os.getenv("EMBED_THREADS", 0)),
+        "quantize": os.getenv("EMBED_ONNX_QUANTIZE", "false").lower() == "true",
+        "model_path": os.getenv("EMBED_ONNX_PATH"),
+    }
+
+def preload_embedding_backend(model_name: str = "all-MiniLM-L6-v2") -> Any:
+    """
+    Load the configured embedding model without running it.
+
+    Meant for a parent process before it forks workers: no inference runs,
+    so no inference thread pools exist at fork time, and the workers'
+    `EmbeddingsUtils` pick up this copy instead of loading their own.
+    """
+    return load_embedding_backend(**backend_settings(model_name))
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching scheduler for single-text embedding requests.
+
+    Concurrent callers submit one text each; a background thread drains the
+    queue into batches of up to `max_batch_size`, waiting at most `max_wait_ms`
+    for a batch to fill, runs one `model.encode` per batch and resolves each
+    caller's future with its own vector.
+    """
+    def __init__(self, model: Any, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        """
+        Args:
+            model: Object with a sentence-transformers style `encode(List[str])` method.
+            max_batch_size (int): Upper bound on texts per encode call.
+            max_wait_ms (float): How long to hold a partial batch open for more requests.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._batches = 0
+        self._items = 0
+        self._queue_delay_total = 0.0
+        self._queue_delay_max = 0.0
+
+    def submit(self, text: str) -> Future:
+        """
+        Queue a text for embedding.
+
+        Args:
+            text (str): The input text to embed.
+
+        Returns:
+            Future: Resolves to the embedding vector (List[float]).
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Embed a single text, blocking until its batch has been encoded.
+        """
+        return self.submit(text).result()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Batch fill and queueing delay counters since startup.
+        """
+        batches = self._batches or 1
+        items = self._items or 1
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": self._items / batches,
+            "avg_batch_fill": self._items / batches / self.max_batch_size,
+            "avg_queue_delay_ms": self._queue_delay_total / items * 1000.0,
+            "max_queue_delay_ms": self._queue_delay_max * 1000.0,
+        }
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Anything already queued is taken without waiting
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                delay = started - enqueued
+                self._queue_delay_total += delay
+                self._queue_delay_max = max(self._queue_delay_max, delay)
+            self._batches += 1
+            self._items += len(batch)
+            metrics.batch("embed_microbatch", len(batch))
+            metrics.observe_stage("embed_queue", started - batch[0][2])
+
+            try:
+                vectors = self.model.encode([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector.tolist())
 
 class EmbeddingsUtils:
     """
     Utility class for generating text embeddings using Sentence Transformers.
     """
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", backend: Optional[str] = None):
         """
         Initialize the EmbeddingsUtils with a specific model.
         
         Args:
             model_name (str): The name of the sentence-transformers model to use.
                               Defaults to "all-MiniLM-L6-v2".
+            backend (Optional[str]): "torch" or "onnx". Defaults to EMBED_BACKEND, else "torch".
         """
-        self.model = SentenceTransformer(model_name)
+        settings = backend_settings(model_name, backend)
+        self.model = load_embedding_backend(**settings)
+        # Backends don't produce bit-identical vectors, so they don't share cache entries
+        cache_name = model_name
+        if settings["backend"] != "torch":
+            cache_name = f"{model_name}-{settings['backend']}" + ("-int8" if settings["quantize"] else "")
+        self.cache: Optional[EmbeddingCache] = None
+        if os.getenv("EMBED_CACHE", "true").lower() == "true":
+            self.cache = EmbeddingCache(
+                cache_name,
+                cache_dir=os.getenv("EMBED_CACHE_DIR"),
+                memory_entries=int(os.getenv("EMBED_CACHE_MEMORY_ENTRIES", 10000)),
+                disk_entries=int(os.getenv("EMBED_CACHE_DISK_ENTRIES", 1000000)),
+            )
+        self.batcher: Optional[EmbeddingBatcher] = None
+        if os.getenv("EMBED_MICROBATCH", "true").lower() == "true":
+            self.batcher = EmbeddingBatcher(
+                self.model,
+                max_batch_size=int(os.getenv("EMBED_BATCH_MAX_SIZE", 32)),
+                max_wait_ms=float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 2)),
+            )
 
     def get_embedding(self, text: str) -> List[float]:
         """
@@ -25,8 +342,37 @@ class EmbeddingsUtils:
         Returns:
             List[float]: The embedding vector.
         """
-        embedding = self.model.encode(text)
-        return embedding.tolist()
+        if self.cache is not None:
+            cached = self.cache.get_many([text])[0]
+            if cached is not None:
+                return cached.tolist()
+
+        with metrics.stage("embed"):
+            if self.batcher is not None:
+                # Coalesced with other concurrent single-text requests
+                embedding = self.batcher.embed(text)
+            else:
+                embedding = self.model.encode(text).tolist()
+
+        if self.cache is not None:
+            self.cache.put_many([text], [embedding])
+        return embedding
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        """
+        Async variant of `get_embedding` that never blocks the event loop.
+        """
+        if self.cache is not None:
+            cached = self.cache.get_many([text])[0]
+            if cached is not None:
+                return cached.tolist()
+        if self.batcher is not None:
+            with metrics.stage("embed"):
+                embedding = await asyncio.wrap_future(self.batcher.submit(text))
+            if self.cache is not None:
+                self.cache.put_many([text], [embedding])
+            return embedding
+        return await asyncio.to_thread(self.get_embedding, text)
 
     def batch_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
@@ -38,5 +384,43 @@ class EmbeddingsUtils:
         Returns:
             List[List[float]]: A list of embedding vectors.
         """
-        embeddings = self.model.encode(texts)
-        return embeddings.tolist()
+        return self.encode_array(texts).tolist()
+
+    def encode_array(self, texts: List[str], normalize: bool = False) -> np.ndarray:
+        """
+        Generate embeddings as one contiguous float32 matrix.
+
+        This is the bulk path: no per-vector Python lists are created, and the
+        result can be handed straight to Qdrant's columnar upload.
+
+        Args:
+            texts (List[str]): A list of input texts to embed.
+            normalize (bool): L2-normalize each row. Defaults to False.
+
+        Returns:
+            np.ndarray: Array of shape (len(texts), dim), dtype float32, C-contiguous.
+        """
+        if self.cache is None:
+            metrics.batch("embed", len(texts))
+            with metrics.stage("embed_batch"):
+                embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=normalize)
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        # Only texts the cache hasn't seen go through the model
+        cached = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            metrics.batch("embed", len(missing))
+            with metrics.stage("embed_batch"):
+                encoded = self.model.encode([texts[i] for i in missing], convert_to_numpy=True)
+            self.cache.put_many([texts[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                cached[i] = vector
+        if not cached:
+            return np.empty((0, 0), dtype=np.float32)
+
+        embeddings = np.stack(cached).astype(np.float32, copy=False)
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1, norms)
+        return np.ascontiguousarray(embeddings)
@@ -1,6 +1,27 @@
 import os
-from typing import List
-import openai
+import json
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional
+
+from http_clients import http_clients
+from metrics import metrics
+
+# Lower runs first: interactive queries ahead of batch work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap LLM token estimate (~4 characters per token for English text).
+    """
+    return max(1, len(text) // 4)
+
+def _record_completion(args: tuple, text: str):
+    if not text.startswith("Error"):
+        metrics.tokens("completion", estimate_tokens(text))
 
 def assemble_prompt(query: str, retrieved_chunks: List[str]) -> str:
     """
@@ -23,6 +44,7 @@ Question: {query}
 """
     return prompt
 
+@metrics.timed("llm", on_complete=_record_completion)
 def call_llm(prompt: str, model: str = "llama3.1:8b") -> str:
     """
     Call the LLM to generate a response.
@@ -64,6 +86,8 @@ def call_llm(prompt: str, model: str = "llama3.1:8b") -> str:
 
     # 1. OpenAI Example
     try:
+        # Imported on first use: it's slow to import and only needed with an API key
+        import openai
         # Using the older completions API if simulating text-davinci-003 style
         # or switching to ChatCompletion if model is gpt-3.5-turbo/gpt-4
         if "gpt-3.5-turbo" in model or "gpt-4" in model:
@@ -97,3 +121,546 @@ def call_llm(prompt: str, model: str = "llama3.1:8b") -> str:
     # payload = {"prompt": prompt, "model": "llama2"}
     # response = requests.post("http://localhost:11434/api/generate", json=payload)
     # return response.json()["response"]
+
+@metrics.timed("llm_stream", on_complete=_record_completion, first_item=True)
+def stream_llm(prompt: str, model: str = "llama3.1:8b") -> Iterator[str]:
+    """
+    Call the LLM and yield the response incrementally as it is generated.
+
+    Same backends as `call_llm`, but with streaming enabled so the caller can
+    forward tokens to the client before generation finishes.
+
+    Args:
+        prompt (str): The input prompt.
+        model (str): Model name. Defaults to "llama3.1:8b".
+
+    Yields:
+        str: Pieces of generated text, in order.
+    """
+    if "llama" in model.lower():
+        try:
+            import requests
+            base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+                "stream": True
+            }
+            # Ollama streams newline-delimited JSON objects until "done" is true
+            with requests.post(f"{base_url}/api/chat", json=payload, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    content = data.get("message", {}).get("content", "")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        break
+
+        except Exception as e:
+            yield f"Error calling Ollama: {str(e)}"
+        return
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        yield "Error: OPENAI_API_KEY not set. Cannot call LLM."
+        return
+
+    try:
+        import openai
+        client = openai.OpenAI(api_key=api_key)
+        if "gpt-3.5-turbo" in model or "gpt-4" in model:
+            stream = client.chat.completions.create(
+                model="gpt-3.5-turbo", # force chat model for this path
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        else:
+            stream = client.completions.create(
+                model=model,
+                prompt=prompt,
+                max_tokens=256,
+                temperature=0.7,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].text:
+                    yield chunk.choices[0].text
+
+    except Exception as e:
+        yield f"Error calling OpenAI: {str(e)}"
+
+@metrics.timed("llm", on_complete=_record_completion)
+async def acall_llm(prompt: str, model: str = "llama3.1:8b") -> str:
+    """
+    Async variant of `call_llm` using the shared pooled clients.
+
+    Args:
+        prompt (str): The input prompt.
+        model (str): Model name. Defaults to "llama3.1:8b".
+
+    Returns:
+        str: The generated response.
+    """
+    if "llama" in model.lower():
+        try:
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+                "stream": False
+            }
+            response = await http_clients.ollama.post("/api/chat", json=payload)
+            response.raise_for_status()
+            return response.json().get("message", {}).get("content", "")
+
+        except Exception as e:
+            return f"Error calling Ollama: {str(e)}"
+
+    client = http_clients.openai
+    if client is None:
+        return "Error: OPENAI_API_KEY not set. Cannot call LLM."
+
+    try:
+        if "gpt-3.5-turbo" in model or "gpt-4" in model:
+            response = await client.chat.completions.create(
+                model="gpt-3.5-turbo", # force chat model for this path
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            return response.choices[0].message.content.strip()
+        else:
+            response = await client.completions.create(
+                model=model,
+                prompt=prompt,
+                max_tokens=256,
+                temperature=0.7
+            )
+            return response.choices[0].text.strip()
+
+    except Exception as e:
+        return f"Error calling OpenAI: {str(e)}"
+
+@metrics.timed("llm_stream", on_complete=_record_completion, first_item=True)
+async def astream_llm(prompt: str, model: str = "llama3.1:8b") -> AsyncIterator[str]:
+    """
+    Async variant of `stream_llm` using the shared pooled clients.
+
+    Args:
+        prompt (str): The input prompt.
+        model (str): Model name. Defaults to "llama3.1:8b".
+
+    Yields:
+        str: Pieces of generated text, in order.
+    """
+    if "llama" in model.lower():
+        try:
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+                "stream": True
+            }
+            async with http_clients.ollama.stream("POST", "/api/chat", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    content = data.get("message", {}).get("content", "")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        break
+
+        except Exception as e:
+            yield f"Error calling Ollama: {str(e)}"
+        return
+
+    client = http_clients.openai
+    if client is None:
+        yield "Error: OPENAI_API_KEY not set. Cannot call LLM."
+        return
+
+    try:
+        if "gpt-3.5-turbo" in model or "gpt-4" in model:
+            stream = await client.chat.completions.create(
+                model="gpt-3.5-turbo", # force chat model for this path
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        else:
+            stream = await client.completions.create(
+                model=model,
+                prompt=prompt,
+                max_tokens=256,
+                temperature=0.7,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].text:
+                    yield chunk.choices[0].text
+
+    except Exception as e:
+        yield f"Error calling OpenAI: {str(e)}"
+
+class GenerationRejected(Exception):
+    """
+    A generation request shed by admission control or cut off by its deadline.
+
+    `status_code` is the HTTP status to answer with: 429 when the queue is
+    full, 503 when the deadline passed while queued, 504 when it passed during
+    generation (the upstream call is cancelled).
+    """
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class _Flight:
+    """One upstream generation shared by every caller with the same key."""
+    def __init__(self, key: Optional[Hashable], priority: int):
+        self.key = key
+        self.priority = priority
+        self.waiters = 1
+        # Holds a slot; set when admitted to a free slot or popped from the queue
+        self.started = False
+        self.finished = False
+        self.enqueued = time.perf_counter()
+        self.ready: Optional[asyncio.Future] = None
+        self.entry: Optional[list] = None
+        self.task: Optional[asyncio.Task] = None
+
+class GenerationScheduler:
+    """
+    Admission control for one LLM backend.
+
+    At most `concurrency` generations run upstream at a time; the rest wait in
+    a priority queue (FIFO within a priority) of at most `max_queue` entries,
+    and requests beyond that are rejected at once with 429 instead of queueing
+    invisibly inside the backend. Identical in-flight requests (same key) share
+    one upstream call. Every caller has its own deadline; the upstream call is
+    cancelled once no caller is waiting for it any more.
+    """
+    def __init__(self, name: str, concurrency: int = 4, max_queue: int = 64, timeout: Optional[float] = None):
+        """
+        Args:
+            name (str): Backend name, used as the metrics label.
+            concurrency (int): Generations allowed upstream at once.
+            max_queue (int): Requests allowed to wait for a slot.
+            timeout (Optional[float]): Default deadline in seconds (queueing + generation); None for no deadline.
+        """
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._active = 0
+        self._queued = 0
+        self._waiting: List[list] = []
+        self._sequence = itertools.count()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._coalesced = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._started = 0
+
+    async def run(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        key: Optional[Hashable] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Run `factory()` when a slot is free, or join the identical call already in flight.
+
+        Args:
+            factory (Callable[[], Awaitable[Any]]): Starts the upstream call.
+            key (Optional[Hashable]): Coalescing key (e.g. model and prompt); None never coalesces.
+            priority (int): Queue priority; lower runs first.
+            timeout (Optional[float]): Deadline in seconds for this caller. Defaults to the scheduler's.
+
+        Returns:
+            Any: The upstream call's result.
+
+        Raises:
+            GenerationRejected: Queue full (429) or deadline passed (503 queued, 504 running).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        flight = self._flights.get(key) if key is not None else None
+        if flight is not None:
+            flight.waiters += 1
+            self._coalesced += 1
+            metrics.cache("llm_inflight", hits=1)
+            if not flight.started and priority < flight.priority:
+                self._requeue(flight, priority)
+        else:
+            self.admit()
+            if key is not None:
+                metrics.cache("llm_inflight", misses=1)
+            flight = _Flight(key, priority)
+            # Slots and queue places are taken here, so a burst in one tick can't overshoot
+            self._enqueue(flight)
+            flight.task = asyncio.create_task(self._execute(flight, factory))
+            flight.task.add_done_callback(lambda _: self._finish(flight))
+            if key is not None:
+                self._flights[key] = flight
+
+        try:
+            # Shielded so one caller's deadline or disconnect doesn't cancel a shared call
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError:
+            started = flight.started
+            self._leave(flight)
+            self._reject("deadline_running" if started else "deadline_queued")
+            if started:
+                raise GenerationRejected(504, f"LLM generation exceeded the {timeout:g}s deadline")
+            raise GenerationRejected(
+                503, f"LLM queue for {self.name} did not reach this request within {timeout:g}s",
+                retry_after=self.retry_after(),
+            )
+        except asyncio.CancelledError:
+            self._leave(flight)
+            raise
+
+    async def stream(
+        self,
+        factory: Callable[[], AsyncIterator[str]],
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Hold a slot for the whole of a streamed generation. Streams are never coalesced.
+
+        Args:
+            factory (Callable[[], AsyncIterator[str]]): Starts the upstream stream.
+            priority (int): Queue priority; lower runs first.
+            timeout (Optional[float]): Deadline in seconds for queueing + streaming.
+
+        Yields:
+            str: The upstream stream's items.
+
+        Raises:
+            GenerationRejected: As for `run`; a 504 closes the upstream stream.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        self.admit()
+        flight = _Flight(None, priority)
+        self._enqueue(flight)
+        try:
+            try:
+                await asyncio.wait_for(self._wait_for_slot(flight), timeout)
+            except asyncio.TimeoutError:
+                self._reject("deadline_queued")
+                raise GenerationRejected(
+                    503, f"LLM queue for {self.name} did not reach this request within {timeout:g}s",
+                    retry_after=self.retry_after(),
+                )
+            stream = factory()
+            try:
+                while True:
+                    remaining = deadline - loop.time() if deadline is not None else None
+                    try:
+                        item = await asyncio.wait_for(stream.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self._reject("deadline_running")
+                        raise GenerationRejected(504, f"LLM generation exceeded the {timeout:g}s deadline")
+                    yield item
+            finally:
+                # Closing the stream closes the upstream connection, which stops generation
+                await stream.aclose()
+        finally:
+            self._finish(flight)
+
+    def retry_after(self) -> float:
+        """Rough seconds until a queued request would start, for Retry-After."""
+        average_wait = self._wait_total / self._started if self._started else 1.0
+        return max(1.0, round(average_wait * (1 + self._queued / self.concurrency), 1))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Slot usage, queue depth and coalescing/shedding counters since startup.
+        """
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "concurrency": self.concurrency,
+            "started": self._started,
+            "coalesced": self._coalesced,
+            "rejected": self._rejected,
+            "queue_wait_seconds": self._wait_total,
+            "avg_queue_wait_ms": self._wait_total / (self._started or 1) * 1000.0,
+        }
+
+    def admit(self):
+        """
+        Raise 429 now if a new request would find the queue full.
+        """
+        if self._active >= self.concurrency and self._queued >= self.max_queue:
+            self._reject("queue_full")
+            raise GenerationRejected(
+                429, f"LLM queue for {self.name} is full ({self._queued} waiting)", retry_after=self.retry_after()
+            )
+
+    async def _execute(self, flight: _Flight, factory: Callable[[], Awaitable[Any]]) -> Any:
+        await self._wait_for_slot(flight)
+        return await factory()
+
+    def _enqueue(self, flight: _Flight):
+        if self._active < self.concurrency and not self._queued:
+            self._start(flight)
+        else:
+            flight.ready = asyncio.get_running_loop().create_future()
+            self._push(flight)
+
+    async def _wait_for_slot(self, flight: _Flight):
+        if not flight.started:
+            await flight.ready
+        # Observed here rather than in _dispatch so it lands in this request's timings
+        wait = time.perf_counter() - flight.enqueued
+        self._wait_total += wait
+        metrics.observe_stage("llm_queue", wait)
+
+    def _start(self, flight: _Flight):
+        self._active += 1
+        self._started += 1
+        flight.started = True
+        # The waiter may have been cancelled while its slot was being granted
+        if flight.ready is not None and not flight.ready.done():
+            flight.ready.set_result(None)
+
+    def _push(self, flight: _Flight):
+        flight.entry = [flight.priority, next(self._sequence), flight]
+        heapq.heappush(self._waiting, flight.entry)
+        self._queued += 1
+        metrics.queue(self.name, self._queued)
+
+    def _requeue(self, flight: _Flight, priority: int):
+        # A higher-priority caller joined: move the queued flight up (the old entry goes stale)
+        flight.priority = priority
+        if flight.entry is not None:
+            flight.entry[2] = None
+            self._queued -= 1
+            self._push(flight)
+
+    def _dispatch(self):
+        while self._waiting and self._active < self.concurrency:
+            flight = heapq.heappop(self._waiting)[2]
+            if flight is None:
+                continue
+            flight.entry = None
+            self._queued -= 1
+            self._start(flight)
+        metrics.queue(self.name, self._queued)
+
+    def _finish(self, flight: _Flight):
+        # Runs exactly once per flight, however it ended: frees its slot or its queue place
+        if flight.finished:
+            return
+        flight.finished = True
+        if flight.started:
+            self._active -= 1
+        elif flight.entry is not None:
+            flight.entry[2] = None
+            flight.entry = None
+            self._queued -= 1
+        if flight.key is not None and self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        self._dispatch()
+
+    def _leave(self, flight: _Flight):
+        flight.waiters -= 1
+        if flight.waiters > 0:
+            return
+        # Nobody is waiting for the result: free the queue entry or cancel the upstream call
+        if flight.key is not None and self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        flight.task.cancel()
+
+    def _reject(self, reason: str):
+        self._rejected += 1
+        metrics.rejected(self.name, reason)
+
+def llm_backend(model: str) -> str:
+    """Backend serving `model`, as dispatched by `call_llm`."""
+    return "ollama" if "llama" in model.lower() else "openai"
+
+def worker_share(limit: int, workers: int) -> int:
+    """One worker's part of a service-wide limit split across `workers` processes (at least 1)."""
+    return max(1, limit // max(1, workers))
+
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 120)) or None
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() == "true"
+# Limits are for the whole service: each of the WEB_CONCURRENCY workers (serve.py, uvicorn) gets a share
+WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+schedulers = {
+    "ollama": GenerationScheduler(
+        "ollama", concurrency=worker_share(int(os.getenv("OLLAMA_CONCURRENCY", 4)), WORKERS),
+        max_queue=worker_share(int(os.getenv("LLM_QUEUE_SIZE", 64)), WORKERS), timeout=LLM_DEADLINE,
+    ),
+    "openai": GenerationScheduler(
+        "openai", concurrency=worker_share(int(os.getenv("OPENAI_CONCURRENCY", 16)), WORKERS),
+        max_queue=worker_share(int(os.getenv("LLM_QUEUE_SIZE", 64)), WORKERS), timeout=LLM_DEADLINE,
+    ),
+}
+
+def scheduler_for(model: str = "llama3.1:8b") -> GenerationScheduler:
+    """The scheduler in front of `model`'s backend."""
+    return schedulers[llm_backend(model)]
+
+async def agenerate(
+    prompt: str, model: str = "llama3.1:8b", priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None
+) -> str:
+    """
+    `acall_llm` through the backend's scheduler: bounded concurrency, priority
+    queueing, a deadline, and one upstream call for identical concurrent prompts.
+
+    Args:
+        prompt (str): The input prompt.
+        model (str): Model name. Defaults to "llama3.1:8b".
+        priority (int): PRIORITY_INTERACTIVE or PRIORITY_BATCH; lower runs first.
+        timeout (Optional[float]): Deadline in seconds. Defaults to LLM_DEADLINE.
+
+    Returns:
+        str: The generated response.
+
+    Raises:
+        GenerationRejected: The request was shed or ran past its deadline.
+    """
+    key = (model, prompt) if LLM_COALESCE else None
+    return await scheduler_for(model).run(
+        lambda: acall_llm(prompt, model), key=key, priority=priority, timeout=timeout
+    )
+
+def astream_generate(
+    prompt: str, model: str = "llama3.1:8b", priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    `astream_llm` through the backend's scheduler; see `agenerate`. Not coalesced.
+    """
+    return scheduler_for(model).stream(lambda: astream_llm(prompt, model), priority=priority, timeout=timeout)
@@ -0,0 +1,89 @@
+import os
+from typing import Any, Optional
+import httpx
+
+SCRAPER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", 200)),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", 50)),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30)),
+    )
+
+def _timeout(read_timeout: float) -> httpx.Timeout:
+    return httpx.Timeout(read_timeout, connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)))
+
+class HTTPClients:
+    """
+    Long-lived, pooled async HTTP clients shared by every request.
+
+    One connection pool per upstream (Ollama, OpenAI, scraping) so a slow
+    scrape target can't starve LLM calls of connections. Clients are created
+    lazily on first use, or eagerly by `startup()` from the app lifespan hook.
+    """
+    def __init__(self):
+        self._ollama: Optional[httpx.AsyncClient] = None
+        self._openai: Optional[Any] = None
+        self._scraper: Optional[httpx.AsyncClient] = None
+
+    @property
+    def ollama(self) -> httpx.AsyncClient:
+        if self._ollama is None:
+            self._ollama = httpx.AsyncClient(
+                base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+                limits=_limits(),
+                timeout=_timeout(float(os.getenv("LLM_TIMEOUT", 300))),
+            )
+        return self._ollama
+
+    @property
+    def openai(self) -> Optional[Any]:
+        """AsyncOpenAI client, or None if OPENAI_API_KEY is not set."""
+        if self._openai is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                return None
+            # Imported on first use: it's slow to import and only needed with an API key
+            import openai
+            self._openai = openai.AsyncOpenAI(
+                api_key=api_key,
+                http_client=httpx.AsyncClient(
+                    limits=_limits(),
+                    timeout=_timeout(float(os.getenv("LLM_TIMEOUT", 300))),
+                ),
+            )
+        return self._openai
+
+    @property
+    def scraper(self) -> httpx.AsyncClient:
+        if self._scraper is None:
+            self._scraper = httpx.AsyncClient(
+                headers=SCRAPER_HEADERS,
+                limits=_limits(),
+                timeout=_timeout(float(os.getenv("SCRAPE_TIMEOUT", 10))),
+                follow_redirects=True,
+            )
+        return self._scraper
+
+    async def startup(self):
+        """Create all clients up front so the first request doesn't pay for it."""
+        self.ollama
+        self.openai
+        self.scraper
+
+    async def aclose(self):
+        """Close every pool. Safe to call more than once."""
+        if self._ollama is not None:
+            await self._ollama.aclose()
+            self._ollama = None
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+        if self._scraper is not None:
+            await self._scraper.aclose()
+            self._scraper = None
+
+http_clients = HTTPClients()
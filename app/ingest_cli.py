@@ -0,0 +1,32 @@
+import os
+import argparse
+import json
+
+from rag import RAGPipeline
+from ingestion import iter_directory_chunks
+from ingest_pipeline import IngestionPipeline
+from manifest import ChunkManifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory or glob of PDF/text files into Qdrant.")
+    parser.add_argument("pattern", help='File, directory or glob, e.g. "docs/**/*.pdf"')
+    parser.add_argument("--collection", default="rag_collection")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    rag_pipeline = RAGPipeline()
+    rag_pipeline.create_collection_if_not_exists(args.collection)
+    # Same manifest as the API, so re-ingesting a changed file replaces its old chunks
+    pipeline = IngestionPipeline(
+        rag_pipeline, batch_size=args.batch_size, manifest=ChunkManifest(os.getenv("MANIFEST_DB_PATH", "manifest.db"))
+    )
+
+    extract_stats: dict = {}
+    stats = pipeline.run_chunked(args.collection, iter_directory_chunks(args.pattern, args.workers, extract_stats))
+    stats.update(extract_stats)
+    stats["pages_per_sec"] = stats["pages"] / stats["elapsed_seconds"] if stats["elapsed_seconds"] else 0.0
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import json
+import time
+import queue
+import itertools
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ingestion import chunk_segments, chunk_ids, content_hash, document_key, with_scope
+from manifest import ChunkManifest
+
+_DONE = object()
+
+def chunk_documents(documents: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily split documents into chunk-level docs ready for `RAGPipeline`.
+
+    Documents without an "id" are identified by the hash of their text. A
+    document's "tenant" and "metadata" are copied onto each of its chunks.
+
+    Args:
+        documents (Iterable[Dict[str, Any]]): Documents with a "text" key and optional
+            "id", "tenant" and "metadata".
+
+    Yields:
+        Dict[str, Any]: Chunk docs with "id", "text", "doc_id" and "chunk_index" keys
+            (plus "tenant"/"metadata" when set).
+    """
+    for doc in documents:
+        doc_id = doc.get("id") or content_hash(doc["text"])
+        chunks = list(chunk_segments([doc["text"]]))
+        ids = chunk_ids(document_key(doc_id, doc.get("tenant")), chunks)
+        for index, (chunk_id, chunk) in enumerate(zip(ids, chunks)):
+            yield with_scope(
+                {"id": chunk_id, "text": chunk, "doc_id": doc_id, "chunk_index": index},
+                doc.get("tenant"), doc.get("metadata")
+            )
+
+def chunk_hash(chunk: Dict[str, Any]) -> str:
+    """
+    Manifest hash of a chunk: its text, plus its metadata so metadata edits are re-written.
+    """
+    if not chunk.get("metadata"):
+        return content_hash(chunk["text"])
+    return content_hash(chunk["text"] + "\0" + json.dumps(chunk["metadata"], sort_keys=True, default=str))
+
+class IngestionPipeline:
+    """
+    Staged chunk -> embed -> upsert ingestion with bounded memory.
+
+    The caller's thread chunks documents into fixed-size batches, one thread
+    embeds them and `upsert_workers` threads write them to Qdrant. Stages are
+    connected by bounded queues, so at most `queue_size` batches are buffered
+    between any two stages and a slow stage applies backpressure upstream
+    instead of letting vectors pile up in memory. CPU-bound embedding of batch
+    N+1 overlaps with the network write of batch N.
+    """
+    def __init__(
+        self,
+        rag_pipeline,
+        batch_size: int = 256,
+        queue_size: int = 4,
+        upsert_workers: int = 2,
+        manifest: Optional[ChunkManifest] = None,
+    ):
+        """
+        Args:
+            rag_pipeline (RAGPipeline): Pipeline providing embeddings and Qdrant writes.
+            batch_size (int): Chunks per embed/upsert batch.
+            queue_size (int): Maximum batches buffered between stages.
+            upsert_workers (int): Concurrent Qdrant writers.
+            manifest (Optional[ChunkManifest]): Enables incremental re-ingestion when set.
+        """
+        self.rag = rag_pipeline
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.upsert_workers = upsert_workers
+        self.manifest = manifest
+
+    def run(self, collection_name: str, documents: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Ingest documents into a collection.
+
+        With a manifest, each document is diffed against its previously stored
+        chunks: only new or changed chunks (text or metadata) are embedded and
+        written, chunks no longer present are deleted, and the manifest is
+        updated once the writes have succeeded.
+
+        Args:
+            collection_name (str): Name of the collection.
+            documents (Iterable[Dict[str, Any]]): Documents with a "text" key and optional
+                "id", "tenant" and "metadata".
+
+        Returns:
+            Dict[str, float]: Throughput and backpressure stats.
+
+        Raises:
+            Exception: The first error raised by any stage.
+        """
+        if self.manifest is None:
+            return self.run_chunks(collection_name, chunk_documents(documents))
+
+        def grouped():
+            for doc in documents:
+                doc_id = doc.get("id") or content_hash(doc["text"])
+                yield document_key(doc_id, doc.get("tenant")), chunk_documents([dict(doc, id=doc_id)])
+
+        return self._run_incremental(collection_name, grouped())
+
+    def run_chunked(self, collection_name: str, chunks: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Ingest documents that the caller already split into chunk docs (e.g. files
+        from `iter_directory_chunks`), diffing each document against the manifest
+        like `run`.
+
+        Args:
+            collection_name (str): Name of the collection.
+            chunks (Iterable[Dict[str, Any]]): Chunk docs with "id", "text", "doc_id" and
+                "chunk_index" keys; a document's chunks must be consecutive.
+
+        Returns:
+            Dict[str, float]: Throughput and backpressure stats.
+        """
+        if self.manifest is None:
+            return self.run_chunks(collection_name, chunks)
+        grouped = itertools.groupby(chunks, key=lambda chunk: document_key(chunk["doc_id"], chunk.get("tenant")))
+        return self._run_incremental(collection_name, grouped)
+
+    def _run_incremental(self, collection_name: str, documents: Iterable[Tuple[str, Iterable[Dict[str, Any]]]]) -> Dict[str, float]:
+        """
+        Write only the new or changed chunks of (document key, chunk docs) pairs,
+        delete chunks the documents no longer have, then update the manifest.
+        """
+        # Document key -> chunk_id -> (chunk_index, hash), as of this run
+        state: Dict[str, Dict[str, tuple]] = {}
+        # Document key -> chunk IDs the document had before (manifest or an earlier occurrence)
+        previous: Dict[str, Dict[str, None]] = {}
+        moved: Dict[str, int] = {}
+        counts = {"unchanged": 0}
+
+        def changed_chunks():
+            for key, chunks in documents:
+                # A document repeated within the run is diffed against its latest occurrence
+                known = state[key] if key in state else self.manifest.get(collection_name, key)
+                previous.setdefault(key, {}).update(dict.fromkeys(known))
+                current = {}
+                for chunk in chunks:
+                    digest = chunk_hash(chunk)
+                    current[chunk["id"]] = (chunk["chunk_index"], digest)
+                    if chunk["id"] in known and known[chunk["id"]][1] == digest:
+                        counts["unchanged"] += 1
+                        if known[chunk["id"]][0] != chunk["chunk_index"]:
+                            moved[chunk["id"]] = chunk["chunk_index"]
+                        continue
+                    yield chunk
+                state[key] = current
+
+        stats = self.run_chunks(collection_name, changed_chunks())
+        # Stale once every occurrence is written: chunks the document had but its last version lacks
+        stale_ids = [chunk_id for key, ids in previous.items() for chunk_id in ids if chunk_id not in state[key]]
+        stale = set(stale_ids)
+        self.rag.delete_points(collection_name, stale_ids)
+        self.rag.update_chunk_indexes(
+            collection_name, {chunk_id: index for chunk_id, index in moved.items() if chunk_id not in stale}
+        )
+        for key, chunks in state.items():
+            self.manifest.replace(
+                collection_name, key, [(chunk_id, index, digest) for chunk_id, (index, digest) in chunks.items()]
+            )
+
+        stats["unchanged_chunks"] = counts["unchanged"]
+        stats["deleted_chunks"] = len(stale_ids)
+        return stats
+
+    def run_chunks(self, collection_name: str, chunks: Iterable[Dict[str, str]]) -> Dict[str, float]:
+        """
+        Embed and upsert already-chunked docs ("id" and "text" keys).
+
+        Returns:
+            Dict[str, float]: Throughput and backpressure stats.
+        """
+        embed_q: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        upsert_q: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors: List[Exception] = []
+        lock = threading.Lock()
+        stats = {
+            "chunks": 0,
+            "batches": 0,
+            "embed_seconds": 0.0,
+            "upsert_seconds": 0.0,
+            "chunk_blocked_seconds": 0.0,
+            "embed_blocked_seconds": 0.0,
+            "max_embed_queue": 0,
+            "max_upsert_queue": 0,
+        }
+
+        def fail(e: Exception):
+            with lock:
+                errors.append(e)
+            stop.set()
+
+        def embed_stage():
+            while True:
+                batch = embed_q.get()
+                if batch is _DONE:
+                    break
+                if stop.is_set():
+                    continue  # keep draining so the producer never blocks forever
+                try:
+                    started = time.perf_counter()
+                    # float32 matrix end to end; no per-vector lists or PointStructs
+                    vectors = self.rag.embeddings.encode_array([doc["text"] for doc in batch])
+                    stats["embed_seconds"] += time.perf_counter() - started
+
+                    started = time.perf_counter()
+                    upsert_q.put((batch, vectors))
+                    stats["embed_blocked_seconds"] += time.perf_counter() - started
+                    stats["max_upsert_queue"] = max(stats["max_upsert_queue"], upsert_q.qsize())
+                except Exception as e:
+                    fail(e)
+            for _ in range(self.upsert_workers):
+                upsert_q.put(_DONE)
+
+        def upsert_stage():
+            while True:
+                item = upsert_q.get()
+                if item is _DONE:
+                    break
+                if stop.is_set():
+                    continue
+                try:
+                    batch, vectors = item
+                    started = time.perf_counter()
+                    self.rag.write_vectors(collection_name, batch, vectors, batch_size=self.batch_size)
+                    with lock:
+                        stats["upsert_seconds"] += time.perf_counter() - started
+                        stats["chunks"] += len(batch)
+                        stats["batches"] += 1
+                except Exception as e:
+                    fail(e)
+
+        threads = [threading.Thread(target=embed_stage, name="ingest-embed", daemon=True)]
+        threads += [
+            threading.Thread(target=upsert_stage, name=f"ingest-upsert-{i}", daemon=True)
+            for i in range(self.upsert_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        started = time.perf_counter()
+        try:
+            batch: List[Dict[str, str]] = []
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    blocked = time.perf_counter()
+                    embed_q.put(batch)
+                    stats["chunk_blocked_seconds"] += time.perf_counter() - blocked
+                    stats["max_embed_queue"] = max(stats["max_embed_queue"], embed_q.qsize())
+                    batch = []
+            if batch and not stop.is_set():
+                embed_q.put(batch)
+        except Exception as e:
+            fail(e)
+        finally:
+            embed_q.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        self.rag.flush_lexical(collection_name)
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = elapsed
+        stats["chunks_per_sec"] = stats["chunks"] / elapsed if elapsed > 0 else 0.0
+        print(f"Ingested {stats['chunks']} chunks into '{collection_name}' at {stats['chunks_per_sec']:.1f} chunks/s.")
+        return stats
@@ -1,7 +1,69 @@
+import os
+import re
+import glob
 import uuid
-from typing import List, Tuple
+import asyncio
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import PyPDF2
 
+from generation import estimate_tokens
+from metrics import metrics
+
+SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".md"}
+TEXT_BLOCK_SIZE = 1024 * 1024
+
+# "sentence" (boundary-aware, token-sized) or "fixed" (500-character windows)
+CHUNKER = os.getenv("CHUNKER", "sentence")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 128))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 16))
+
+# Whitespace after sentence-ending punctuation, or a blank line (paragraph break)
+BOUNDARY_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+# Namespace for deterministic chunk IDs (uuid5), so re-ingesting a document maps to the same points
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c1d4e-7a52-4c3b-9a8e-2f6d3b1e5c90")
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def document_key(doc_id: str, tenant: Optional[str] = None) -> str:
+    """
+    Identity of a document for chunk IDs and the manifest; tenants never share chunks.
+    """
+    return f"{tenant}/{doc_id}" if tenant else doc_id
+
+def chunk_ids(doc_id: str, chunks: List[str]) -> List[str]:
+    """
+    Deterministic UUIDv5 IDs for a document's chunks.
+
+    IDs are derived from the document ID and each chunk's content hash (plus an
+    occurrence counter for repeated chunks), so an unchanged chunk keeps its ID
+    even if edits elsewhere in the document shift its position.
+
+    Args:
+        doc_id (str): Stable document identifier (caller ID, URL, file path...).
+        chunks (List[str]): The document's chunks, in order.
+
+    Returns:
+        List[str]: One UUID string per chunk.
+    """
+    return [chunk_id for chunk_id, _ in iter_chunk_ids(doc_id, chunks)]
+
+def iter_chunk_ids(doc_id: str, chunks: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Lazy `chunk_ids`: yield (id, chunk) pairs as a document's chunks are produced.
+    """
+    seen = {}
+    for chunk in chunks:
+        digest = content_hash(chunk)
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        yield str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{doc_id}:{digest}:{occurrence}")), chunk
+
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
     """
     Split text into chunks of `chunk_size` characters with `overlap`.
@@ -37,40 +99,434 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]
         
     return chunks
 
-def ingest_file(path: str) -> List[Tuple[str, str]]:
+def chunk_stream(segments: Iterable[str], chunk_size: int = 500, overlap: int = 50) -> Iterator[str]:
+    """
+    Streaming equivalent of `chunk_text` over a sequence of text segments.
+
+    Produces the same chunks as `chunk_text("".join(segments))` while only
+    holding about one segment plus one chunk in memory.
+
+    Args:
+        segments (Iterable[str]): Text pieces (pages, file blocks...), in order.
+        chunk_size (int): Chunk size in characters. Defaults to 500.
+        overlap (int): Overlap size in characters. Defaults to 50.
+
+    Yields:
+        str: Text chunks.
+    """
+    step = chunk_size - overlap
+    buffer = ""
+    for segment in segments:
+        buffer += segment
+        start = 0
+        # Only emit a window once text exists past it, so the final chunk is handled below
+        while len(buffer) - start > chunk_size:
+            yield buffer[start:start + chunk_size]
+            start += step
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+def _split_long(text: str, max_chars: int) -> Iterator[str]:
+    """Cut text longer than `max_chars` at the last whitespace before the limit (hard cut if none)."""
+    start = 0
+    while len(text) - start > max_chars:
+        cut = text.rfind(" ", start, start + max_chars)
+        cut = cut + 1 if cut > start else start + max_chars
+        yield text[start:cut]
+        start = cut
+    yield text[start:]
+
+def iter_text_units(segments: Iterable[str], max_chars: int = 2048) -> Iterator[Tuple[str, bool]]:
+    """
+    Split a stream of text segments into sentence-sized units.
+
+    Text after the last boundary of a segment is carried into the next one, so
+    sentences spanning page or block breaks stay whole. Units (and the carry)
+    are capped at `max_chars`, which keeps the work per character constant.
+
+    Yields:
+        Tuple[str, bool]: (unit text including its trailing whitespace, ends a paragraph).
+    """
+    carry = ""
+    for segment in segments:
+        text = carry + segment
+        start = 0
+        for match in BOUNDARY_RE.finditer(text):
+            pieces = list(_split_long(text[start:match.end()], max_chars))
+            for unit in pieces[:-1]:
+                yield unit, False
+            yield pieces[-1], match.group().count("\n") > 1
+            start = match.end()
+        carry = text[start:]
+        if len(carry) > max_chars:
+            pieces = list(_split_long(carry, max_chars))
+            for unit in pieces[:-1]:
+                yield unit, False
+            carry = pieces[-1]
+    if carry:
+        yield carry, True
+
+@lru_cache(maxsize=None)
+def _tokenizer_counter(name: str) -> Callable[[str], int]:
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+def default_token_counter() -> Callable[[str], int]:
+    """
+    Token counter for chunk sizing: the CHUNK_TOKENIZER Hugging Face tokenizer if set, else an estimate.
+    """
+    name = os.getenv("CHUNK_TOKENIZER")
+    if name:
+        try:
+            return _tokenizer_counter(name)
+        except Exception as e:
+            print(f"Could not load tokenizer {name}, estimating tokens: {e}")
+    return estimate_tokens
+
+def chunk_sentences(
+    segments: Iterable[str],
+    chunk_tokens: int = 128,
+    overlap_tokens: int = 16,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> Iterator[str]:
+    """
+    Lazily chunk a stream of text segments on sentence and paragraph boundaries.
+
+    Sentences are packed into chunks of at most `chunk_tokens` tokens; each new
+    chunk repeats the trailing sentences of the previous one, up to
+    `overlap_tokens`. A chunk that is at least half full is closed at a
+    paragraph break, and overlap is not carried across it. Sentences longer
+    than a chunk are split at whitespace. Every sentence is tokenized once and
+    copied into at most two chunks, so time is linear in the input and memory
+    is bounded by one segment plus one chunk.
+
+    Args:
+        segments (Iterable[str]): Text pieces (pages, HTML blocks, file reads), in order.
+        chunk_tokens (int): Maximum tokens per chunk. Defaults to 128.
+        overlap_tokens (int): Tokens of trailing context repeated in the next chunk. Defaults to 16.
+        count_tokens (Optional[Callable[[str], int]]): Token counter. Defaults to `default_token_counter()`.
+
+    Yields:
+        str: Text chunks.
+    """
+    count_tokens = count_tokens or default_token_counter()
+    # Assume at least ~1 token per 4 characters so a capped unit always fits in a chunk
+    units = iter_text_units(segments, max_chars=max(1, chunk_tokens * 4))
+    window: deque = deque()
+    total = 0
+    fresh = False
+
+    def emit():
+        return "".join(unit for unit, _ in window).strip()
+
+    for unit, paragraph_end in units:
+        if unit.strip():
+            tokens = count_tokens(unit)
+            if window and total + tokens > chunk_tokens:
+                yield emit()
+                fresh = False
+                while window and (total > overlap_tokens or total + tokens > chunk_tokens):
+                    total -= window.popleft()[1]
+            window.append((unit, tokens))
+            total += tokens
+            fresh = True
+        if paragraph_end and fresh and total >= chunk_tokens // 2:
+            yield emit()
+            window.clear()
+            total = 0
+            fresh = False
+
+    if fresh:
+        yield emit()
+
+@metrics.timed("chunk")
+def chunk_segments(segments: Iterable[str]) -> Iterator[str]:
+    """
+    Chunk a segment stream with the configured CHUNKER ("sentence" or "fixed").
+    """
+    # A generator, so `metrics.timed` times the chunking rather than creating the chunker
+    if CHUNKER == "fixed":
+        yield from chunk_stream(segments)
+    else:
+        yield from chunk_sentences(segments, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+
+def pdf_page_count(path: str) -> int:
+    with open(path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+def extract_pages(path: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+    """
+    Extract text segments from a file: one per PDF page in [start, end), or
+    fixed-size blocks for text files.
+
+    Top-level so it can run in a process pool.
+
+    Args:
+        path (str): File path.
+        start (int): First PDF page.
+        end (Optional[int]): Page after the last one to extract. All remaining if None.
+
+    Returns:
+        List[str]: Text segments, each ending with a newline for PDFs.
+    """
+    return list(iter_file_pages(path, start, end))
+
+def iter_file_pages(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+    """
+    Lazily yield a file's text one PDF page (or one text block) at a time.
+    """
+    if path.lower().endswith('.pdf'):
+        with open(path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            for index in range(start, min(end if end is not None else len(reader.pages), len(reader.pages))):
+                extracted = reader.pages[index].extract_text()
+                if extracted:
+                    yield extracted + "\n"
+    else:
+        # Fallback to plain text
+        with open(path, 'r', encoding='utf-8') as f:
+            while True:
+                block = f.read(TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+def ingest_file(path: str, tenant: Optional[str] = None) -> List[Tuple[str, str]]:
     """
     Ingest a file (PDF or Text) and return chunks with IDs.
     
     Args:
         path (str): File path to ingest.
+        tenant (Optional[str]): Tenant the chunks are stored for.
 
     Returns:
         List[Tuple[str, str]]: List of (uuid, chunk_text) tuples.
     """
-    text = ""
     try:
-        if path.lower().endswith('.pdf'):
-            with open(path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    extracted = page.extract_text()
-                    if extracted:
-                        text += extracted + "\n"
-        else:
-            # Fallback to plain text
-            with open(path, 'r', encoding='utf-8') as f:
-                text = f.read()
-                
+        chunks = list(chunk_segments(iter_file_pages(path)))
     except Exception as e:
         print(f"Error reading file {path}: {e}")
+        metrics.error("ingest_file")
         return []
 
-    chunks = chunk_text(text)
-    return [(str(uuid.uuid4()), chunk) for chunk in chunks]
+    return list(zip(chunk_ids(document_key(path, tenant), chunks), chunks))
+
+def expand_paths(pattern: str) -> List[str]:
+    """
+    Resolve a file, directory or glob pattern to the supported files it matches.
+
+    Args:
+        pattern (str): A file path, a directory (searched recursively) or a glob ("docs/**/*.pdf").
+
+    Returns:
+        List[str]: Sorted file paths.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "**", "*")
+    paths = glob.glob(pattern, recursive=True)
+    return sorted(
+        path for path in paths
+        if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+    )
+
+def iter_directory_pages(
+    paths: List[str],
+    workers: Optional[int] = None,
+    pages_per_task: int = 16,
+) -> Iterator[Tuple[str, List[str], bool]]:
+    """
+    Extract text from many files in a process pool, yielding page batches in order.
+
+    Large PDFs are split into page ranges of `pages_per_task` so a single big
+    file is spread across workers. At most `workers * 4` tasks are in flight,
+    keeping memory bounded when the consumer is slower than extraction.
+
+    Args:
+        paths (List[str]): Files to extract.
+        workers (Optional[int]): Worker processes. Defaults to the CPU count.
+        pages_per_task (int): PDF pages per task.
+
+    Yields:
+        Tuple[str, List[str], bool]: (path, text segments, last) per task, as soon
+        as the task completes; `last` marks a file's final batch. Unreadable files
+        (or page ranges) yield no segments.
+    """
+    def tasks():
+        for path in paths:
+            if path.lower().endswith('.pdf'):
+                try:
+                    count = pdf_page_count(path)
+                except Exception as e:
+                    print(f"Error reading file {path}: {e}")
+                    metrics.error("ingest_file")
+                    yield path, 0, 0, True
+                    continue
+                starts = list(range(0, count, pages_per_task)) or [0]
+                for i, start in enumerate(starts):
+                    yield path, start, start + pages_per_task, i == len(starts) - 1
+            else:
+                yield path, 0, None, True
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        task_iter = tasks()
+
+        def fill():
+            while len(pending) < workers * 4:
+                task = next(task_iter, None)
+                if task is None:
+                    return
+                path, start, end, last = task
+                future = pool.submit(extract_pages, path, start, end) if end != 0 else None
+                pending.append((path, last, future))
+
+        fill()
+        while pending:
+            path, last, future = pending.popleft()
+            segments = []
+            if future is not None:
+                try:
+                    segments = future.result()
+                except Exception as e:
+                    print(f"Error reading file {path}: {e}")
+                    metrics.error("ingest_file")
+            fill()
+            yield path, segments, last
+
+def _file_segments(
+    segments: List[str],
+    last: bool,
+    batches: Iterator[Tuple[str, List[str], bool]],
+    stats: Optional[Dict[str, float]],
+) -> Iterator[str]:
+    """A file's segments, pulling its remaining page batches from `batches`."""
+    while True:
+        if stats is not None:
+            stats["pages"] += len(segments)
+        yield from segments
+        if last:
+            return
+        _, segments, last = next(batches)
+
+def with_scope(chunk: Dict[str, object], tenant: Optional[str], metadata: Optional[dict]) -> Dict[str, object]:
+    """Add "tenant" and "metadata" payload keys to a chunk doc when they are set."""
+    if tenant:
+        chunk["tenant"] = tenant
+    if metadata:
+        chunk["metadata"] = metadata
+    return chunk
+
+def iter_directory_chunks(
+    pattern: str,
+    workers: Optional[int] = None,
+    stats: Optional[Dict[str, float]] = None,
+    tenant: Optional[str] = None,
+    metadata: Optional[dict] = None,
+) -> Iterator[Dict[str, object]]:
+    """
+    Chunk every supported file matching `pattern`, extracting text in parallel.
+
+    Args:
+        pattern (str): File, directory or glob pattern.
+        workers (Optional[int]): Worker processes for extraction.
+        stats (Optional[Dict[str, float]]): Filled with "files" and "pages" counts.
+        tenant (Optional[str]): Tenant the chunks are stored for.
+        metadata (Optional[dict]): Metadata stored with every chunk.
+
+    Yields:
+        Dict[str, object]: Chunk docs with "id", "text", "doc_id" and "chunk_index" keys.
+    """
+    if stats is not None:
+        stats.update({"files": 0, "pages": 0})
+    batches = iter_directory_pages(expand_paths(pattern), workers=workers)
+    for path, segments, last in batches:
+        if stats is not None:
+            stats["files"] += 1
+        # Chunks stream out as page batches arrive; only the chunker's window is held per file
+        chunks = chunk_segments(_file_segments(segments, last, batches, stats))
+        for index, (chunk_id, chunk) in enumerate(iter_chunk_ids(document_key(path, tenant), chunks)):
+            yield with_scope(
+                {"id": chunk_id, "text": chunk, "doc_id": path, "chunk_index": index}, tenant, metadata
+            )
 
 import requests
+from urllib.parse import urljoin, urldefrag
 from bs4 import BeautifulSoup
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # optional: a C HTML5 parser, several times faster than BeautifulSoup
+    LexborHTMLParser = None
+
+from http_clients import http_clients, SCRAPER_HEADERS
+
+BOILERPLATE_TAGS = ["script", "style", "nav", "footer", "header"]
+
+def _clean_lines(text: str) -> str:
+    # Break into lines and remove leading/trailing space on each
+    lines = (line.strip() for line in text.splitlines())
+    # Break multi-headlines into a line each
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    # Drop blank lines
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+def extract_html(content: bytes, base_url: Optional[str] = None) -> Tuple[str, List[str]]:
+    """
+    Extract readable text and outgoing links from an HTML document in one parse.
+
+    Uses selectolax (lexbor) when installed, BeautifulSoup otherwise.
+
+    Args:
+        content (bytes): Raw HTML.
+        base_url (Optional[str]): URL the document was fetched from, to resolve relative links.
+
+    Returns:
+        Tuple[str, List[str]]: Extracted text, and absolute http(s) link URLs without fragments.
+    """
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(content)
+        hrefs = [node.attributes.get("href") or "" for node in tree.css("a[href]")]
+        base = tree.css_first("base[href]")
+        if base is not None and base_url:
+            base_url = urljoin(base_url, base.attributes.get("href") or "")
+        tree.strip_tags(BOILERPLATE_TAGS)
+        root = tree.body or tree.root
+        text = root.text(separator="\n") if root is not None else ""
+    else:
+        soup = BeautifulSoup(content, 'html.parser')
+        hrefs = [a.get("href") or "" for a in soup.find_all("a", href=True)]
+        base = soup.find("base", href=True)
+        if base is not None and base_url:
+            base_url = urljoin(base_url, base["href"])
+        # Kill all script and style elements
+        for script in soup(BOILERPLATE_TAGS):
+            script.decompose()
+        text = soup.get_text()
+
+    links = []
+    if base_url:
+        for href in hrefs:
+            link = urldefrag(urljoin(base_url, href.strip()))[0]
+            if link.startswith(("http://", "https://")):
+                links.append(link)
+    return _clean_lines(text), list(dict.fromkeys(links))
+
+def html_to_text(content: bytes) -> str:
+    """
+    Extract readable text from an HTML document.
+
+    Args:
+        content (bytes): Raw HTML.
+
+    Returns:
+        str: extracted text content.
+    """
+    return extract_html(content)[0]
+
+@metrics.timed("scrape")
 def scrape_url(url: str) -> str:
     """
     Scrape text content from a URL.
@@ -82,30 +538,33 @@ def scrape_url(url: str) -> str:
         str: extracted text content.
     """
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = requests.get(url, headers=SCRAPER_HEADERS, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Kill all script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-            
-        # Get text
-        text = soup.get_text()
-        
-        # Break into lines and remove leading/trailing space on each
-        lines = (line.strip() for line in text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Drop blank lines
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        
-        return text
+        return html_to_text(response.content)
+    except Exception as e:
+        print(f"Error scraping URL {url}: {e}")
+        metrics.error("scrape")
+        return ""
+
+@metrics.timed("scrape")
+async def ascrape_url(url: str) -> str:
+    """
+    Async variant of `scrape_url` using the shared pooled scraper client.
+
+    Args:
+        url (str): The URL to scrape.
+
+    Returns:
+        str: extracted text content.
+    """
+    try:
+        response = await http_clients.scraper.get(url)
+        response.raise_for_status()
+        # Parsing is CPU-bound; keep it off the event loop
+        return await asyncio.to_thread(html_to_text, response.content)
     except Exception as e:
         print(f"Error scraping URL {url}: {e}")
+        metrics.error("scrape")
         return ""
 
 # Sample usage for verification (commented out)
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from ingestion import scrape_url, ingest_file, with_scope
+from crawler import FetchCache, crawl_site
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_items INTEGER NOT NULL,
+    done_items INTEGER NOT NULL DEFAULT 0,
+    failed_items INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+class JobStore:
+    """
+    SQLite-backed job and per-item progress store.
+
+    Each item is committed on its own as soon as it has been upserted, so after
+    a crash a job resumes from the first item that wasn't committed.
+    """
+    def __init__(self, path: str = "jobs.db"):
+        """
+        Args:
+            path (str): SQLite database file. ":memory:" for tests.
+        """
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            # Databases created before jobs were claimed by a process under a lease
+            for column in ("owner TEXT", "heartbeat REAL"):
+                if column.split()[0] not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+
+    def create(self, kind: str, collection: str, items: List[Dict[str, Any]]) -> str:
+        job_id = str(uuid.uuid4())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, collection, status, total_items, created) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, collection, len(items), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, payload, status) VALUES (?, ?, ?, 'pending')",
+                [(job_id, i, json.dumps(item)) for i, item in enumerate(items)],
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def pending_items(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, payload FROM job_items WHERE job_id = ? AND status = 'pending' ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        return [{"idx": row["idx"], "payload": json.loads(row["payload"])} for row in rows]
+
+    def unfinished_jobs(self) -> List[Dict[str, Any]]:
+        """
+        Queued and running jobs, oldest first, with the process that claimed each
+        one and when it last renewed its lease.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, owner, heartbeat FROM jobs WHERE status IN ('queued', 'running') ORDER BY created"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """
+        Atomically move a queued job to running for `owner`.
+
+        Returns:
+            bool: False if the job isn't queued, e.g. another process already claimed it.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat = ?, started = COALESCE(started, ?) "
+                "WHERE id = ? AND status = 'queued'",
+                (owner, now, now, job_id),
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, owner: str):
+        """Extend the lease on every job `owner` is running."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND owner = ?", (time.time(), owner)
+            )
+
+    def release(self, job_id: str, owner: Optional[str]) -> bool:
+        """
+        Put a running job back in the queue if it is still claimed by `owner` (a dead
+        process, or one whose lease expired).
+
+        Returns:
+            bool: False if the job was finished or claimed by someone else in the meantime.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ? AND status = 'running' AND owner IS ?",
+                (job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def complete_item(self, job_id: str, idx: int, chunks: int, error: Optional[str] = None):
+        status = "failed" if error else "done"
+        column = "failed_items" if error else "done_items"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, chunks = ?, error = ? WHERE job_id = ? AND idx = ?",
+                (status, chunks, error, job_id, idx),
+            )
+            self._conn.execute(
+                f"UPDATE jobs SET {column} = {column} + 1, chunks = chunks + ? WHERE id = ?",
+                (chunks, job_id),
+            )
+
+    def finish(self, job_id: str, error: Optional[str] = None):
+        with self._lock, self._conn:
+            job = self._conn.execute("SELECT done_items, total_items FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            status = "failed" if error or (job["total_items"] and job["done_items"] == 0) else "completed"
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """
+    Whether the process recorded as a job's owner ("host:pid:token") may still be running.
+
+    Only a missing process on this host proves the owner dead. A live PID may
+    have been reused (e.g. a restarted container), so callers also check the
+    owner's lease.
+    """
+    if not owner:
+        return False
+    host, pid = owner.split(":")[:2]
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobManager:
+    """
+    Runs ingestion jobs on a dedicated worker pool, separate from the API threads.
+
+    Job kinds and their item payloads:
+        - "upsert": {"id": Optional[str], "text": str}
+        - "ingest_url": {"url": str, "crawl": Optional[dict]} ("crawl" holds `SiteCrawler` options)
+        - "ingest_file": {"path": str}
+
+    Any item may also carry "tenant" and "metadata", stored with its chunks.
+
+    A claimed job is leased: a background thread renews the lease of this
+    process's jobs every `lease_seconds / 3`, and re-queues other processes'
+    jobs whose lease has expired.
+    """
+    def __init__(
+        self,
+        ingestion_pipeline,
+        store: JobStore,
+        workers: int = 2,
+        fetch_cache: Optional[FetchCache] = None,
+        lease_seconds: float = 60.0,
+    ):
+        """
+        Args:
+            ingestion_pipeline (IngestionPipeline): Used to chunk, embed and upsert each item.
+            store (JobStore): Persistent job state.
+            workers (int): Number of concurrently running jobs.
+            fetch_cache (Optional[FetchCache]): Conditional-request cache for crawls.
+            lease_seconds (float): How long a running job's owner may go without renewing
+                its lease before the job is given to another process.
+        """
+        self.pipeline = ingestion_pipeline
+        self.store = store
+        self.fetch_cache = fetch_cache
+        self.lease_seconds = lease_seconds
+        # Unique per process: host and PID alone repeat after a container restart
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-job")
+        self._stopped = threading.Event()
+        threading.Thread(target=self._keep_leases, name="ingest-job-lease", daemon=True).start()
+
+    def submit(self, kind: str, collection: str, items: List[Dict[str, Any]]) -> str:
+        """
+        Persist a job and queue it for execution.
+
+        Returns:
+            str: The job ID.
+        """
+        job_id = self.store.create(kind, collection, items)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def resume(self, queued: bool = True) -> List[str]:
+        """
+        Re-queue jobs that were queued, or running in a process that has since
+        died or stopped renewing its lease.
+
+        Every worker may call this; each job is claimed atomically, so it runs
+        in one process only, and jobs a live process is running are left alone.
+
+        Args:
+            queued (bool): Also pick up jobs that are waiting to be claimed.
+
+        Returns:
+            List[str]: IDs of the jobs queued here.
+        """
+        job_ids = []
+        now = time.time()
+        for job in self.store.unfinished_jobs():
+            if job["status"] == "queued" and not queued:
+                continue
+            if job["status"] == "running":
+                if job["owner"] == self.owner:
+                    continue
+                expired = job["heartbeat"] is None or now - job["heartbeat"] > self.lease_seconds
+                if not expired and owner_alive(job["owner"]):
+                    continue
+                if not self.store.release(job["id"], job["owner"]):
+                    continue
+            self._executor.submit(self._run, job["id"])
+            job_ids.append(job["id"])
+        return job_ids
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Job state, progress and throughput, or None if the job doesn't exist.
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        elapsed = None
+        if job["started"]:
+            elapsed = (job["finished"] or time.time()) - job["started"]
+        job["elapsed_seconds"] = elapsed
+        job["chunks_per_sec"] = job["chunks"] / elapsed if elapsed else 0.0
+        return job
+
+    def shutdown(self):
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _keep_leases(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                self.store.renew(self.owner)
+                resumed = self.resume(queued=False)
+                if resumed:
+                    print(f"Re-queued {len(resumed)} ingestion job(s) whose lease expired.")
+            except Exception as e:
+                print(f"Could not renew ingestion job leases: {e}")
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        # Another worker may have claimed it first (e.g. while resuming after a restart)
+        if job is None or not self.store.claim(job_id, self.owner):
+            return
+        try:
+            for item in self.store.pending_items(job_id):
+                try:
+                    chunks = self._process(job["kind"], job["collection"], item["payload"])
+                    self.store.complete_item(job_id, item["idx"], chunks)
+                except Exception as e:
+                    print(f"Job {job_id} item {item['idx']} failed: {e}")
+                    self.store.complete_item(job_id, item["idx"], 0, error=str(e))
+            self.store.finish(job_id)
+        except Exception as e:
+            self.store.finish(job_id, error=str(e))
+
+    def _process(self, kind: str, collection: str, payload: Dict[str, Any]) -> int:
+        if kind == "upsert":
+            return self.pipeline.run(collection, [payload])["chunks"]
+        if kind == "ingest_url" and payload.get("crawl") is not None:
+            stats = crawl_site(
+                self.pipeline, collection, payload["url"], self.fetch_cache,
+                payload.get("tenant"), payload.get("metadata"), **payload["crawl"]
+            )
+            return stats["chunks"]
+        if kind == "ingest_url":
+            text = scrape_url(payload["url"])
+            if not text:
+                raise ValueError(f"Failed to scrape content from {payload['url']}")
+            doc = {"id": payload["url"], "text": text, "tenant": payload.get("tenant"), "metadata": payload.get("metadata")}
+            return self.pipeline.run(collection, [doc])["chunks"]
+        if kind == "ingest_file":
+            chunks = ingest_file(payload["path"], payload.get("tenant"))
+            if not chunks:
+                raise ValueError(f"No content extracted from {payload['path']}")
+            docs = (
+                with_scope(
+                    {"id": chunk_id, "text": text, "doc_id": payload["path"], "chunk_index": index},
+                    payload.get("tenant"), payload.get("metadata")
+                )
+                for index, (chunk_id, text) in enumerate(chunks)
+            )
+            return self.pipeline.run_chunked(collection, docs)["chunks"]
+        raise ValueError(f"Unknown job kind: {kind}")
@@ -0,0 +1,335 @@
+import os
+import re
+import math
+import fcntl
+import pickle
+import struct
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import metrics
+
+# Keeps identifiers such as "ERR-4012", "v2.3.1" or "user_id" whole; their parts are indexed too
+TOKEN_RE = re.compile(r"\w+(?:[-.:/]\w+)*")
+PART_RE = re.compile(r"\w+")
+
+# Length prefix of each pickled log record
+LOG_RECORD = struct.Struct(">I")
+# Log size tolerated regardless of the snapshot size before compacting
+COMPACT_MIN_LOG_BYTES = 1 << 20
+# Snapshot reads retried when a compaction removes its log in between
+LOAD_ATTEMPTS = 10
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens, plus compound identifiers and their parts.
+    """
+    tokens = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in PART_RE.findall(token) if part != token)
+    return tokens
+
+class BM25Index:
+    """
+    Incrementally maintained in-process BM25 inverted index.
+
+    Documents can be added, replaced and removed one at a time; scores are
+    computed at query time from postings, so no rebuild is ever needed.
+
+    With a `path` the index is persisted incrementally: `save()` appends the
+    changes made since the last save to an operation log next to the snapshot
+    at `path` (trusted local pickles), under an exclusive file lock. Every
+    process opening the same path replays the others' log entries before it
+    searches, so `serve.py` workers share one index. Once the log outgrows the
+    snapshot, the saving process folds it into a new snapshot generation,
+    rebuilt from the files so searches are never blocked by the pickling.
+    """
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            path (Optional[str]): Snapshot file; its log is `<path>.<generation>.log`. In-memory only if None.
+            k1 (float): Term frequency saturation.
+            b (float): Document length normalization.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        # Changes not yet appended to the log: (doc_id, term counts, or None for a removal)
+        self._pending: List[Tuple[str, Optional[Dict[str, int]]]] = []
+        self.generation = 0
+        self._log = None
+        self._log_offset = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._lock_file = open(path + ".lock", "a")
+            with self._file_lock():
+                self._load(create=True)
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def add(self, doc_id: str, text: str):
+        """
+        Index a document, replacing any previous version with the same ID.
+        """
+        terms = dict(Counter(tokenize(text)))
+        with self._lock:
+            self._change(str(doc_id), terms)
+
+    def add_many(self, docs: Iterable[Tuple[str, str]]):
+        for doc_id, text in docs:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._change(str(doc_id), None)
+
+    @metrics.timed("lexical")
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Rank documents against a query with BM25.
+
+        Returns:
+            List[Tuple[str, float]]: (doc_id, score) pairs, best first.
+        """
+        with self._lock:
+            # Entries other processes appended since our last look
+            self._catch_up()
+            n_docs = len(self.doc_terms)
+            if n_docs == 0:
+                return []
+            avg_length = self.total_length / n_docs
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def save(self):
+        """
+        Append the changes made since the last save to the log, compacting it
+        into a new snapshot once it is larger than the snapshot.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                changes, self._pending = self._pending, []
+            if not changes:
+                return
+            try:
+                with self._file_lock():
+                    with self._lock:
+                        self._catch_up()
+                    record = pickle.dumps(("changes", changes), protocol=pickle.HIGHEST_PROTOCOL)
+                    with open(self._log_path(self.generation), "r+b") as log:
+                        # Drops a record left half-written by a crashed writer
+                        log.truncate(self._log_offset)
+                        log.seek(self._log_offset)
+                        log.write(LOG_RECORD.pack(len(record)) + record)
+                    with self._lock:
+                        # Other processes' entries were applied after ours; re-apply ours so
+                        # every process ends up in log order (unless changed again since)
+                        newer = {doc_id for doc_id, _ in self._pending}
+                        for doc_id, terms in changes:
+                            if doc_id not in newer:
+                                self._apply(doc_id, terms)
+                        self._log_offset += LOG_RECORD.size + len(record)
+                    snapshot_bytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                    if self._log_offset > max(snapshot_bytes, COMPACT_MIN_LOG_BYTES):
+                        self._compact()
+            except Exception:
+                with self._lock:
+                    self._pending = changes + self._pending
+                raise
+
+    def _change(self, doc_id: str, terms: Optional[Dict[str, int]]):
+        self._apply(doc_id, terms)
+        if self.path:
+            self._pending.append((doc_id, terms))
+
+    def _apply(self, doc_id: str, terms: Optional[Dict[str, int]]):
+        self._remove(doc_id)
+        if terms is None:
+            return
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[doc_id]
+
+    def _remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def _log_path(self, generation: int) -> str:
+        return f"{self.path}.{generation}.log"
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load(self, create: bool = False):
+        """
+        Load the latest snapshot and replay its log. Only creates a missing log
+        (`create`, with the file lock held) when opening the index.
+        """
+        for attempt in range(LOAD_ATTEMPTS):
+            state = {}
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    state = pickle.load(f)
+            generation = state.get("generation", 0)
+            if create:
+                open(self._log_path(generation), "ab").close()
+            try:
+                log = open(self._log_path(generation), "rb")
+                break
+            except FileNotFoundError:
+                # Compacted between reading the snapshot and opening its log
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+        self.postings = state.get("postings", {})
+        self.doc_terms = state.get("doc_terms", {})
+        self.doc_lengths = state.get("doc_lengths", {})
+        self.total_length = state.get("total_length", 0)
+        self.generation = generation
+        if self._log is not None:
+            self._log.close()
+        self._log = log
+        self._log_offset = 0
+        self._catch_up()
+
+    def _catch_up(self):
+        """Apply log entries appended since the last read, following compactions to the next log."""
+        if self._log is None:
+            return
+        while True:
+            self._log.seek(self._log_offset)
+            data = self._log.read()
+            position = 0
+            next_generation = None
+            while next_generation is None and position + LOG_RECORD.size <= len(data):
+                (length,) = LOG_RECORD.unpack_from(data, position)
+                if position + LOG_RECORD.size + length > len(data):
+                    break  # still being written
+                kind, value = pickle.loads(data[position + LOG_RECORD.size:position + LOG_RECORD.size + length])
+                position += LOG_RECORD.size + length
+                if kind == "changes":
+                    # Our unsaved changes will be appended after these, so they win
+                    pending = {doc_id for doc_id, _ in self._pending}
+                    for doc_id, terms in value:
+                        if doc_id not in pending:
+                            self._apply(doc_id, terms)
+                else:
+                    next_generation = value
+            self._log_offset += position
+            if next_generation is None:
+                return
+            # Everything up to here is in the new snapshot; continue with its log
+            self._log.close()
+            try:
+                self._log = open(self._log_path(next_generation), "rb")
+            except FileNotFoundError:
+                # Compacted again since; start over from the latest snapshot
+                self._log = None
+                self._load()
+                return
+            self.generation = next_generation
+            self._log_offset = 0
+
+    def _compact(self):
+        """
+        Fold the log into a new snapshot generation; called with the file lock held.
+
+        The snapshot is rebuilt from the files rather than from this index, so
+        searches and writers in this process carry on while it is pickled.
+        """
+        folded = BM25Index(k1=self.k1, b=self.b)
+        folded.path = self.path
+        folded._load_files(self.generation)
+        generation = self.generation + 1
+        open(self._log_path(generation), "wb").close()
+        state = {
+            "postings": folded.postings,
+            "doc_terms": folded.doc_terms,
+            "doc_lengths": folded.doc_lengths,
+            "total_length": folded.total_length,
+            "generation": generation,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        # Tells processes still reading the old log where to continue
+        record = pickle.dumps(("next", generation), protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self._log_path(self.generation), "ab") as log:
+            log.write(LOG_RECORD.pack(len(record)) + record)
+        with self._lock:
+            self._catch_up()
+        os.remove(self._log_path(generation - 1))
+
+    def _load_files(self, generation: int):
+        """Snapshot plus that generation's whole log, without taking any lock (for `_compact`)."""
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            self.postings = state["postings"]
+            self.doc_terms = state["doc_terms"]
+            self.doc_lengths = state["doc_lengths"]
+            self.total_length = state["total_length"]
+        self._log = open(self._log_path(generation), "rb")
+        try:
+            self._catch_up()
+        finally:
+            self._log.close()
+            self._log = None
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked ID lists: score(d) = sum over lists of 1 / (k + rank).
+
+    Args:
+        rankings (List[List[str]]): Ranked IDs from each retriever, best first.
+        k (int): Damping constant. Defaults to 60.
+
+    Returns:
+        List[Tuple[str, float]]: (id, fused score), best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
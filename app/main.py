@@ -1,14 +1,90 @@
 import os
-from typing import List, Optional
+import re
+import json
+import math
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Literal, Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
 from rag import RAGPipeline
-from ingestion import chunk_text, scrape_url
-from generation import assemble_prompt, call_llm
+from ingestion import ascrape_url, expand_paths, iter_directory_chunks
+from crawler import FetchCache, SiteCrawler, crawl_scope, crawler_settings, iter_crawled_documents
+from generation import PRIORITY_BATCH, GenerationRejected, agenerate, astream_generate, scheduler_for
+from context_builder import ContextBuilder
+from http_clients import http_clients
+from query_cache import CollectionVersions, QueryCache
+from ingest_pipeline import IngestionPipeline
+from jobs import JobManager, JobStore
+from manifest import ChunkManifest
+from metrics import MetricsMiddleware, collect_timings, metrics
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled HTTP clients live for the whole process so requests reuse connections
+    await http_clients.startup()
+    # Models and Qdrant are set up in the background: the server binds and answers
+    # /health immediately, and /ready turns 200 once queries can be served
+    init_task = asyncio.create_task(initialize())
+    yield
+    init_task.cancel()
+    job_manager.shutdown()
+    await http_clients.aclose()
+    await rag_pipeline.aclose()
+
+async def ensure_default_collection():
+    """
+    Create the default collection, retrying with backoff until Qdrant is reachable.
+    """
+    started = time.perf_counter()
+    delay = 1.0
+    while True:
+        try:
+            await rag_pipeline.acreate_collection_if_not_exists(COLLECTION_NAME)
+            break
+        except Exception as e:
+            startup_state["error"] = f"Qdrant unavailable: {e}"
+            print(f"Qdrant unavailable ({e}); retrying in {delay:.0f}s.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+    known_collections.add(COLLECTION_NAME)
+    startup_state["qdrant_seconds"] = round(time.perf_counter() - started, 3)
+
+def warm_up():
+    """
+    Load and exercise the models (embedding, reranker, prompt tokenizer) before traffic arrives.
+    """
+    stats = rag_pipeline.warmup()
+    context_builder.count_tokens("warmup")
+    startup_state.update({key: round(value, 3) for key, value in stats.items()})
+
+async def initialize():
+    started = time.perf_counter()
+    # Qdrant is awaited concurrently with the model warmup
+    collection_ready = asyncio.create_task(ensure_default_collection())
+    try:
+        if os.getenv("WARMUP", "true").lower() == "true":
+            await asyncio.to_thread(warm_up)
+        await collection_ready
+        # Load (or rebuild from Qdrant) the default collection's BM25 index before hybrid queries need it
+        await rag_pipeline.alexical_index(COLLECTION_NAME)
+        # Pick up ingestion jobs interrupted by a crash or restart
+        resumed = job_manager.resume()
+        if resumed:
+            print(f"Resumed {len(resumed)} ingestion job(s).")
+    except Exception as e:
+        collection_ready.cancel()
+        startup_state["error"] = str(e)
+        print(f"Startup failed: {e}")
+        return
+    startup_state.update(ready=True, error=None, ready_seconds=round(time.perf_counter() - started, 3))
+    print(f"Ready in {startup_state['ready_seconds']:.2f}s.")
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Setup
 origins = ["*"]
@@ -19,133 +95,493 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, metrics=metrics)
 
 # Initialize RAG Pipeline
 # Note: In a real app, you might want a singleton dependency injection
-rag_pipeline = RAGPipeline()
-COLLECTION_NAME = "rag_collection"
-# Ensure collection exists on startup
-rag_pipeline.create_collection_if_not_exists(COLLECTION_NAME)
+# Write counters in SQLite, so every worker's query cache sees writes made through the others
+rag_pipeline = RAGPipeline(versions=CollectionVersions(os.getenv("VERSIONS_DB_PATH", "versions.db")))
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "rag_collection")
+COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Collections known to exist, so routing a request doesn't cost a Qdrant round trip
+known_collections = set()
+# Readiness and startup timings, filled in by `initialize` and reported by /ready
+startup_state: Dict[str, Any] = {"ready": False, "error": None}
+
+ingestion_pipeline = IngestionPipeline(
+    rag_pipeline,
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", 256)),
+    queue_size=int(os.getenv("INGEST_QUEUE_SIZE", 4)),
+    upsert_workers=int(os.getenv("INGEST_UPSERT_WORKERS", 2)),
+    manifest=ChunkManifest(os.getenv("MANIFEST_DB_PATH", "manifest.db")),
+)
+
+# ETag/Last-Modified and text hash per crawled page, for conditional re-crawls
+fetch_cache = FetchCache(os.getenv("CRAWL_CACHE_DB_PATH", "crawl_cache.db"))
+
+job_manager = JobManager(
+    ingestion_pipeline,
+    JobStore(os.getenv("JOBS_DB_PATH", "jobs.db")),
+    workers=int(os.getenv("JOB_WORKERS", 2)),
+    fetch_cache=fetch_cache,
+    lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", 60)),
+)
+
+context_builder = ContextBuilder(
+    token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", 3000)),
+    tokenizer_name=os.getenv("PROMPT_TOKENIZER"),
+)
+
+query_cache: Optional[QueryCache] = None
+if os.getenv("QUERY_CACHE", "true").lower() == "true":
+    query_cache = QueryCache(
+        max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 1000)),
+        ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_SECONDS", 3600)),
+        similarity_threshold=float(os.getenv("QUERY_CACHE_SIMILARITY", 0.95)),
+    )
+
+# /query/batch limits: queries per request, and LLM calls in flight across all batches
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 256))
+batch_llm_slots = asyncio.Semaphore(int(os.getenv("QUERY_BATCH_CONCURRENCY", 4)))
+
+# Every request may name a collection (default COLLECTION_NAME) and a tenant.
+# Documents are stored with their tenant and metadata as payload; queries only
+# see their own tenant's documents and can filter on metadata fields.
 
 class UpsertRequest(BaseModel):
     id: Optional[str] = None
     text: str
     metadata: Optional[dict] = None
+    tenant: Optional[str] = None
+    collection: Optional[str] = None
 
 class BulkUpsertRequest(BaseModel):
     documents: List[UpsertRequest]
+    # Defaults for documents that don't set their own
+    tenant: Optional[str] = None
+    collection: Optional[str] = None
 
 class IngestUrlRequest(BaseModel):
     url: str
     metadata: Optional[dict] = None
+    tenant: Optional[str] = None
+    collection: Optional[str] = None
+    # Crawl the site from `url` (sitemaps + same-host links) instead of fetching one page
+    crawl: bool = False
+    max_pages: int = 100
+    max_depth: int = 2
+    sitemaps: bool = True
+
+class IngestDirectoryRequest(BaseModel):
+    pattern: str
+    workers: Optional[int] = None
+    metadata: Optional[dict] = None
+    tenant: Optional[str] = None
+    collection: Optional[str] = None
 
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 5
+    # "hybrid" fuses BM25 keyword matches with vector search (exact IDs, error codes, names)
+    retrieval_mode: Literal["dense", "hybrid"] = "dense"
+    # Rescore an over-fetched candidate set with the cross-encoder (requires RERANK=true)
+    rerank: bool = False
+    tenant: Optional[str] = None
+    collection: Optional[str] = None
+    # Metadata field -> value, list of values, or {"gte": .., "lte": ..} range
+    filters: Optional[Dict[str, Any]] = None
+    # Return a per-stage timing breakdown (ms) with the answer
+    debug: bool = False
+    # Seconds to wait for the answer, LLM queueing included (default: LLM_DEADLINE)
+    timeout: Optional[float] = None
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[str]
+    # Prompt size after merging/deduplicating/truncating context, and tokens saved by it
+    prompt_tokens: Optional[int] = None
+    prompt_tokens_saved: Optional[int] = None
+    # Stage -> milliseconds, when the request set `debug`
+    timings: Optional[Dict[str, float]] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    # Shared by every query in the batch, as in QueryRequest
+    top_k: int = 5
+    retrieval_mode: Literal["dense", "hybrid"] = "dense"
+    rerank: bool = False
+    tenant: Optional[str] = None
+    collection: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+    # Per-query LLM deadline in seconds; batch generations queue behind interactive ones
+    timeout: Optional[float] = None
+
+class BatchQueryItem(BaseModel):
+    query: str
+    answer: Optional[str] = None
+    sources: List[str] = []
+    # Set instead of `answer` when this query's generation failed
+    error: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "ok", "message": "RAG Antigravity API is running"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Prometheus scrape endpoint.
+    """
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled or prometheus_client is not installed")
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/health")
-def health_check():
+async def health_check():
+    """
+    Liveness: the process is up and serving requests, even while still warming up.
+    """
     return {"status": "ok"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once the models are warm and the default collection exists, 503 until then.
+    """
+    if not startup_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting", **startup_state})
+    return {"status": "ready", **startup_state}
+
+async def resolve_collection(name: Optional[str], create: bool = False) -> str:
+    """
+    Route a request to its collection, creating it on first write if `create` is set.
+    """
+    if name is None:
+        return COLLECTION_NAME
+    if not COLLECTION_NAME_RE.match(name):
+        raise HTTPException(status_code=400, detail=f"Invalid collection name: {name}")
+    if name not in known_collections:
+        if create:
+            await rag_pipeline.acreate_collection_if_not_exists(name)
+        elif not await rag_pipeline.async_client.collection_exists(name):
+            raise HTTPException(status_code=404, detail=f"Collection {name} not found")
+        known_collections.add(name)
+    return name
+
+def document(text: str, doc_id: Optional[str], tenant: Optional[str], metadata: Optional[dict]) -> Dict[str, Any]:
+    return {"id": doc_id, "text": text, "tenant": tenant, "metadata": metadata}
+
+def job_accepted(job_id: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"},
+    )
+
 @app.post("/upsert")
-def upsert_document(request: UpsertRequest):
+async def upsert_document(request: UpsertRequest, background: bool = False):
+    collection = await resolve_collection(request.collection, create=True)
+    doc = document(request.text, request.id, request.tenant, request.metadata)
+    if background:
+        return job_accepted(job_manager.submit("upsert", collection, [doc]))
     try:
-        # 1. Chunking
-        chunks = chunk_text(request.text)
-        
-        # 2. Prepare for RAG upsert
-        # If id is not provided, we rely on ingestion pipeline or generate here.
-        # But rag.upsert_documents expects list of dicts with 'id' and 'text'
-        import uuid
-        docs = []
-        base_id = request.id if request.id else str(uuid.uuid4())
-        
-        # Simple strategy: use base_id for the first chunk or derived for others?
-        # Actually RAGPipeline.upsert_documents expects us to pass chunks if we want chunk-level retrieval.
-        # But wait, rag.upsert_documents takes docs and embeds them.
-        # If we just pass request.text as one doc, it might be too large.
-        # We should upsert the CHUNKS.
-        
-        for i, chunk in enumerate(chunks):
-            # Qdrant requires UUID or Unsigned Integer IDs
-            # We generate a new UUID for each chunk to satisfy this
-            chunk_id = str(uuid.uuid4())
-            docs.append({"id": chunk_id, "text": chunk})
-
-        # 3. Upsert
-        rag_pipeline.upsert_documents(COLLECTION_NAME, docs)
-        
-        return {"message": f"Successfully processed and upserted {len(docs)} chunks."}
+        # Chunks get deterministic IDs; with a manifest only changed chunks are re-embedded
+        stats = await asyncio.to_thread(ingestion_pipeline.run, collection, [doc])
+        return {"message": f"Successfully processed and upserted {stats['chunks']} chunks.", "stats": stats}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/bulk_upsert")
-def bulk_upsert_documents(request: BulkUpsertRequest):
+async def bulk_upsert_documents(request: BulkUpsertRequest, background: bool = False):
+    collection = await resolve_collection(request.collection, create=True)
+    documents = [
+        document(doc_req.text, doc_req.id, doc_req.tenant or request.tenant, doc_req.metadata)
+        for doc_req in request.documents
+    ]
+    if background:
+        return job_accepted(job_manager.submit("upsert", collection, documents))
     try:
-        all_docs = []
-        import uuid
-        for doc_req in request.documents:
-            chunks = chunk_text(doc_req.text)
-            base_id = doc_req.id if doc_req.id else str(uuid.uuid4())
-            for i, chunk in enumerate(chunks):
-                chunk_id = str(uuid.uuid4())
-                all_docs.append({"id": chunk_id, "text": chunk})
-        
-        rag_pipeline.upsert_documents(COLLECTION_NAME, all_docs)
-        return {"message": f"Successfully processed and upserted {len(all_docs)} chunks from {len(request.documents)} documents."}
+        # Chunk -> embed -> upsert runs as a bounded, batched pipeline off the event loop
+        stats = await asyncio.to_thread(ingestion_pipeline.run, collection, documents)
+        return {
+            "message": f"Successfully processed and upserted {stats['chunks']} chunks from {len(request.documents)} documents.",
+            "stats": stats,
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/ingest_url")
-def ingest_url_endpoint(request: IngestUrlRequest):
+async def ingest_url_endpoint(request: IngestUrlRequest, background: bool = False):
+    collection = await resolve_collection(request.collection, create=True)
+    crawl_options = None
+    if request.crawl:
+        crawl_options = {"max_pages": request.max_pages, "max_depth": request.max_depth, "sitemaps": request.sitemaps}
+    if background:
+        item = {"url": request.url, "tenant": request.tenant, "metadata": request.metadata, "crawl": crawl_options}
+        return job_accepted(job_manager.submit("ingest_url", collection, [item]))
+    if crawl_options is not None:
+        return await crawl_and_ingest(collection, request, crawl_options)
     try:
         # 1. Scrape
-        text = scrape_url(request.url)
+        text = await ascrape_url(request.url)
         if not text:
              raise HTTPException(status_code=400, detail=f"Failed to scrape content from {request.url}")
 
-        # 2. Chunking
-        chunks = chunk_text(text)
-        
-        # 3. Prepare for RAG upsert
-        import uuid
-        docs = []
-        base_id = str(uuid.uuid4())
+        # 2. Chunk, embed and upsert; the URL identifies the document for re-ingestion
+        doc = document(text, request.url, request.tenant, request.metadata)
+        stats = await asyncio.to_thread(ingestion_pipeline.run, collection, [doc])
         
-        for i, chunk in enumerate(chunks):
-            chunk_id = str(uuid.uuid4())
-            docs.append({"id": chunk_id, "text": chunk})
+        return {"message": f"Successfully scraped and upserted {stats['chunks']} chunks from {request.url}", "stats": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 4. Upsert
-        rag_pipeline.upsert_documents(COLLECTION_NAME, docs)
-        
-        return {"message": f"Successfully scraped and upserted {len(docs)} chunks from {request.url}"}
+async def crawl_and_ingest(collection: str, request: IngestUrlRequest, options: Dict[str, Any]):
+    crawler = SiteCrawler(
+        http_clients.scraper, fetch_cache, scope=crawl_scope(collection, request.tenant),
+        **crawler_settings(), **options
+    )
+    pages = crawler.crawl(request.url)
+    try:
+        # Pages stream from the crawl on this loop into the pipeline's thread as they are parsed
+        documents = iter_crawled_documents(pages, asyncio.get_running_loop(), request.tenant, request.metadata)
+        stats = await asyncio.to_thread(ingestion_pipeline.run, collection, documents)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await pages.aclose()
+    crawler.save_cache()
+    crawl_stats = crawler.stats
+    return {
+        "message": (
+            f"Crawled {crawl_stats['pages'] + crawl_stats['not_modified']} pages from {request.url} "
+            f"({crawl_stats['changed']} new or changed) and upserted {stats['chunks']} chunks"
+        ),
+        "stats": {**stats, "crawl": crawl_stats},
+    }
+
+INGEST_ROOT = os.path.realpath(os.getenv("INGEST_ROOT", "."))
+
+def resolve_ingest_pattern(pattern: str) -> str:
+    """Resolve a pattern under INGEST_ROOT, refusing anything that escapes it."""
+    resolved = os.path.realpath(os.path.join(INGEST_ROOT, pattern))
+    if os.path.commonpath([resolved, INGEST_ROOT]) != INGEST_ROOT:
+        raise HTTPException(status_code=400, detail=f"Pattern must stay within INGEST_ROOT: {pattern}")
+    return resolved
+
+@app.post("/ingest_directory")
+async def ingest_directory_endpoint(request: IngestDirectoryRequest, background: bool = False):
+    pattern = resolve_ingest_pattern(request.pattern)
+    collection = await resolve_collection(request.collection, create=True)
+    if background:
+        paths = expand_paths(pattern)
+        if not paths:
+            raise HTTPException(status_code=400, detail=f"No supported files match {request.pattern}")
+        items = [{"path": path, "tenant": request.tenant, "metadata": request.metadata} for path in paths]
+        return job_accepted(job_manager.submit("ingest_file", collection, items))
+    try:
+        # Text extraction runs in a process pool; chunks stream into the embed/upsert stages
+        extract_stats: dict = {}
+        chunks = iter_directory_chunks(
+            pattern, workers=request.workers, stats=extract_stats,
+            tenant=request.tenant, metadata=request.metadata
+        )
+        stats = await asyncio.to_thread(ingestion_pipeline.run_chunked, collection, chunks)
+        stats.update(extract_stats)
+        return {
+            "message": f"Successfully ingested {stats['chunks']} chunks from {stats['files']} files.",
+            "stats": stats,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+def rejected_error(e: GenerationRejected) -> HTTPException:
+    headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
 
 @app.post("/query", response_model=QueryResponse)
-def query_rag(request: QueryRequest):
+async def query_rag(request: QueryRequest):
+    collection = await resolve_collection(request.collection)
+    with collect_timings() as timings:
+        response = await answer_query(collection, request)
+    if request.debug:
+        response.timings = {stage: round(ms, 3) for stage, ms in timings.items()}
+    return response
+
+async def answer_query(collection: str, request: QueryRequest) -> QueryResponse:
     try:
+        version = rag_pipeline.collection_version(collection)
+        cache_variant = (
+            request.top_k, request.retrieval_mode, request.rerank, request.tenant,
+            json.dumps(request.filters, sort_keys=True) if request.filters else None,
+        )
+        if query_cache is not None:
+            cached = query_cache.get_exact(collection, request.query, cache_variant, version)
+            if cached is not None:
+                return QueryResponse(answer=cached["answer"], sources=cached["sources"])
+        # Shed before retrieval when the LLM queue is already full
+        scheduler_for().admit()
+
         # 1. Retrieve
-        retrieved_results = rag_pipeline.retrieve(COLLECTION_NAME, request.query, request.top_k)
+        query_vector = await rag_pipeline.embeddings.aget_embedding(request.query)
+        # Chunk id -> (doc_id, chunk_index), so the prompt keeps each document's chunks in order
+        positions = {}
+        retrieved_results = await rag_pipeline.aretrieve(
+            collection, request.query, request.top_k,
+            query_vector=query_vector, mode=request.retrieval_mode, rerank=request.rerank,
+            tenant=request.tenant, filters=request.filters, positions=positions
+        )
         # retrieved_results is list of (id, score, text)
         
+        source_ids = [res[0] for res in retrieved_results]
         source_texts = [res[2] for res in retrieved_results]
+
+        if query_cache is not None:
+            cached = query_cache.get_semantic(collection, query_vector, source_ids, cache_variant, version)
+            if cached is not None:
+                return QueryResponse(answer=cached["answer"], sources=source_texts)
         
-        # 2. Assemble Prompt
-        prompt = assemble_prompt(request.query, source_texts)
+        # 2. Assemble Prompt (overlaps merged, duplicates dropped, bounded by PROMPT_TOKEN_BUDGET)
+        prompt, prompt_stats = context_builder.build(request.query, retrieved_results, positions)
         
         # 3. Call LLM
-        answer = call_llm(prompt)
+        answer = await agenerate(prompt, timeout=request.timeout)
+
+        if query_cache is not None and not answer.startswith("Error"):
+            query_cache.put(
+                collection, request.query, cache_variant, version,
+                query_vector, source_ids, answer, source_texts
+            )
         
-        return QueryResponse(answer=answer, sources=source_texts)
+        return QueryResponse(
+            answer=answer,
+            sources=source_texts,
+            prompt_tokens=prompt_stats["prompt_tokens"],
+            prompt_tokens_saved=prompt_stats["prompt_tokens_saved"],
+        )
+    except GenerationRejected as e:
+        raise rejected_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_rag_batch(request: BatchQueryRequest):
+    """
+    Answer many queries in one request.
+
+    All queries are embedded in one encoder call and searched with one Qdrant
+    batch query; answers are generated concurrently, at most
+    QUERY_BATCH_CONCURRENCY at a time. Results come back in request order, and
+    a failed generation sets that item's `error` without failing the batch.
+    """
+    if len(request.queries) > QUERY_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {QUERY_BATCH_MAX_SIZE} queries per batch, got {len(request.queries)}"
+        )
+    collection = await resolve_collection(request.collection)
+    version = rag_pipeline.collection_version(collection)
+    cache_variant = (
+        request.top_k, request.retrieval_mode, request.rerank, request.tenant,
+        json.dumps(request.filters, sort_keys=True) if request.filters else None,
+    )
+    items: List[Optional[BatchQueryItem]] = [None] * len(request.queries)
+    if query_cache is not None:
+        for i, query in enumerate(request.queries):
+            cached = query_cache.get_exact(collection, query, cache_variant, version)
+            if cached is not None:
+                items[i] = BatchQueryItem(query=query, answer=cached["answer"], sources=cached["sources"])
+
+    pending = [i for i, item in enumerate(items) if item is None]
+    queries = [request.queries[i] for i in pending]
+    positions = {}
+    try:
+        # 1. Retrieve: one encoder call, one Qdrant batch query
+        query_vectors = await asyncio.to_thread(rag_pipeline.embeddings.encode_array, queries) if queries else []
+        retrieved = await rag_pipeline.aretrieve_batch(
+            collection, queries, request.top_k, mode=request.retrieval_mode, rerank=request.rerank,
+            tenant=request.tenant, filters=request.filters, query_vectors=query_vectors, positions=positions
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    async def answer_one(query: str, query_vector, retrieved_results) -> BatchQueryItem:
+        source_ids = [res[0] for res in retrieved_results]
+        source_texts = [res[2] for res in retrieved_results]
+        if query_cache is not None:
+            cached = query_cache.get_semantic(collection, query_vector, source_ids, cache_variant, version)
+            if cached is not None:
+                return BatchQueryItem(query=query, answer=cached["answer"], sources=source_texts)
+        try:
+            # 2. Assemble Prompt, 3. Call LLM (bounded across all batches)
+            prompt, prompt_stats = context_builder.build(query, retrieved_results, positions)
+            async with batch_llm_slots:
+                answer = await agenerate(prompt, priority=PRIORITY_BATCH, timeout=request.timeout)
+        except Exception as e:
+            return BatchQueryItem(query=query, sources=source_texts, error=str(e))
+        if answer.startswith("Error"):
+            return BatchQueryItem(query=query, sources=source_texts, error=answer)
+        if query_cache is not None:
+            query_cache.put(
+                collection, query, cache_variant, version,
+                query_vector, source_ids, answer, source_texts
+            )
+        return BatchQueryItem(
+            query=query, answer=answer, sources=source_texts, prompt_tokens=prompt_stats["prompt_tokens"]
+        )
+
+    answered = await asyncio.gather(*(
+        answer_one(query, vector, results) for query, vector, results in zip(queries, query_vectors, retrieved)
+    ))
+    for i, item in zip(pending, answered):
+        items[i] = item
+    return BatchQueryResponse(results=items)
+
+@app.post("/query/stream")
+async def query_rag_stream(request: QueryRequest):
+    """
+    Stream the answer as newline-delimited JSON events.
+
+    The first event carries the retrieved sources, followed by one event per
+    generated token and a final "done" event, or an "error" event (with the
+    HTTP status it stands for) if generation is shed or misses its deadline.
+    """
+    collection = await resolve_collection(request.collection)
+    try:
+        # Shed before retrieval when the LLM queue is already full
+        scheduler_for().admit()
+    except GenerationRejected as e:
+        raise rejected_error(e)
+    positions = {}
+    try:
+        retrieved_results = await rag_pipeline.aretrieve(
+            collection, request.query, request.top_k,
+            mode=request.retrieval_mode, rerank=request.rerank,
+            tenant=request.tenant, filters=request.filters, positions=positions
+        )
+        source_texts = [res[2] for res in retrieved_results]
+        prompt, prompt_stats = context_builder.build(request.query, retrieved_results, positions)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        yield json.dumps({"type": "sources", "sources": source_texts, "prompt": prompt_stats}) + "\n"
+        try:
+            async for token in astream_generate(prompt, timeout=request.timeout):
+                yield json.dumps({"type": "token", "content": token}) + "\n"
+        except GenerationRejected as e:
+            yield json.dumps({"type": "error", "status": e.status_code, "detail": str(e)}) + "\n"
+            return
+        yield json.dumps({"type": "done"}) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+from typing import Dict, List, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunk_manifest (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    PRIMARY KEY (collection, doc_id, chunk_id)
+);
+"""
+
+class ChunkManifest:
+    """
+    Per-document record of which chunks are currently stored in a collection.
+
+    Used to diff a re-ingested document against what's already indexed, so only
+    new or changed chunks are embedded and stale ones are deleted.
+    """
+    def __init__(self, path: str = "manifest.db"):
+        """
+        Args:
+            path (str): SQLite database file. ":memory:" for tests.
+        """
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def get(self, collection: str, doc_id: str) -> Dict[str, Tuple[int, str]]:
+        """
+        Chunks stored for a document.
+
+        Returns:
+            Dict[str, Tuple[int, str]]: chunk_id -> (chunk_index, chunk_hash).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, chunk_index, chunk_hash FROM chunk_manifest WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            ).fetchall()
+        return {chunk_id: (index, digest) for chunk_id, index, digest in rows}
+
+    def replace(self, collection: str, doc_id: str, chunks: List[Tuple[str, int, str]]):
+        """
+        Record the full set of chunks now stored for a document.
+
+        Args:
+            chunks (List[Tuple[str, int, str]]): (chunk_id, chunk_index, chunk_hash) tuples.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM chunk_manifest WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_manifest (collection, doc_id, chunk_id, chunk_index, chunk_hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(collection, doc_id, chunk_id, index, digest) for chunk_id, index, digest in chunks],
+            )
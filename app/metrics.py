@@ -0,0 +1,309 @@
+import os
+import time
+import inspect
+import functools
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import prometheus_client
+except ImportError:  # optional: stage timings still reach debug responses and spans
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# Per-request stage breakdown (stage -> ms), opened by `collect_timings`
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("rag_timings", default=None)
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """
+    Record every stage that runs in this context (including tasks and threads
+    started from it) into a dict of stage -> milliseconds.
+    """
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings["total"] = (time.perf_counter() - started) * 1000.0
+        _timings.reset(token)
+
+class Metrics:
+    """
+    Hot-path instrumentation: stage latencies, token counts, batch sizes and
+    cache hit/miss counts.
+
+    Every measurement goes to Prometheus (when `prometheus_client` is
+    installed), to the per-request breakdown opened by `collect_timings`, and
+    stages also open an OpenTelemetry span when tracing is enabled and
+    `opentelemetry` is installed. With neither installed only the per-request
+    breakdown is kept.
+    """
+    def __init__(self, enabled: bool = True, tracing: bool = False, registry: Any = None):
+        """
+        Args:
+            enabled (bool): Export Prometheus metrics (requires prometheus_client).
+            tracing (bool): Open an OpenTelemetry span per stage (requires opentelemetry).
+            registry: Prometheus CollectorRegistry. Defaults to the global registry.
+        """
+        self.enabled = enabled and prometheus_client is not None
+        self.tracer = otel_trace.get_tracer("simple-rag") if tracing and otel_trace is not None else None
+        if not self.enabled:
+            return
+        self.registry = registry or prometheus_client.REGISTRY
+        kwargs = {"registry": self.registry}
+        self.stage_seconds = prometheus_client.Histogram(
+            "rag_stage_seconds", "Time spent per pipeline stage", ["stage"], buckets=LATENCY_BUCKETS, **kwargs
+        )
+        self.stage_errors = prometheus_client.Counter(
+            "rag_stage_errors", "Failed pipeline stages, including errors returned as strings", ["stage"], **kwargs
+        )
+        self.token_counts = prometheus_client.Histogram(
+            "rag_tokens", "Tokens per prompt, completion, etc.", ["kind"], buckets=TOKEN_BUCKETS, **kwargs
+        )
+        self.batch_sizes = prometheus_client.Histogram(
+            "rag_batch_size", "Items per batched call", ["kind"], buckets=SIZE_BUCKETS, **kwargs
+        )
+        self.cache_requests = prometheus_client.Counter(
+            "rag_cache_requests", "Cache lookups by outcome", ["cache", "result"], **kwargs
+        )
+        self.queue_depth = prometheus_client.Gauge(
+            "rag_queue_depth", "Requests waiting in an admission queue", ["queue"], **kwargs
+        )
+        self.rejected_requests = prometheus_client.Counter(
+            "rag_rejected_requests", "Requests shed by admission control", ["queue", "reason"], **kwargs
+        )
+        self.http_seconds = prometheus_client.Histogram(
+            "rag_http_request_seconds", "HTTP request latency", ["method", "route", "status"],
+            buckets=LATENCY_BUCKETS, **kwargs
+        )
+
+    def observe_stage(self, name: str, seconds: float):
+        if self.enabled:
+            self.stage_seconds.labels(name).observe(seconds)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds * 1000.0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a block as pipeline stage `name`; an exception counts as a stage error.
+        """
+        span = self.tracer.start_as_current_span(f"rag.{name}") if self.tracer is not None else nullcontext()
+        started = time.perf_counter()
+        with span:
+            try:
+                yield
+            except BaseException:
+                self.error(name)
+                raise
+            finally:
+                self.observe_stage(name, time.perf_counter() - started)
+
+    async def measure(self, name: str, awaitable):
+        """
+        Await `awaitable` as stage `name`, for coroutines created before they are awaited.
+        """
+        with self.stage(name):
+            return await awaitable
+
+    def timed(self, name: str, on_complete: Optional[Callable[[tuple, str], None]] = None, first_item: bool = False):
+        """
+        Decorator form of `stage` for functions, coroutines and (async) generators.
+
+        A str result starting with "Error" (the LLM helpers' failure convention)
+        counts as a stage error. Generators are timed while producing items only,
+        not while the consumer holds them, and only buffer items for `on_complete`.
+        A generator closed early still records its stage and closes the wrapped
+        generator; `on_complete` only sees complete outputs.
+
+        Args:
+            name (str): Stage name.
+            on_complete (Optional[Callable[[tuple, str], None]]): Called with the
+                call's positional args and its text output (generator items joined).
+            first_item (bool): For generators, also record the time to the first
+                item as stage "<name>_first_item".
+        """
+        def finish(args: tuple, text: Any):
+            if isinstance(text, str):
+                if text.startswith("Error"):
+                    self.error(name)
+                if on_complete is not None:
+                    on_complete(args, text)
+
+        def finish_stream(args: tuple, first: Any, items: list):
+            # Items are only buffered for on_complete; errors arrive as the first (only) item
+            if isinstance(first, str) and first.startswith("Error"):
+                self.error(name)
+            if on_complete is not None and all(isinstance(item, str) for item in items):
+                on_complete(args, "".join(items))
+
+        def decorate(func):
+            if inspect.isasyncgenfunction(func):
+                @functools.wraps(func)
+                async def async_gen_wrapper(*args, **kwargs):
+                    items, first, elapsed, called = [], None, 0.0, time.perf_counter()
+                    generator = func(*args, **kwargs)
+                    try:
+                        while True:
+                            started = time.perf_counter()
+                            try:
+                                item = await generator.__anext__()
+                            except StopAsyncIteration:
+                                break
+                            except BaseException:
+                                self.error(name)
+                                raise
+                            finally:
+                                elapsed += time.perf_counter() - started
+                            if first is None:
+                                first = item
+                                if first_item:
+                                    self.observe_stage(f"{name}_first_item", time.perf_counter() - called)
+                            if on_complete is not None:
+                                items.append(item)
+                            yield item
+                    finally:
+                        # Also reached when the consumer stops early (aclose) or fails
+                        started = time.perf_counter()
+                        try:
+                            await generator.aclose()
+                        finally:
+                            self.observe_stage(name, elapsed + time.perf_counter() - started)
+                    finish_stream(args, first, items)
+                return async_gen_wrapper
+
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def gen_wrapper(*args, **kwargs):
+                    items, first, elapsed, called = [], None, 0.0, time.perf_counter()
+                    generator = func(*args, **kwargs)
+                    try:
+                        while True:
+                            started = time.perf_counter()
+                            try:
+                                item = next(generator)
+                            except StopIteration:
+                                break
+                            except BaseException:
+                                self.error(name)
+                                raise
+                            finally:
+                                elapsed += time.perf_counter() - started
+                            if first is None:
+                                first = item
+                                if first_item:
+                                    self.observe_stage(f"{name}_first_item", time.perf_counter() - called)
+                            if on_complete is not None:
+                                items.append(item)
+                            yield item
+                    finally:
+                        # Also reached when the consumer stops early (close) or fails
+                        started = time.perf_counter()
+                        try:
+                            generator.close()
+                        finally:
+                            self.observe_stage(name, elapsed + time.perf_counter() - started)
+                    finish_stream(args, first, items)
+                return gen_wrapper
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(name):
+                        result = await func(*args, **kwargs)
+                    finish(args, result)
+                    return result
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    result = func(*args, **kwargs)
+                finish(args, result)
+                return result
+            return wrapper
+        return decorate
+
+    def error(self, stage: str):
+        if self.enabled:
+            self.stage_errors.labels(stage).inc()
+
+    def tokens(self, kind: str, count: int):
+        if self.enabled:
+            self.token_counts.labels(kind).observe(count)
+
+    def batch(self, kind: str, size: int):
+        if self.enabled:
+            self.batch_sizes.labels(kind).observe(size)
+
+    def cache(self, name: str, hits: int = 0, misses: int = 0):
+        if self.enabled:
+            if hits:
+                self.cache_requests.labels(name, "hit").inc(hits)
+            if misses:
+                self.cache_requests.labels(name, "miss").inc(misses)
+
+    def queue(self, name: str, depth: int):
+        if self.enabled:
+            self.queue_depth.labels(name).set(depth)
+
+    def rejected(self, name: str, reason: str):
+        if self.enabled:
+            self.rejected_requests.labels(name, reason).inc()
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        if self.enabled:
+            self.http_seconds.labels(method, route, str(status)).observe(seconds)
+
+    def render(self) -> Tuple[bytes, str]:
+        """
+        Prometheus text exposition of every metric, and its content type.
+        """
+        if not self.enabled:
+            raise RuntimeError("Prometheus metrics are disabled (set METRICS_ENABLED=true and install prometheus_client)")
+        return prometheus_client.generate_latest(self.registry), prometheus_client.CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency per method, route template and status.
+    """
+    def __init__(self, app, metrics: "Metrics"):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; templates keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.metrics.observe_request(scope["method"], route, status, time.perf_counter() - started)
+
+metrics = Metrics(
+    enabled=os.getenv("METRICS_ENABLED", "true").lower() == "true",
+    tracing=os.getenv("OTEL_TRACING", "false").lower() == "true",
+)
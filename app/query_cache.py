@@ -0,0 +1,211 @@
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+import numpy as np
+
+from metrics import metrics
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize query text for exact-match lookups (case, whitespace, trailing punctuation).
+    """
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+VERSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collection_versions (
+    collection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+class CollectionVersions:
+    """
+    Per-collection write counters in SQLite.
+
+    Every process opening the same file (e.g. the `serve.py` workers) sees
+    the others' writes, so a cache entry built in one worker goes stale when
+    another worker ingests into the collection.
+    """
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path (str): SQLite database file. ":memory:" keeps the counters in this process.
+        """
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(VERSIONS_SCHEMA)
+
+    def get(self, collection: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, collection: str) -> int:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO collection_versions (collection, version) VALUES (?, 1) "
+                "ON CONFLICT(collection) DO UPDATE SET version = version + 1",
+                (collection,),
+            )
+            return self._conn.execute(
+                "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+            ).fetchone()[0]
+
+class QueryCache:
+    """
+    Two-level answer cache for the query path.
+
+    - Exact tier: normalized query text -> answer. A hit skips retrieval and generation.
+    - Semantic tier: reuses an answer when the new query embedding is within
+      `similarity_threshold` (cosine) of a cached one AND retrieval returned the
+      same source IDs, so only generation is skipped.
+
+    `variant` captures request parameters that change the answer (e.g. top_k
+    and retrieval mode); entries only match requests with the same variant.
+    Entries expire after `ttl_seconds`, the cache holds at most `max_entries`
+    (LRU), and every entry records the collection version it was built from so
+    any upsert into that collection invalidates it.
+    """
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95):
+        """
+        Args:
+            max_entries (int): Maximum number of cached answers.
+            ttl_seconds (float): Time-to-live of an entry.
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_exact(self, collection: str, query: str, variant: Hashable, version: int) -> Optional[Dict[str, Any]]:
+        """
+        Look up an answer by normalized query text.
+
+        Returns:
+            Optional[Dict[str, Any]]: Entry with "answer" and "sources", or None.
+        """
+        key = (collection, variant, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._is_fresh(entry, version):
+                if entry is not None:
+                    del self._entries[key]
+                metrics.cache("query_exact", misses=1)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+        metrics.cache("query_exact", hits=1)
+        return entry
+
+    def get_semantic(
+        self,
+        collection: str,
+        query_vector: Sequence[float],
+        source_ids: List[Any],
+        variant: Hashable,
+        version: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up an answer for a near-duplicate query with the same retrieved sources.
+
+        Returns:
+            Optional[Dict[str, Any]]: Entry with "answer" and "sources", or None.
+        """
+        vector = self._unit(query_vector)
+        source_ids = [str(i) for i in source_ids]
+        with self._lock:
+            self._expire(version, collection)
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if key[0] == collection and key[1] == variant and entry["source_ids"] == source_ids
+            ]
+            if candidates:
+                matrix = np.stack([entry["vector"] for _, entry in candidates])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    metrics.cache("query_semantic", hits=1)
+                    return entry
+            self.misses += 1
+        metrics.cache("query_semantic", misses=1)
+        return None
+
+    def put(
+        self,
+        collection: str,
+        query: str,
+        variant: Hashable,
+        version: int,
+        query_vector: Sequence[float],
+        source_ids: List[Any],
+        answer: str,
+        sources: List[str],
+    ):
+        """
+        Cache an answer together with the retrieval it was generated from.
+        """
+        key = (collection, variant, normalize_query(query))
+        entry = {
+            "answer": answer,
+            "sources": sources,
+            "source_ids": [str(i) for i in source_ids],
+            "vector": self._unit(query_vector),
+            "version": version,
+            "created": time.monotonic(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection: Optional[str] = None):
+        """
+        Drop cached answers for one collection, or all of them.
+        """
+        with self._lock:
+            if collection is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == collection]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+    def _is_fresh(self, entry: Dict[str, Any], version: int) -> bool:
+        return entry["version"] == version and time.monotonic() - entry["created"] < self.ttl_seconds
+
+    def _expire(self, version: int, collection: str):
+        stale = [
+            key for key, entry in self._entries.items()
+            if key[0] == collection and not self._is_fresh(entry, version)
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
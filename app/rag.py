@@ -1,15 +1,318 @@
 import os
-from typing import List, Dict, Any, Tuple
-from qdrant_client import QdrantClient
+import time
+import asyncio
+import operator
+import threading
+from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 from embeddings import EmbeddingsUtils
+from lexical import BM25Index, reciprocal_rank_fusion
+from rerank import CrossEncoderReranker
+from collection_profiles import CollectionProfile, profile_from_env
+from metrics import metrics
+from vector_store import EmbeddedVectorStore, ThreadedAsyncQdrant, embedded_store_from_env
+from chunk_store import ChunkStore, chunk_store_from_env
+from query_cache import CollectionVersions
+
+RANGE_OPS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+# Points per scroll page when rebuilding a BM25 index from a collection
+LEXICAL_BACKFILL_BATCH_SIZE = 1000
+# Payload fields that place a chunk in its document, for ordering prompt context
+POSITION_FIELDS = ["doc_id", "chunk_index"]
+
+def build_filter(tenant: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> Optional[models.Filter]:
+    """
+    Translate a tenant and metadata filters into a Qdrant payload filter.
+
+    Filter values match the document's "metadata" payload: a scalar means
+    equality, a list means "any of", and a dict with "gt"/"gte"/"lt"/"lte"
+    keys means a numeric range.
+
+    Args:
+        tenant (Optional[str]): Only match points stored for this tenant.
+        filters (Optional[Dict[str, Any]]): Metadata field -> condition.
+
+    Returns:
+        Optional[models.Filter]: The filter, or None if there is nothing to filter on.
+    """
+    conditions = []
+    if tenant is not None:
+        conditions.append(models.FieldCondition(key="tenant", match=models.MatchValue(value=tenant)))
+    for field, condition in (filters or {}).items():
+        key = f"metadata.{field}"
+        if isinstance(condition, dict):
+            conditions.append(models.FieldCondition(key=key, range=models.Range(**condition)))
+        elif isinstance(condition, list):
+            conditions.append(models.FieldCondition(key=key, match=models.MatchAny(any=condition)))
+        else:
+            conditions.append(models.FieldCondition(key=key, match=models.MatchValue(value=condition)))
+    return models.Filter(must=conditions) if conditions else None
+
+def payload_matches(payload: Dict[str, Any], tenant: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    In-process equivalent of `build_filter`, for results that didn't come from Qdrant (BM25 hits).
+    """
+    if tenant is not None and payload.get("tenant") != tenant:
+        return False
+    metadata = payload.get("metadata") or {}
+    for field, condition in (filters or {}).items():
+        value = metadata.get(field)
+        # Like Qdrant, a list-valued field matches if any of its elements does
+        values = value if isinstance(value, list) else [value]
+        if isinstance(condition, dict):
+            if not any(
+                isinstance(item, (int, float))
+                and all(RANGE_OPS[op](item, bound) for op, bound in condition.items() if bound is not None)
+                for item in values
+            ):
+                return False
+        elif isinstance(condition, list):
+            if not any(item in condition for item in values):
+                return False
+        elif condition not in values:
+            return False
+    return True
 
 class RAGPipeline:
-    def __init__(self):
+    def __init__(
+        self,
+        client: Optional[QdrantClient] = None,
+        embeddings: Optional[EmbeddingsUtils] = None,
+        profile: Optional[CollectionProfile] = None,
+        versions: Optional[CollectionVersions] = None,
+    ):
+        """
+        Args:
+            client (Optional[QdrantClient]): Qdrant client to use instead of one built from
+                QDRANT_HOST/QDRANT_PORT (e.g. QdrantClient(":memory:") for benchmarks), or an
+                `EmbeddedVectorStore`.
+            embeddings (Optional[EmbeddingsUtils]): Embedder to use instead of the default model.
+            profile (Optional[CollectionProfile]): HNSW/quantization/storage settings. Defaults to QDRANT_PROFILE.
+            versions (Optional[CollectionVersions]): Write counters, shared between processes when
+                file-backed. Defaults to in-memory counters.
+        """
+        # "qdrant" for a Qdrant server, "embedded" for the in-process store in vector_store.py
+        self.backend = os.getenv("VECTOR_BACKEND", "qdrant")
+        if self.backend not in ("qdrant", "embedded"):
+            raise ValueError(f"Unknown VECTOR_BACKEND: {self.backend}")
         host = os.getenv("QDRANT_HOST", "localhost")
         port = int(os.getenv("QDRANT_PORT", 6333))
-        self.client = QdrantClient(host=host, port=port)
-        self.embeddings = EmbeddingsUtils()
+        # gRPC sends vectors as packed floats instead of JSON number arrays
+        self._grpc_args = {
+            "prefer_grpc": os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true",
+            "grpc_port": int(os.getenv("QDRANT_GRPC_PORT", 6334)),
+        }
+        # Created on first use, so constructing the pipeline neither loads the model nor contacts Qdrant
+        self._client = client
+        self._embeddings = embeddings
+        self._init_lock = threading.Lock()
+        self.profile = profile if profile is not None else profile_from_env()
+        self._host = host
+        self._port = port
+        self._async_client: Optional[AsyncQdrantClient] = None
+        # Bumped on every write so caches built from a collection can tell they're stale
+        self.versions = versions if versions is not None else CollectionVersions()
+        # BM25 indexes kept alongside each collection for hybrid retrieval
+        self.lexical_enabled = os.getenv("LEXICAL_INDEX", "true").lower() == "true"
+        # Unset, each process keeps its own in-memory index, so with several workers
+        # (WEB_CONCURRENCY) a document is only keyword-searchable in the worker that wrote it
+        self.lexical_dir = os.getenv("LEXICAL_INDEX_DIR")
+        if self.lexical_enabled and not self.lexical_dir and int(os.getenv("WEB_CONCURRENCY", 1)) > 1:
+            print("Warning: LEXICAL_INDEX_DIR is unset, so workers don't share BM25 indexes; hybrid results differ per worker.")
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", 4))
+        self._lexical: Dict[str, BM25Index] = {}
+        # With CHUNK_STORE_DIR set, chunk texts live in a compressed local store instead of the payload
+        self.external_texts = bool(os.getenv("CHUNK_STORE_DIR"))
+        self._chunk_stores: Dict[str, ChunkStore] = {}
+        # Optional cross-encoder pass over an over-fetched candidate set
+        self.reranker: Optional[CrossEncoderReranker] = None
+        if os.getenv("RERANK", "false").lower() == "true":
+            self.reranker = CrossEncoderReranker(
+                model_name=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+                batch_size=int(os.getenv("RERANK_BATCH_SIZE", 32)),
+                deadline_ms=float(os.getenv("RERANK_DEADLINE_MS", 300)),
+            )
+        self.rerank_candidates = int(os.getenv("RERANK_CANDIDATES", 20))
+        self.rerank_token_budget = int(os.getenv("RERANK_TOKEN_BUDGET", 1500))
+
+    @property
+    def client(self) -> QdrantClient:
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None and self.backend == "embedded":
+                    self._client = embedded_store_from_env()
+                elif self._client is None:
+                    self._client = QdrantClient(host=self._host, port=self._port, **self._grpc_args)
+        return self._client
+
+    @client.setter
+    def client(self, client: QdrantClient):
+        self._client = client
+
+    @property
+    def embeddings(self) -> EmbeddingsUtils:
+        if self._embeddings is None:
+            with self._init_lock:
+                if self._embeddings is None:
+                    self._embeddings = EmbeddingsUtils()
+        return self._embeddings
+
+    @embeddings.setter
+    def embeddings(self, embeddings: EmbeddingsUtils):
+        self._embeddings = embeddings
+
+    def warmup(self) -> Dict[str, float]:
+        """
+        Load the embedding model (and reranker) and run one input through each,
+        so the first request doesn't pay for loading or first-call setup.
+
+        Returns:
+            Dict[str, float]: Seconds spent loading and warming up each model.
+        """
+        stats = {}
+        started = time.perf_counter()
+        embeddings = self.embeddings
+        stats["model_load_seconds"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        embeddings.encode_array(["warmup"])
+        stats["embedding_warmup_seconds"] = time.perf_counter() - started
+
+        if self.reranker is not None:
+            started = time.perf_counter()
+            self.reranker.score("warmup", ["warmup"])
+            stats["reranker_warmup_seconds"] = time.perf_counter() - started
+        return stats
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        """
+        Async Qdrant client, created on first use so it binds to the running event loop.
+        The embedded store is wrapped to run its calls in worker threads.
+        """
+        embedded = self.backend == "embedded" or isinstance(self._client, EmbeddedVectorStore)
+        if self._async_client is None and embedded:
+            self._async_client = ThreadedAsyncQdrant(self.client)
+        elif self._async_client is None:
+            self._async_client = AsyncQdrantClient(
+                host=self._host,
+                port=self._port,
+                **self._grpc_args,
+                pool_size=int(os.getenv("QDRANT_POOL_SIZE", 100)),
+                timeout=int(os.getenv("QDRANT_TIMEOUT", 30)),
+            )
+        return self._async_client
+
+    def collection_version(self, collection_name: str) -> int:
+        """
+        Write counter for a collection; changes whenever documents are upserted.
+        """
+        return self.versions.get(collection_name)
+
+    def _bump_version(self, collection_name: str):
+        self.versions.bump(collection_name)
+
+    def lexical_index(self, collection_name: str) -> Optional[BM25Index]:
+        """
+        The collection's BM25 index (loaded from LEXICAL_INDEX_DIR if persisted), or None if disabled.
+        """
+        if not self.lexical_enabled:
+            return None
+        if collection_name not in self._lexical:
+            store = self.chunk_store(collection_name)
+            with self._init_lock:
+                if collection_name not in self._lexical:
+                    path = None
+                    if self.lexical_dir:
+                        os.makedirs(self.lexical_dir, exist_ok=True)
+                        path = os.path.join(self.lexical_dir, f"{collection_name}.bm25")
+                    index = BM25Index(path)
+                    if len(index) == 0:
+                        self._backfill_lexical(collection_name, index, store)
+                    self._lexical[collection_name] = index
+        return self._lexical[collection_name]
+
+    def _backfill_lexical(self, collection_name: str, index: BM25Index, store: Optional[ChunkStore]):
+        """
+        Index the points already in a collection when there's no persisted BM25
+        index for it (in-memory indexes after a restart, or a new LEXICAL_INDEX_DIR).
+        """
+        if not self.client.collection_exists(collection_name):
+            return
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=LEXICAL_BACKFILL_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            texts = self._payload_texts(points)
+            missing = [str(point.id) for point in points if str(point.id) not in texts]
+            if missing and store is not None:
+                texts.update(store.get_many(missing))
+            index.add_many(texts.items())
+            if offset is None:
+                break
+        if len(index):
+            print(f"Backfilled BM25 index for '{collection_name}' with {len(index)} chunks")
+        index.save()
+
+    async def alexical_index(self, collection_name: str) -> Optional[BM25Index]:
+        """
+        Async variant of `lexical_index`: a cold index is loaded (or backfilled) in a worker thread.
+        """
+        if not self.lexical_enabled:
+            return None
+        index = self._lexical.get(collection_name)
+        if index is None:
+            index = await asyncio.to_thread(self.lexical_index, collection_name)
+        return index
+
+    def flush_lexical(self, collection_name: str):
+        """Persist the collection's BM25 index if it changed."""
+        index = self.lexical_index(collection_name)
+        if index is not None:
+            index.save()
+
+    def _index_lexical(self, collection_name: str, docs: List[Dict[str, Any]]):
+        index = self.lexical_index(collection_name)
+        if index is not None:
+            index.add_many((doc["id"], doc["text"]) for doc in docs)
+
+    def chunk_store(self, collection_name: str) -> Optional[ChunkStore]:
+        """
+        The collection's external chunk text store, or None if texts are kept in the payload.
+        """
+        if not self.external_texts:
+            return None
+        if collection_name not in self._chunk_stores:
+            with self._init_lock:
+                if collection_name not in self._chunk_stores:
+                    self._chunk_stores[collection_name] = chunk_store_from_env(collection_name)
+        return self._chunk_stores[collection_name]
+
+    def _store_texts(self, collection_name: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Move document texts into the chunk store, if enabled, and return the docs
+        to write to Qdrant: without "text", so the payload keeps only the point's
+        filterable fields (the point ID is the store key).
+        """
+        store = self.chunk_store(collection_name)
+        if store is None:
+            return docs
+        # Written before the points, so a point visible to search always has its text
+        store.put_many((str(doc["id"]), doc["text"]) for doc in docs)
+        return [{key: value for key, value in doc.items() if key != "text"} for doc in docs]
+
+    async def aclose(self):
+        """Close the async Qdrant client, if one was created."""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
 
     def create_collection_if_not_exists(self, collection_name: str, dim: int = 384):
         """
@@ -25,12 +328,11 @@ class RAGPipeline:
         if not exists:
             self.client.create_collection(
                 collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=dim,
-                    distance=models.Distance.COSINE
-                )
+                **self.profile.create_kwargs(dim)
             )
-            print(f"Collection '{collection_name}' created.")
+            for field, schema in self.profile.payload_schemas().items():
+                self.client.create_payload_index(collection_name, field, field_schema=schema)
+            print(f"Collection '{collection_name}' created with profile '{self.profile.name}'.")
         else:
             print(f"Collection '{collection_name}' already exists.")
 
@@ -47,23 +349,133 @@ class RAGPipeline:
 
         texts = [doc["text"] for doc in docs]
         vectors = self.embeddings.batch_embeddings(texts)
+        points = self.build_points(self._store_texts(collection_name, docs), vectors)
         
-        points = [
+        metrics.batch("upsert", len(points))
+        with metrics.stage("upsert"):
+            self.client.upsert(
+                collection_name=collection_name,
+                points=points
+            )
+        self._index_lexical(collection_name, docs)
+        self.flush_lexical(collection_name)
+        self._bump_version(collection_name)
+        print(f"Upserted {len(points)} points into '{collection_name}'.")
+
+    def build_points(self, docs: List[Dict[str, str]], vectors: List[List[float]]) -> List[models.PointStruct]:
+        """
+        Pair documents with their embeddings as Qdrant points.
+
+        Every key other than "id" (e.g. "text", "doc_id", "chunk_index") becomes payload.
+
+        Args:
+            docs (List[Dict[str, str]]): Documents with "id" and "text" keys.
+            vectors (List[List[float]]): One embedding per document.
+
+        Returns:
+            List[models.PointStruct]: Points ready to write.
+        """
+        return [
             models.PointStruct(
                 id=doc["id"],
                 vector=vector,
-                payload={"text": doc["text"]}
+                payload={key: value for key, value in doc.items() if key != "id"}
             )
             for doc, vector in zip(docs, vectors)
         ]
-        
-        self.client.upsert(
+
+    def write_vectors(
+        self,
+        collection_name: str,
+        docs: List[Dict[str, Any]],
+        vectors: np.ndarray,
+        batch_size: int = 64,
+    ):
+        """
+        Write documents with a float32 embedding matrix using Qdrant's columnar upload.
+
+        Unlike `upsert_documents`, vectors never become Python lists or
+        `PointStruct`s on our side; the array is passed through as-is.
+
+        Args:
+            collection_name (str): Name of the collection.
+            docs (List[Dict[str, Any]]): Documents with "id" and "text" keys; other keys become payload.
+            vectors (np.ndarray): Array of shape (len(docs), dim).
+            batch_size (int): Points per Qdrant request.
+        """
+        stored = self._store_texts(collection_name, docs)
+        metrics.batch("upsert", len(docs))
+        with metrics.stage("upsert"):
+            self.client.upload_collection(
+                collection_name=collection_name,
+                vectors=vectors,
+                payload=[{key: value for key, value in doc.items() if key != "id"} for doc in stored],
+                ids=[doc["id"] for doc in docs],
+                batch_size=batch_size,
+                max_retries=3,
+                wait=True
+            )
+        # Persisted by the caller via flush_lexical once the whole run is written
+        self._index_lexical(collection_name, docs)
+        self._bump_version(collection_name)
+
+    def delete_points(self, collection_name: str, ids: List[str]):
+        """
+        Delete points by ID.
+
+        Args:
+            collection_name (str): Name of the collection.
+            ids (List[str]): Point IDs to delete.
+        """
+        if not ids:
+            return
+        self.client.delete(
             collection_name=collection_name,
-            points=points
+            points_selector=models.PointIdsList(points=ids),
+            wait=True
+        )
+        index = self.lexical_index(collection_name)
+        if index is not None:
+            for point_id in ids:
+                index.remove(point_id)
+            index.save()
+        store = self.chunk_store(collection_name)
+        if store is not None:
+            store.delete_many(ids)
+        self._bump_version(collection_name)
+
+    def update_chunk_indexes(self, collection_name: str, indexes: Dict[str, int]):
+        """
+        Rewrite the "chunk_index" payload of unchanged chunks that moved within their document.
+
+        Args:
+            collection_name (str): Name of the collection.
+            indexes (Dict[str, int]): Point ID -> new chunk index.
+        """
+        if not indexes:
+            return
+        self.client.batch_update_points(
+            collection_name=collection_name,
+            update_operations=[
+                models.SetPayloadOperation(
+                    set_payload=models.SetPayload(payload={"chunk_index": index}, points=[point_id])
+                )
+                for point_id, index in indexes.items()
+            ],
+            wait=True
         )
-        print(f"Upserted {len(points)} points into '{collection_name}'.")
 
-    def retrieve(self, collection_name: str, query: str, top_k: int = 5) -> List[Tuple[str, float, str]]:
+    def retrieve(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 5,
+        mode: str = "dense",
+        rerank: bool = False,
+        tenant: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        positions: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> List[Tuple[str, float, str]]:
         """
         Retrieve relevant documents for a query.
         
@@ -71,23 +483,399 @@ class RAGPipeline:
             collection_name (str): Name of the collection.
             query (str): Query text.
             top_k (int): Number of results to return.
+            mode (str): "dense" for vector search only, "hybrid" to fuse it with BM25.
+            rerank (bool): Over-fetch candidates and keep the best top_k by cross-encoder
+                score within RERANK_TOKEN_BUDGET. Ignored unless RERANK is enabled.
+            tenant (Optional[str]): Only search this tenant's documents.
+            filters (Optional[Dict[str, Any]]): Metadata conditions (see `build_filter`).
+            positions (Optional[Dict[str, Tuple[str, int]]]): Filled with id -> (doc_id,
+                chunk_index) for the results stored with them, for `ContextBuilder.build`.
 
         Returns:
             List[Tuple[str, float, str]]: List of (id, score, text) tuples.
         """
+        if rerank and self.reranker is not None:
+            candidates = self.retrieve(
+                collection_name, query, max(top_k, self.rerank_candidates),
+                mode=mode, tenant=tenant, filters=filters, positions=positions
+            )
+            return self.reranker.rerank(query, candidates, top_k, self.rerank_token_budget)
+
         query_vector = self.embeddings.get_embedding(query)
+        index = self.lexical_index(collection_name) if mode == "hybrid" else None
+        limit = top_k * self.hybrid_candidates if index is not None else top_k
+        query_filter = build_filter(tenant, filters)
         
-        results = self.client.query_points(
-            collection_name=collection_name,
-            query=query_vector,
-            limit=top_k
-        ).points
-        
+        with metrics.stage("search"):
+            results = self.client.query_points(
+                collection_name=collection_name,
+                query=query_vector,
+                query_filter=query_filter,
+                limit=limit,
+                search_params=self.profile.search_params(),
+                with_payload=self._result_payload(),
+            ).points
+
+        if index is None:
+            return self._with_texts(collection_name, [[(hit.id, hit.score) for hit in results]], results, positions)[0]
+
+        lexical_hits = index.search(query, limit)
+        if query_filter is None:
+            fused, missing = self._fuse(results, lexical_hits, top_k)
+            fetched = self._fetch(collection_name, missing)
+        else:
+            # The BM25 index spans all tenants; check keyword-only hits against the filter first
+            lexical_only = self._lexical_only(results, lexical_hits)
+            fetched = self._fetch(collection_name, lexical_only)
+            lexical_hits = self._allowed_lexical(results, lexical_hits, fetched, tenant, filters)
+            fused, _ = self._fuse(results, lexical_hits, top_k)
+        return self._with_texts(collection_name, [fused], list(results) + fetched, positions)[0]
+
+    def retrieve_batch(
+        self,
+        collection_name: str,
+        queries: List[str],
+        top_k: int = 5,
+        mode: str = "dense",
+        rerank: bool = False,
+        tenant: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        query_vectors: Optional[np.ndarray] = None,
+        positions: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> List[List[Tuple[str, float, str]]]:
+        """
+        Retrieve for many queries at once: one embedding call and one Qdrant batch query.
+
+        Args:
+            collection_name (str): Name of the collection.
+            queries (List[str]): Query texts.
+            top_k (int): Number of results per query.
+            mode (str): "dense" or "hybrid", as in `retrieve`.
+            rerank (bool): Cross-encoder rerank each query's candidates, as in `retrieve`.
+            tenant (Optional[str]): Only search this tenant's documents.
+            filters (Optional[Dict[str, Any]]): Metadata conditions (see `build_filter`).
+            query_vectors (Optional[np.ndarray]): Query embeddings, one row per query, if the caller already has them.
+            positions (Optional[Dict[str, Tuple[str, int]]]): Filled as in `retrieve`, for all queries.
+
+        Returns:
+            List[List[Tuple[str, float, str]]]: (id, score, text) results per query, in input order.
+        """
+        if not queries:
+            return []
+        reranking = rerank and self.reranker is not None
+        k = max(top_k, self.rerank_candidates) if reranking else top_k
+        vectors = self.embeddings.encode_array(queries) if query_vectors is None else query_vectors
+        index = self.lexical_index(collection_name) if mode == "hybrid" else None
+        limit = k * self.hybrid_candidates if index is not None else k
+        query_filter = build_filter(tenant, filters)
+
+        metrics.batch("query_batch", len(queries))
+        with metrics.stage("search_batch"):
+            responses = self.client.query_batch_points(
+                collection_name=collection_name,
+                requests=self._batch_requests(vectors, limit, query_filter)
+            )
+        dense = [response.points for response in responses]
+        hits = [hit for points in dense for hit in points]
+        if index is None:
+            ranked = [[(hit.id, hit.score) for hit in points] for points in dense]
+        else:
+            lexical = [index.search(query, limit) for query in queries]
+            ids = self._ids_to_fetch(dense, lexical, k, query_filter is not None)
+            fetched = self._fetch(collection_name, ids)
+            ranked = self._hybrid_batch_ranked(dense, lexical, fetched, k, query_filter is not None, tenant, filters)
+            hits += fetched
+        # One bulk text read for every query's final results
+        results = self._with_texts(collection_name, ranked, hits, positions)
+
+        if reranking:
+            results = [
+                self.reranker.rerank(query, candidates, top_k, self.rerank_token_budget)
+                for query, candidates in zip(queries, results)
+            ]
+        return results
+
+    def _fetch(self, collection_name: str, ids: List[str]) -> list:
+        """Payloads for keyword-only hybrid hits."""
+        if not ids:
+            return []
+        with metrics.stage("fetch"):
+            return self.client.retrieve(collection_name=collection_name, ids=ids)
+
+    async def _afetch(self, collection_name: str, ids: List[str]) -> list:
+        if not ids:
+            return []
+        return await metrics.measure("fetch", self.async_client.retrieve(collection_name=collection_name, ids=ids))
+
+    def _with_texts(
+        self,
+        collection_name: str,
+        ranked: List[List[Tuple[Any, float]]],
+        hits: list,
+        positions: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> List[List[Tuple[Any, float, str]]]:
+        """
+        Attach texts to ranked (id, score) lists: from the hits' payloads, else
+        from the chunk store in one bulk read for all lists, else from Qdrant
+        (points written before the chunk store was enabled). Fills `positions`
+        from the hits' payloads.
+        """
+        texts = self._payload_texts(hits)
+        store = self.chunk_store(collection_name)
+        missing = self._missing_texts(ranked, texts) if store is not None else []
+        if missing:
+            texts.update(store.get_many(missing))
+            fetched = self._fetch(collection_name, self._missing_texts(ranked, texts))
+            texts.update(self._payload_texts(fetched))
+            hits = list(hits) + fetched
+        if positions is not None:
+            positions.update(self._payload_positions(hits))
+        return self._attach_texts(ranked, texts)
+
+    async def _awith_texts(
+        self,
+        collection_name: str,
+        ranked: List[List[Tuple[Any, float]]],
+        hits: list,
+        positions: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> List[List[Tuple[Any, float, str]]]:
+        texts = self._payload_texts(hits)
+        store = self.chunk_store(collection_name)
+        missing = self._missing_texts(ranked, texts) if store is not None else []
+        if missing:
+            texts.update(await asyncio.to_thread(store.get_many, missing))
+            fetched = await self._afetch(collection_name, self._missing_texts(ranked, texts))
+            texts.update(self._payload_texts(fetched))
+            hits = list(hits) + fetched
+        if positions is not None:
+            positions.update(self._payload_positions(hits))
+        return self._attach_texts(ranked, texts)
+
+    def _result_payload(self):
+        # With external texts only the position fields are needed from Qdrant
+        return list(POSITION_FIELDS) if self.external_texts else True
+
+    @staticmethod
+    def _payload_texts(points: list) -> Dict[str, str]:
+        return {str(point.id): point.payload["text"] for point in points if point.payload and "text" in point.payload}
+
+    @staticmethod
+    def _payload_positions(points: list) -> Dict[str, Tuple[str, int]]:
+        return {
+            str(point.id): (str(point.payload["doc_id"]), point.payload.get("chunk_index", 0))
+            for point in points if point.payload and "doc_id" in point.payload
+        }
+
+    @staticmethod
+    def _missing_texts(ranked: List[List[Tuple[Any, float]]], texts: Dict[str, str]) -> list:
+        # Original ID types are kept for the Qdrant fallback (integer point IDs)
+        missing = {str(doc_id): doc_id for results in ranked for doc_id, _ in results if str(doc_id) not in texts}
+        return list(missing.values())
+
+    @staticmethod
+    def _attach_texts(ranked: List[List[Tuple[Any, float]]], texts: Dict[str, str]) -> List[List[Tuple[Any, float, str]]]:
+        return [[(doc_id, score, texts.get(str(doc_id), "")) for doc_id, score in results] for results in ranked]
+
+    def _batch_requests(self, vectors: np.ndarray, limit: int, query_filter: Optional[models.Filter]) -> List[models.QueryRequest]:
         return [
-            (hit.id, hit.score, hit.payload.get("text", ""))
-            for hit in results
+            models.QueryRequest(
+                query=vector.tolist(),
+                filter=query_filter,
+                limit=limit,
+                params=self.profile.search_params(),
+                with_payload=self._result_payload(),
+            )
+            for vector in np.asarray(vectors, dtype=np.float32)
         ]
 
+    def _ids_to_fetch(self, dense: List[list], lexical: List[list], top_k: int, filtered: bool) -> List[str]:
+        """Point IDs whose payload is needed to finish hybrid fusion for a batch, deduplicated."""
+        ids: List[str] = []
+        for points, hits in zip(dense, lexical):
+            ids.extend(self._lexical_only(points, hits) if filtered else self._fuse(points, hits, top_k)[1])
+        return list(dict.fromkeys(ids))
+
+    def _hybrid_batch_ranked(self, dense, lexical, fetched, top_k, filtered, tenant, filters):
+        ranked = []
+        for points, hits in zip(dense, lexical):
+            if filtered:
+                hits = self._allowed_lexical(points, hits, fetched, tenant, filters)
+            ranked.append(self._fuse(points, hits, top_k)[0])
+        return ranked
+
+    @staticmethod
+    def _lexical_only(dense_hits: list, lexical_hits: List[Tuple[str, float]]) -> List[str]:
+        dense_ids = {str(hit.id) for hit in dense_hits}
+        return [doc_id for doc_id, _ in lexical_hits if doc_id not in dense_ids]
+
+    @staticmethod
+    def _allowed_lexical(dense_hits: list, lexical_hits: List[Tuple[str, float]], fetched: list, tenant, filters):
+        allowed = {str(hit.id) for hit in dense_hits}
+        allowed.update(str(point.id) for point in fetched if payload_matches(point.payload or {}, tenant, filters))
+        return [(doc_id, score) for doc_id, score in lexical_hits if doc_id in allowed]
+
+    def _fuse(self, dense_hits: list, lexical_hits: List[Tuple[str, float]], top_k: int):
+        """
+        Reciprocal-rank-fuse dense and BM25 rankings.
+
+        Returns the top_k (id, score) pairs and the IDs whose text isn't in the dense hits.
+        """
+        fused = reciprocal_rank_fusion([
+            [str(hit.id) for hit in dense_hits],
+            [doc_id for doc_id, _ in lexical_hits],
+        ])[:top_k]
+        dense_ids = {str(hit.id) for hit in dense_hits}
+        return fused, [doc_id for doc_id, _ in fused if doc_id not in dense_ids]
+
+    async def acreate_collection_if_not_exists(self, collection_name: str, dim: int = 384):
+        """
+        Async variant of `create_collection_if_not_exists`.
+        """
+        exists = await self.async_client.collection_exists(collection_name)
+
+        if not exists:
+            await self.async_client.create_collection(
+                collection_name=collection_name,
+                **self.profile.create_kwargs(dim)
+            )
+            for field, schema in self.profile.payload_schemas().items():
+                await self.async_client.create_payload_index(collection_name, field, field_schema=schema)
+            print(f"Collection '{collection_name}' created with profile '{self.profile.name}'.")
+        else:
+            print(f"Collection '{collection_name}' already exists.")
+
+    async def aupsert_documents(self, collection_name: str, docs: List[Dict[str, str]]):
+        """
+        Async variant of `upsert_documents`. Embedding runs in a worker thread.
+        """
+        if not docs:
+            return
+
+        texts = [doc["text"] for doc in docs]
+        vectors = await asyncio.to_thread(self.embeddings.batch_embeddings, texts)
+        stored = await asyncio.to_thread(self._store_texts, collection_name, docs)
+        points = self.build_points(stored, vectors)
+
+        metrics.batch("upsert", len(points))
+        await metrics.measure("upsert", self.async_client.upsert(
+            collection_name=collection_name,
+            points=points
+        ))
+        await self.alexical_index(collection_name)
+        self._index_lexical(collection_name, docs)
+        await asyncio.to_thread(self.flush_lexical, collection_name)
+        self._bump_version(collection_name)
+        print(f"Upserted {len(points)} points into '{collection_name}'.")
+
+    async def aretrieve(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 5,
+        query_vector: Optional[List[float]] = None,
+        mode: str = "dense",
+        rerank: bool = False,
+        tenant: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        positions: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> List[Tuple[str, float, str]]:
+        """
+        Async variant of `retrieve`. The query embedding goes through the micro-batcher
+        unless the caller already has it (`query_vector`). In hybrid mode the BM25
+        lookup runs concurrently with the Qdrant search.
+        """
+        if rerank and self.reranker is not None:
+            candidates = await self.aretrieve(
+                collection_name, query, max(top_k, self.rerank_candidates),
+                query_vector=query_vector, mode=mode, tenant=tenant, filters=filters, positions=positions
+            )
+            return await self.reranker.arerank(query, candidates, top_k, self.rerank_token_budget)
+
+        if query_vector is None:
+            query_vector = await self.embeddings.aget_embedding(query)
+        index = await self.alexical_index(collection_name) if mode == "hybrid" else None
+        limit = top_k * self.hybrid_candidates if index is not None else top_k
+        query_filter = build_filter(tenant, filters)
+
+        dense = metrics.measure("search", self.async_client.query_points(
+            collection_name=collection_name,
+            query=query_vector,
+            query_filter=query_filter,
+            limit=limit,
+            search_params=self.profile.search_params(),
+            with_payload=self._result_payload(),
+        ))
+        if index is None:
+            response = await dense
+            ranked = [[(hit.id, hit.score) for hit in response.points]]
+            return (await self._awith_texts(collection_name, ranked, response.points, positions))[0]
+
+        response, lexical_hits = await asyncio.gather(dense, asyncio.to_thread(index.search, query, limit))
+        if query_filter is None:
+            fused, missing = self._fuse(response.points, lexical_hits, top_k)
+            fetched = await self._afetch(collection_name, missing)
+        else:
+            lexical_only = self._lexical_only(response.points, lexical_hits)
+            fetched = await self._afetch(collection_name, lexical_only)
+            lexical_hits = self._allowed_lexical(response.points, lexical_hits, fetched, tenant, filters)
+            fused, _ = self._fuse(response.points, lexical_hits, top_k)
+        return (await self._awith_texts(collection_name, [fused], list(response.points) + fetched, positions))[0]
+
+    async def aretrieve_batch(
+        self,
+        collection_name: str,
+        queries: List[str],
+        top_k: int = 5,
+        mode: str = "dense",
+        rerank: bool = False,
+        tenant: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        query_vectors: Optional[np.ndarray] = None,
+        positions: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> List[List[Tuple[str, float, str]]]:
+        """
+        Async variant of `retrieve_batch`. Embedding and BM25 run in worker threads;
+        per-query reranking runs concurrently.
+        """
+        if not queries:
+            return []
+        reranking = rerank and self.reranker is not None
+        k = max(top_k, self.rerank_candidates) if reranking else top_k
+        vectors = query_vectors
+        if vectors is None:
+            vectors = await asyncio.to_thread(self.embeddings.encode_array, queries)
+        index = await self.alexical_index(collection_name) if mode == "hybrid" else None
+        limit = k * self.hybrid_candidates if index is not None else k
+        query_filter = build_filter(tenant, filters)
+
+        metrics.batch("query_batch", len(queries))
+        dense_batch = metrics.measure("search_batch", self.async_client.query_batch_points(
+            collection_name=collection_name,
+            requests=self._batch_requests(vectors, limit, query_filter)
+        ))
+        if index is None:
+            dense = [response.points for response in await dense_batch]
+            hits = [hit for points in dense for hit in points]
+            ranked = [[(hit.id, hit.score) for hit in points] for points in dense]
+        else:
+            responses, lexical = await asyncio.gather(
+                dense_batch,
+                asyncio.to_thread(lambda: [index.search(query, limit) for query in queries]),
+            )
+            dense = [response.points for response in responses]
+            ids = self._ids_to_fetch(dense, lexical, k, query_filter is not None)
+            fetched = await self._afetch(collection_name, ids)
+            ranked = self._hybrid_batch_ranked(dense, lexical, fetched, k, query_filter is not None, tenant, filters)
+            hits = [hit for points in dense for hit in points] + fetched
+        results = await self._awith_texts(collection_name, ranked, hits, positions)
+
+        if reranking:
+            results = list(await asyncio.gather(*(
+                self.reranker.arerank(query, candidates, top_k, self.rerank_token_budget)
+                for query, candidates in zip(queries, results)
+            )))
+        return results
+
 # Sample upsert call for verification (commented out)
 # if __name__ == "__main__":
 #     rag = RAGPipeline()
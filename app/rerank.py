@@ -0,0 +1,127 @@
+import asyncio
+import concurrent.futures
+from typing import Any, List, Optional, Tuple
+
+from generation import estimate_tokens
+from metrics import metrics
+
+class CrossEncoderReranker:
+    """
+    Second-stage reranker: scores (query, chunk) pairs with a small CPU cross-encoder.
+
+    The vector search over-fetches candidates, the cross-encoder rescores them
+    in batches, and only the best ones that fit a prompt token budget are kept.
+    Scoring runs on a dedicated thread pool with a deadline; if it isn't done
+    in time the original vector order is used instead, so reranking can never
+    add more than `deadline_ms` to a request.
+    """
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batch_size: int = 32,
+        deadline_ms: float = 300,
+        workers: int = 2,
+    ):
+        """
+        Args:
+            model_name (str): sentence-transformers CrossEncoder model.
+            batch_size (int): Pairs per forward pass.
+            deadline_ms (float): Budget for scoring before falling back to vector order.
+            workers (int): Threads available for scoring.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.deadline = deadline_ms / 1000.0
+        self.fallbacks = 0
+        self._model = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Relevance score of each text for the query (higher is better).
+        """
+        if not texts:
+            return []
+        scores = self.model.predict([(query, text) for text in texts], batch_size=self.batch_size)
+        return [float(s) for s in scores]
+
+    @metrics.timed("rerank")
+    def rerank(
+        self,
+        query: str,
+        results: List[Tuple[Any, float, str]],
+        top_k: int,
+        token_budget: Optional[int] = None,
+    ) -> List[Tuple[Any, float, str]]:
+        """
+        Reorder (id, score, text) results by cross-encoder score and keep the best within budget.
+
+        Args:
+            query (str): Query text.
+            results (List[Tuple[Any, float, str]]): Candidates in vector order.
+            top_k (int): Maximum results to keep.
+            token_budget (Optional[int]): Maximum estimated prompt tokens across kept chunks.
+
+        Returns:
+            List[Tuple[Any, float, str]]: Kept results, best first.
+        """
+        future = self._executor.submit(self.score, query, [text for _, _, text in results])
+        try:
+            scores = future.result(timeout=self.deadline)
+        except concurrent.futures.TimeoutError:
+            # Drop the scoring job if it hasn't started, so late requests don't queue behind it
+            future.cancel()
+            scores = None
+        return self._select(results, scores, top_k, token_budget)
+
+    @metrics.timed("rerank")
+    async def arerank(
+        self,
+        query: str,
+        results: List[Tuple[Any, float, str]],
+        top_k: int,
+        token_budget: Optional[int] = None,
+    ) -> List[Tuple[Any, float, str]]:
+        """
+        Async variant of `rerank`.
+        """
+        future = self._executor.submit(self.score, query, [text for _, _, text in results])
+        try:
+            scores = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            scores = None
+        return self._select(results, scores, top_k, token_budget)
+
+    def _select(self, results, scores, top_k, token_budget):
+        metrics.batch("rerank", len(results))
+        if scores is None:
+            self.fallbacks += 1
+            metrics.error("rerank")
+            print(f"Reranking exceeded {self.deadline * 1000:.0f} ms; using vector order.")
+            ranked = list(results)
+        else:
+            ranked = sorted(
+                ((doc_id, score, text) for (doc_id, _, text), score in zip(results, scores)),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+
+        kept = []
+        used = 0
+        for doc_id, score, text in ranked:
+            if len(kept) >= top_k:
+                break
+            tokens = estimate_tokens(text)
+            # Always keep the best chunk, even if it alone exceeds the budget
+            if token_budget is not None and kept and used + tokens > token_budget:
+                continue
+            kept.append((doc_id, score, text))
+            used += tokens
+        return kept
@@ -0,0 +1,86 @@
+"""
+Pre-forking server: load the embedding model once, then fork the workers.
+
+Each `uvicorn --workers` process loads its own copy of the model. Here the
+parent loads it before forking, so all workers share the weights
+copy-on-write, and the parent's heap is frozen (`gc.freeze`) so garbage
+collection in the workers doesn't touch, and thereby copy, those pages.
+Workers import the app themselves after the fork, so Qdrant/HTTP clients,
+SQLite connections and inference thread pools are never shared.
+
+    python serve.py --workers 4
+    python serve.py --workers 4 --no-preload   # every worker loads its own model
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+import uvicorn
+
+def run_worker(sock: socket.socket, args):
+    import main
+    config = uvicorn.Config(main.app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 1)))
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="load the model in each worker instead of once before forking")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    args = parser.parse_args()
+    if args.workers > 1 and os.getenv("VECTOR_BACKEND", "qdrant") == "embedded":
+        # Each worker would hold its own copy of the index and overwrite the others' segments
+        parser.error("VECTOR_BACKEND=embedded supports a single worker; use --workers 1 or a Qdrant server")
+
+    # Workers split the service-wide LLM limits (generation.py) by this count
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.set_inheritable(True)
+
+    if args.preload:
+        from embeddings import preload_embedding_backend
+        started = time.perf_counter()
+        preload_embedding_backend()
+        print(f"Preloaded embedding model in {time.perf_counter() - started:.2f}s.")
+    # Objects that exist now are never collected or moved, so their pages stay shared
+    gc.freeze()
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, args)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f"Started {len(children)} worker(s) on {args.host}:{args.port}: {children}")
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    exit_code = 0
+    for pid in children:
+        _, status = os.waitpid(pid, 0)
+        exit_code = exit_code or os.waitstatus_to_exitcode(status)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from chunk_store import ChunkStore, zstandard
+from rag import RAGPipeline
+
+def texts(count, prefix="chunk"):
+    return [(f"id{i}", f"{prefix} {i}: " + "the quick brown fox jumps over the lazy dog " * 5) for i in range(count)]
+
+@pytest.mark.parametrize("codec", ["zlib", pytest.param("zstd", marks=pytest.mark.skipif(zstandard is None, reason="zstandard not installed"))])
+def test_round_trip_overwrite_delete_and_reopen(tmp_path, codec):
+    store = ChunkStore(str(tmp_path), codec=codec, block_bytes=1024)
+    items = texts(200)
+    store.put_many(items)
+
+    assert store.get_many(["id3", "id199", "missing"]) == {"id3": items[3][1], "id199": items[199][1]}
+    assert store.stats()["file_bytes"] < store.stats()["live_bytes"] / 4
+
+    store.put_many([("id3", "replaced ünïcode")])
+    store.delete_many(["id4"])
+    store.close()
+
+    store = ChunkStore(str(tmp_path), codec=codec)
+    assert store.get_many(["id3", "id4", "id5"]) == {"id3": "replaced ünïcode", "id5": items[5][1]}
+    assert store.stats()["chunks"] == 199
+
+def test_compaction_drops_dead_bytes(tmp_path):
+    store = ChunkStore(str(tmp_path), codec="zlib")
+    items = texts(300)
+    store.put_many(items)
+    size = store.stats()["file_bytes"]
+    for _ in range(3):
+        store.put_many(texts(300, prefix="rewritten"))
+    store.delete_many([chunk_id for chunk_id, _ in items[:150]])
+    store.compact()
+
+    stats = store.stats()
+    assert stats["chunks"] == 150 and stats["written_bytes"] == stats["live_bytes"]
+    assert stats["file_bytes"] < size
+    assert store.get_many(["id299"])["id299"].startswith("rewritten 299")
+
+def test_stores_sharing_a_directory(tmp_path):
+    # Separate instances hold separate file locks, like separate worker processes
+    first = ChunkStore(str(tmp_path), codec="zlib")
+    second = ChunkStore(str(tmp_path), codec="zlib")
+    first.put_many([("x", "alpha text")])
+    second.put_many([("y", "beta text")])
+    first.put_many([("z", "gamma text")])
+    assert ChunkStore(str(tmp_path)).get_many(["x", "y", "z"]) == {"x": "alpha text", "y": "beta text", "z": "gamma text"}
+
+    assert second.get_many(["x"]) == {"x": "alpha text"}
+    first.put_many([("x", "alpha rewritten")])
+    first.compact()
+    # The second store's mapping and cached blocks are from before the compaction
+    assert second.get_many(["x", "y", "z"]) == {"x": "alpha rewritten", "y": "beta text", "z": "gamma text"}
+    second.put_many([("w", "delta text")])
+    assert first.get_many(["w", "x"]) == {"w": "delta text", "x": "alpha rewritten"}
+    assert first.stats()["live_bytes"] == sum(len(text) for text in ("alpha rewritten", "beta text", "gamma text", "delta text"))
+
+def test_pipeline_keeps_text_out_of_payload(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHUNK_STORE_DIR", str(tmp_path))
+    client = QdrantClient(":memory:")
+    pipeline = RAGPipeline(client=client, embeddings=MagicMock())
+    pipeline.create_collection_if_not_exists("docs", dim=4)
+    # Written before the store was enabled: text still in the payload
+    client.upsert("docs", points=[models.PointStruct(id=1, vector=[0, 0, 1, 0], payload={"text": "legacy chunk"})])
+    docs = [{"id": 2, "text": "stored chunk", "tenant": "acme"}, {"id": 3, "text": "other chunk", "tenant": "acme"}]
+    pipeline.write_vectors("docs", docs, np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=np.float32))
+
+    assert client.retrieve("docs", ids=[2])[0].payload == {"tenant": "acme"}
+    pipeline.embeddings.get_embedding.return_value = [1, 0, 0.5, 0]
+    assert [text for _, _, text in pipeline.retrieve("docs", "query", top_k=2)] == ["stored chunk", "legacy chunk"]
+
+    pipeline.delete_points("docs", [2])
+    assert pipeline.chunk_store("docs").get_many(["2", "3"]) == {"3": "other chunk"}
@@ -0,0 +1,57 @@
+import os
+import sys
+from unittest.mock import MagicMock
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from collection_profiles import PROFILES, profile_from_env
+from rag import RAGPipeline
+
+def test_balanced_profile_creates_quantized_on_disk_collection():
+    client = MagicMock()
+    client.get_collections.return_value.collections = []
+    pipeline = RAGPipeline(client=client, embeddings=MagicMock(), profile=PROFILES["balanced"])
+
+    pipeline.create_collection_if_not_exists("docs", dim=8)
+
+    kwargs = client.create_collection.call_args.kwargs
+    assert kwargs["vectors_config"].on_disk is True
+    assert isinstance(kwargs["quantization_config"], models.ScalarQuantization)
+    assert kwargs["hnsw_config"].m == 16
+    indexed = {call.args[1]: call.kwargs["field_schema"] for call in client.create_payload_index.call_args_list}
+    assert indexed["doc_id"] == models.PayloadSchemaType.KEYWORD
+    assert indexed["tenant"].is_tenant is True
+
+def test_search_params_follow_profile():
+    assert PROFILES["default"].search_params() is None
+    params = PROFILES["low_memory"].search_params()
+    assert params.hnsw_ef == 128
+    assert params.quantization.rescore is True and params.quantization.oversampling == 3.0
+
+def test_profile_env_overrides(monkeypatch):
+    monkeypatch.setenv("QDRANT_PROFILE", "high_recall")
+    monkeypatch.setenv("QDRANT_HNSW_EF", "64")
+    monkeypatch.setenv("QDRANT_QUANTIZATION", "scalar")
+    monkeypatch.setenv("QDRANT_PAYLOAD_INDEXES", "doc_id:keyword,chunk_index:integer")
+
+    profile = profile_from_env()
+
+    assert profile.hnsw_m == 32 and profile.hnsw_ef == 64
+    assert profile.quantization == "scalar"
+    assert set(profile.payload_schemas()) == {"doc_id", "chunk_index"}
+
+    monkeypatch.setenv("QDRANT_PROFILE", "missing")
+    with pytest.raises(ValueError):
+        profile_from_env()
+
+def test_profiles_work_with_local_client():
+    import numpy as np
+    for profile in PROFILES.values():
+        pipeline = RAGPipeline(client=QdrantClient(":memory:"), embeddings=MagicMock(), profile=profile)
+        pipeline.embeddings.get_embedding.return_value = [1.0, 0.0, 0.0, 0.0]
+        pipeline.create_collection_if_not_exists("docs", dim=4)
+        pipeline.write_vectors("docs", [{"id": 1, "text": "a", "doc_id": "d"}], np.eye(4, dtype=np.float32)[:1])
+
+        assert pipeline.retrieve("docs", "a", top_k=1)[0][2] == "a"
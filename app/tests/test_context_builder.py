@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from context_builder import ContextBuilder
+from ingestion import chunk_text
+
+def test_overlapping_chunks_are_merged():
+    text = " ".join(f"Sentence number {i} about vector search." for i in range(40))
+    chunks = chunk_text(text)
+    # Retrieved out of order, as a vector search would return them
+    results = [("b", 0.9, chunks[1]), ("a", 0.8, chunks[0])]
+
+    prompt, stats = ContextBuilder().build("What about vector search?", results)
+
+    assert stats["merged"] == 1
+    assert stats["passages"] == 1
+    assert text[:len(chunks[0]) + len(chunks[1]) - 50] in prompt
+    assert stats["prompt_tokens_saved"] > 0
+
+def test_near_duplicates_dropped_and_budget_enforced():
+    long_text = " ".join(f"word{i}" for i in range(2000))
+    results = [
+        ("1", 0.9, "Qdrant is a vector database written in Rust."),
+        ("2", 0.8, "Qdrant is a vector database written in Rust!"),
+        ("3", 0.7, long_text),
+    ]
+
+    prompt, stats = ContextBuilder(token_budget=200).build("What is Qdrant?", results)
+
+    assert stats["duplicates"] == 1
+    assert prompt.count("Qdrant is a vector database") == 1
+    assert stats["prompt_tokens"] < 300
+
+def test_same_sources_give_same_prompt_regardless_of_rank():
+    results = [("x", 0.9, "First passage text."), ("y", 0.8, "Second passage text.")]
+    builder = ContextBuilder()
+
+    assert builder.build("q", results)[0] == builder.build("q", list(reversed(results)))[0]
+
+def test_passages_ordered_by_document_position_and_merged_within_a_document():
+    shared = "This sentence is shared by the tail of one chunk and the head of the next."
+    results = [
+        ("id-a", 0.9, "Guide part two. " + shared),
+        ("id-b", 0.8, shared + " Other document continues."),
+        ("id-c", 0.7, "Guide part one."),
+    ]
+    positions = {"id-a": ("guide.md", 2), "id-b": ("other.md", 0), "id-c": ("guide.md", 1)}
+
+    prompt, stats = ContextBuilder().build("q", results, positions)
+
+    # The overlap spans two documents, so nothing is merged
+    assert stats["merged"] == 0
+    assert prompt.index("Guide part one.") < prompt.index("Guide part two.") < prompt.index("Other document")
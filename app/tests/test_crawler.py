@@ -0,0 +1,77 @@
+import os
+import sys
+import asyncio
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from crawler import FetchCache, HostRateLimiter, SiteCrawler
+
+SITE = {
+    "/robots.txt": "User-agent: *\nDisallow: /private\nSitemap: https://docs.test/sitemap.xml\n",
+    "/sitemap.xml": (
+        '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<url><loc>https://docs.test/a</loc></url><url><loc>https://docs.test/b</loc></url></urlset>"
+    ),
+    "/": '<html><body><p>Home page</p><a href="/a">A</a><a href="https://other.test/x">Other</a></body></html>',
+    "/a": '<html><body><p>Page A</p><a href="/c#top">C</a><a href="/private/x">Private</a></body></html>',
+    "/b": "<html><body><p>Page B</p></body></html>",
+    "/c": "<html><body><p>Page C</p></body></html>",
+}
+
+def site_transport(requests):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        path = request.url.path
+        if request.url.host != "docs.test" or path not in SITE:
+            return httpx.Response(404)
+        etag = f'"{path}-v1"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        content_type = "text/html" if not path.endswith((".txt", ".xml")) else "text/plain"
+        return httpx.Response(200, text=SITE[path], headers={"ETag": etag, "Content-Type": content_type})
+    return httpx.MockTransport(handler)
+
+async def crawl(cache, requests):
+    async with httpx.AsyncClient(transport=site_transport(requests)) as client:
+        crawler = SiteCrawler(client, cache, scope="docs/", concurrency=4, host_rps=0)
+        pages = [page async for page in crawler.crawl("https://docs.test/")]
+    crawler.save_cache()
+    return crawler, pages
+
+def test_crawl_follows_sitemap_and_links_within_site():
+    requests = []
+    crawler, pages = asyncio.run(crawl(FetchCache(":memory:"), requests))
+
+    assert sorted(page["url"] for page in pages) == [
+        "https://docs.test/", "https://docs.test/a", "https://docs.test/b", "https://docs.test/c"
+    ]
+    assert {page["url"]: page["text"] for page in pages}["https://docs.test/b"] == "Page B"
+    fetched = {str(request.url) for request in requests}
+    # Off-site links and robots.txt exclusions are never requested
+    assert "https://other.test/x" not in fetched and "https://docs.test/private/x" not in fetched
+    assert crawler.stats["changed"] == 4 and crawler.stats["sitemap_urls"] == 2
+
+def test_recrawl_sends_conditional_requests_and_skips_unchanged_pages():
+    cache = FetchCache(":memory:")
+    asyncio.run(crawl(cache, []))
+
+    requests = []
+    crawler, pages = asyncio.run(crawl(cache, requests))
+
+    assert pages == []
+    assert crawler.stats["not_modified"] == 4
+    assert crawler.stats["bytes_saved"] == sum(len(SITE[path]) for path in ("/", "/a", "/b", "/c"))
+    # Links of 304 pages come from the cache, so /c is still reached
+    assert any(request.url.path == "/c" and "If-None-Match" in request.headers for request in requests)
+
+def test_host_rate_limiter_spaces_requests():
+    limiter = HostRateLimiter(requests_per_second=50)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(limiter.wait("docs.test") for _ in range(5)), limiter.wait("other.test"))
+        return loop.time() - started
+
+    # Four 20 ms gaps for one host; the other host isn't delayed by it
+    assert 0.07 <= asyncio.run(run()) < 0.5
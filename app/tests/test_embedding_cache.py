@@ -0,0 +1,46 @@
+import os
+import sys
+from unittest.mock import patch
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from embedding_cache import EmbeddingCache
+
+def test_memory_tier_hits_and_misses():
+    cache = EmbeddingCache("test-model")
+    assert cache.get_many(["hello"]) == [None]
+
+    cache.put_many(["hello"], [[1.0, 2.0]])
+    # Whitespace-only differences share an entry
+    vector = cache.get_many(["  hello \n"])[0]
+
+    assert vector.tolist() == [1.0, 2.0]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_disk_tier_survives_restart_and_evicts(tmp_path):
+    cache = EmbeddingCache("test-model", cache_dir=str(tmp_path), memory_entries=1, disk_entries=2)
+    cache.put_many(["a", "b", "c"], np.arange(6, dtype=np.float32).reshape(3, 2))
+    cache.close()
+
+    reopened = EmbeddingCache("test-model", cache_dir=str(tmp_path), memory_entries=1, disk_entries=2)
+    a, b, c = reopened.get_many(["a", "b", "c"])
+
+    # "a" was the oldest entry and got evicted to stay within 2 rows
+    assert a is None
+    assert b.tolist() == [2.0, 3.0]
+    assert c.tolist() == [4.0, 5.0]
+    assert reopened.stats()["disk_entries"] == 2
+
+def test_batch_embeddings_only_encodes_misses():
+    with patch("embeddings.load_embedding_backend") as mock_model:
+        model = mock_model.return_value
+        model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 3), dtype=np.float32)
+        from embeddings import EmbeddingsUtils
+        utils = EmbeddingsUtils()
+
+        utils.batch_embeddings(["x", "y"])
+        vectors = utils.batch_embeddings(["x", "y", "z"])
+
+    assert len(vectors) == 3
+    assert model.encode.call_args_list[-1].args[0] == ["z"]
@@ -26,3 +26,94 @@ def test_batch_embeddings(embeddings_utils):
     assert len(vectors) == 2
     assert len(vectors[0]) == 384
     assert len(vectors[1]) == 384
+
+class _FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        import numpy as np
+        self.calls.append(list(texts))
+        return np.array([[float(len(t))] * 4 for t in texts])
+
+def test_batcher_coalesces_concurrent_requests():
+    from concurrent.futures import ThreadPoolExecutor
+    from embeddings import EmbeddingBatcher
+
+    model = _FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=8, max_wait_ms=50)
+    texts = ["a" * i for i in range(1, 9)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        vectors = list(pool.map(batcher.embed, texts))
+
+    # Each caller gets its own vector back, in order
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert len(model.calls) < len(texts)
+    stats = batcher.stats()
+    assert stats["items"] == 8
+    assert stats["avg_batch_size"] > 1
+
+def _tiny_onnx_backend(tmp_path, **kwargs):
+    """An embedding-lookup ONNX graph with a word-level tokenizer; no downloads needed."""
+    import numpy as np
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+    from embeddings import OnnxEmbeddingBackend
+
+    vocab = {"[PAD]": 0, "[UNK]": 1, "alpha": 2, "beta": 3, "gamma": 4}
+    table = np.random.default_rng(0).normal(size=(len(vocab), 8)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "tiny",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "seq"]),
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", 8])],
+        initializer=[numpy_helper.from_array(table, "table")],
+    )
+    path = str(tmp_path / "tiny.onnx")
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8  # loadable by older onnxruntime releases
+    onnx.save(model, path)
+
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return OnnxEmbeddingBackend(model_path=path, tokenizer=tokenizer, **kwargs), table
+
+def test_onnx_backend_mean_pools_and_ignores_padding(tmp_path):
+    import numpy as np
+    backend, table = _tiny_onnx_backend(tmp_path, batch_size=2, normalize=False)
+    texts = ["alpha", "alpha beta gamma", "beta beta", "gamma"]
+
+    batched = backend.encode(texts)
+
+    assert batched.dtype == np.float32 and batched.shape == (4, 8)
+    # Length sorting and padding don't change any row or the output order
+    for text, row in zip(texts, batched):
+        np.testing.assert_allclose(row, backend.encode(text), rtol=1e-5)
+    np.testing.assert_allclose(batched[1], table[[2, 3, 4]].mean(axis=0), rtol=1e-5)
+
+def test_onnx_backend_normalizes_by_default(tmp_path):
+    import numpy as np
+    backend, _ = _tiny_onnx_backend(tmp_path)
+
+    vectors = backend.encode(["alpha beta", "gamma"])
+
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+
+def test_load_embedding_backend_reuses_loaded_model(monkeypatch):
+    import embeddings
+    monkeypatch.setattr(embeddings, "_backends", {})
+    built = []
+    monkeypatch.setattr(embeddings, "_build_backend", lambda *args: built.append(args) or object())
+
+    first = embeddings.load_embedding_backend("model-a")
+    assert embeddings.load_embedding_backend("model-a") is first
+    assert embeddings.load_embedding_backend("model-a", threads=2) is not first
+    assert len(built) == 2
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from generation import assemble_prompt, stream_llm
+
+def test_assemble_prompt_includes_chunks():
+    prompt = assemble_prompt("What is Qdrant?", ["Qdrant is a vector database."])
+    assert "Qdrant is a vector database." in prompt
+    assert "Question: What is Qdrant?" in prompt
+
+def test_stream_llm_ollama_yields_tokens():
+    lines = [
+        json.dumps({"message": {"content": "Hello"}, "done": False}).encode(),
+        b"",
+        json.dumps({"message": {"content": " world"}, "done": False}).encode(),
+        json.dumps({"message": {"content": ""}, "done": True}).encode(),
+    ]
+    mock_response = MagicMock()
+    mock_response.iter_lines.return_value = lines
+    mock_response.__enter__.return_value = mock_response
+
+    with patch("requests.post", return_value=mock_response) as mock_post:
+        tokens = list(stream_llm("prompt"))
+
+    assert tokens == ["Hello", " world"]
+    assert mock_post.call_args.kwargs["json"]["stream"] is True
+
+def test_acall_llm_uses_pooled_client():
+    import asyncio
+    import httpx
+    from generation import acall_llm
+    from http_clients import http_clients
+
+    def handler(request):
+        assert request.url.path == "/api/chat"
+        return httpx.Response(200, json={"message": {"content": "Pooled answer"}})
+
+    async def run():
+        http_clients._ollama = httpx.AsyncClient(base_url="http://ollama", transport=httpx.MockTransport(handler))
+        try:
+            return await acall_llm("prompt")
+        finally:
+            await http_clients.aclose()
+
+    assert asyncio.run(run()) == "Pooled answer"
+
+def test_scheduler_bounds_concurrency_and_runs_higher_priority_first():
+    import asyncio
+    from generation import GenerationScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+    async def run():
+        scheduler = GenerationScheduler("test", concurrency=1)
+        release = asyncio.Event()
+        order, running, peak = [], 0, 0
+
+        async def generate(name):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            order.append(name)
+            running -= 1
+            return name
+
+        first = asyncio.create_task(scheduler.run(lambda: generate("first")))
+        await asyncio.sleep(0)
+        batch = asyncio.create_task(scheduler.run(lambda: generate("batch"), priority=PRIORITY_BATCH))
+        interactive = asyncio.create_task(scheduler.run(lambda: generate("interactive"), priority=PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["queued"] == 2
+        release.set()
+        await asyncio.gather(first, batch, interactive)
+        return order, peak
+
+    order, peak = asyncio.run(run())
+    assert order == ["first", "interactive", "batch"]
+    assert peak == 1
+
+def test_scheduler_coalesces_identical_in_flight_prompts():
+    import asyncio
+    from generation import GenerationScheduler
+
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        scheduler = GenerationScheduler("test", concurrency=4)
+        results = await asyncio.gather(*(scheduler.run(generate, key=("m", "same prompt")) for _ in range(5)))
+        return results, scheduler.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == ["answer"] * 5
+    assert len(calls) == 1 and stats["coalesced"] == 4
+
+def test_scheduler_sheds_when_queue_full_and_enforces_deadlines():
+    import asyncio
+    import pytest
+    from generation import GenerationRejected, GenerationScheduler
+
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        scheduler = GenerationScheduler("test", concurrency=1, max_queue=1)
+        running = asyncio.create_task(scheduler.run(slow, timeout=0.05))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(scheduler.run(slow, timeout=0.02))
+        await asyncio.sleep(0)
+
+        with pytest.raises(GenerationRejected) as full:
+            await scheduler.run(slow)
+        with pytest.raises(GenerationRejected) as queued_deadline:
+            await queued
+        with pytest.raises(GenerationRejected) as running_deadline:
+            await running
+        await asyncio.sleep(0)
+        return full.value, queued_deadline.value, running_deadline.value, scheduler.stats()
+
+    full, queued_deadline, running_deadline, stats = asyncio.run(run())
+    assert full.status_code == 429 and full.retry_after >= 1
+    assert queued_deadline.status_code == 503
+    assert running_deadline.status_code == 504
+    # The upstream call is cancelled once its only caller gives up, freeing the slot
+    assert cancelled == [1]
+    assert stats["active"] == 0 and stats["queued"] == 0 and stats["rejected"] == 3
+
+def test_scheduler_stream_deadline_closes_upstream():
+    import asyncio
+    import pytest
+    from generation import GenerationRejected, GenerationScheduler
+
+    closed = []
+
+    async def tokens():
+        try:
+            yield "Hello"
+            await asyncio.sleep(10)
+            yield " world"
+        finally:
+            closed.append(1)
+
+    async def run():
+        scheduler = GenerationScheduler("test", concurrency=1)
+        received = []
+        with pytest.raises(GenerationRejected) as error:
+            async for token in scheduler.stream(tokens, timeout=0.05):
+                received.append(token)
+        return received, error.value, scheduler.stats()
+
+    received, error, stats = asyncio.run(run())
+    assert received == ["Hello"] and error.status_code == 504
+    assert closed == [1] and stats["active"] == 0
+
+def test_worker_share_splits_service_limits():
+    from generation import worker_share
+
+    assert worker_share(16, 4) == 4
+    assert worker_share(4, 8) == 1
+    assert worker_share(64, 1) == worker_share(64, 0) == 64
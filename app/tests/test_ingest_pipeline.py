@@ -0,0 +1,123 @@
+import os
+import sys
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ingest_pipeline import IngestionPipeline
+
+@pytest.fixture
+def mock_rag():
+    rag = MagicMock()
+    rag.embeddings.encode_array.side_effect = lambda texts: np.full((len(texts), 4), 0.1, dtype=np.float32)
+    return rag
+
+def test_run_streams_fixed_size_batches(mock_rag):
+    pipeline = IngestionPipeline(mock_rag, batch_size=3, queue_size=1, upsert_workers=2)
+    chunks = [{"id": str(i), "text": f"chunk {i}"} for i in range(10)]
+
+    stats = pipeline.run_chunks("test_collection", chunks)
+
+    written = [len(call.args[1]) for call in mock_rag.write_vectors.call_args_list]
+    assert sorted(written) == [1, 3, 3, 3]
+    # Vectors reach the writer as a float32 matrix, not lists
+    vectors = mock_rag.write_vectors.call_args_list[0].args[2]
+    assert vectors.dtype == np.float32 and vectors.shape[1] == 4
+    assert stats["chunks"] == 10
+    assert stats["batches"] == 4
+    assert stats["chunks_per_sec"] > 0
+
+def test_run_chunks_documents(mock_rag, monkeypatch):
+    import ingestion
+    monkeypatch.setattr(ingestion, "CHUNKER", "fixed")
+    pipeline = IngestionPipeline(mock_rag, batch_size=100)
+    stats = pipeline.run("test_collection", [{"text": "a" * 1000}, {"text": "b" * 10}])
+
+    # 1000 chars -> 3 chunks at the default 500/50 split, plus one short doc
+    assert stats["chunks"] == 4
+
+def test_stage_error_is_raised(mock_rag):
+    mock_rag.write_vectors.side_effect = RuntimeError("qdrant down")
+    pipeline = IngestionPipeline(mock_rag, batch_size=1, queue_size=1, upsert_workers=1)
+    chunks = ({"id": str(i), "text": "x"} for i in range(50))
+
+    with pytest.raises(RuntimeError, match="qdrant down"):
+        pipeline.run_chunks("test_collection", chunks)
+
+def test_incremental_run_only_writes_changed_chunks(mock_rag):
+    from manifest import ChunkManifest
+
+    pipeline = IngestionPipeline(mock_rag, batch_size=100, manifest=ChunkManifest(":memory:"))
+    original = "a" * 450 + "b" * 450 + "c" * 450
+    first = pipeline.run("test_collection", [{"id": "doc", "text": original}])
+    mock_rag.write_vectors.reset_mock()
+
+    # Changing the tail only changes the last chunk
+    second = pipeline.run("test_collection", [{"id": "doc", "text": original[:-10] + "d" * 10}])
+
+    written = [point for call in mock_rag.write_vectors.call_args_list for point in call.args[1]]
+    assert second["chunks"] == len(written) == 1
+    assert second["unchanged_chunks"] == first["chunks"] - 1
+    assert second["deleted_chunks"] == 1
+    assert len(mock_rag.delete_points.call_args.args[1]) == 1
+
+def test_tenants_get_separate_chunks_and_metadata_changes_are_rewritten(mock_rag):
+    from manifest import ChunkManifest
+
+    pipeline = IngestionPipeline(mock_rag, batch_size=100, manifest=ChunkManifest(":memory:"))
+    doc = {"id": "faq", "text": "Same text for everyone.", "metadata": {"v": 1}}
+    pipeline.run("c", [dict(doc, tenant="acme"), dict(doc, tenant="globex")])
+    first = [point for call in mock_rag.write_vectors.call_args_list for point in call.args[1]]
+    mock_rag.write_vectors.reset_mock()
+
+    stats = pipeline.run("c", [dict(doc, tenant="acme", metadata={"v": 2})])
+    rewritten = [point for call in mock_rag.write_vectors.call_args_list for point in call.args[1]]
+
+    assert len({point["id"] for point in first}) == 2
+    assert {point["tenant"] for point in first} == {"acme", "globex"}
+    assert stats["chunks"] == 1 and stats["deleted_chunks"] == 0
+    assert rewritten[0]["metadata"] == {"v": 2}
+
+def test_rechunked_file_replaces_its_old_chunks(mock_rag):
+    from manifest import ChunkManifest
+    from ingestion import chunk_ids
+
+    def file_chunks(path, chunks):
+        return [
+            {"id": chunk_id, "text": text, "doc_id": path, "chunk_index": index}
+            for index, (chunk_id, text) in enumerate(zip(chunk_ids(path, chunks), chunks))
+        ]
+
+    pipeline = IngestionPipeline(mock_rag, batch_size=100, manifest=ChunkManifest(":memory:"))
+    old = file_chunks("a.md", ["intro", "old body"])
+    pipeline.run_chunked("c", old + file_chunks("b.md", ["other file"]))
+    mock_rag.write_vectors.reset_mock()
+
+    # a.md was edited; b.md is unchanged
+    stats = pipeline.run_chunked("c", file_chunks("a.md", ["intro", "new body"]) + file_chunks("b.md", ["other file"]))
+
+    written = [point["text"] for call in mock_rag.write_vectors.call_args_list for point in call.args[1]]
+    assert written == ["new body"]
+    assert stats["unchanged_chunks"] == 2 and stats["deleted_chunks"] == 1
+    assert mock_rag.delete_points.call_args.args[1] == [old[1]["id"]]
+
+def test_document_repeated_in_one_run_keeps_only_its_last_version(mock_rag, monkeypatch):
+    import ingestion
+    from manifest import ChunkManifest
+    monkeypatch.setattr(ingestion, "CHUNKER", "fixed")
+    manifest = ChunkManifest(":memory:")
+    pipeline = IngestionPipeline(mock_rag, batch_size=100, manifest=manifest)
+    pipeline.run("c", [{"id": "page", "text": "original"}])
+    original = [point["id"] for point in mock_rag.write_vectors.call_args.args[1]]
+    mock_rag.write_vectors.reset_mock()
+
+    # The same page posted twice in one bulk request
+    stats = pipeline.run("c", [{"id": "page", "text": "first edit"}, {"id": "page", "text": "second edit"}])
+
+    written = {point["id"]: point["text"] for call in mock_rag.write_vectors.call_args_list for point in call.args[1]}
+    deleted = mock_rag.delete_points.call_args.args[1]
+    kept = set(manifest.get("c", "page"))
+    assert sorted(deleted) == sorted(original + [chunk_id for chunk_id, text in written.items() if text == "first edit"])
+    assert [written[chunk_id] for chunk_id in kept] == ["second edit"]
+    assert stats["deleted_chunks"] == 2
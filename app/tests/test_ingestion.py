@@ -31,3 +31,90 @@ def test_ingest_file_txt():
     assert len(chunks[0]) == 2
     assert isinstance(chunks[0][0], str) # uuid
     assert isinstance(chunks[0][1], str) # text
+
+def test_chunk_ids_are_deterministic():
+    from ingestion import chunk_ids
+
+    first = chunk_ids("doc-1", ["alpha", "beta", "alpha"])
+    second = chunk_ids("doc-1", ["beta", "alpha", "alpha"])
+
+    assert len(set(first)) == 3  # repeated chunk still gets its own ID
+    assert set(first) == set(second)  # content-derived, not position-derived
+    assert chunk_ids("doc-2", ["alpha"])[0] not in first
+
+def test_chunk_stream_matches_chunk_text():
+    from ingestion import chunk_stream
+
+    text = "".join(chr(97 + i % 26) for i in range(1234))
+    segments = [text[i:i + 97] for i in range(0, len(text), 97)]
+
+    assert list(chunk_stream(segments, chunk_size=100, overlap=10)) == chunk_text(text, chunk_size=100, overlap=10)
+
+def test_iter_directory_chunks(tmp_path):
+    from ingestion import iter_directory_chunks
+
+    (tmp_path / "a.txt").write_text("alpha " * 200)
+    (tmp_path / "b.md").write_text("beta " * 50)
+    (tmp_path / "ignored.bin").write_bytes(b"\x00\x01")
+
+    stats = {}
+    chunks = list(iter_directory_chunks(str(tmp_path), workers=2, stats=stats))
+
+    assert stats["files"] == 2
+    assert {chunk["doc_id"] for chunk in chunks} == {str(tmp_path / "a.txt"), str(tmp_path / "b.md")}
+    assert [c["chunk_index"] for c in chunks if c["doc_id"].endswith("a.txt")] == [0, 1, 2]
+
+def test_file_segments_stream_across_page_batches():
+    from ingestion import _file_segments, chunk_ids, iter_chunk_ids
+
+    batches = iter([("a.pdf", ["page 2 "], False), ("a.pdf", ["page 3 "], True), ("b.pdf", ["other"], True)])
+    stats = {"pages": 0}
+
+    segments = _file_segments(["page 1 "], False, batches, stats)
+
+    assert next(segments) == "page 1 " and stats["pages"] == 1  # later batches aren't awaited yet
+    assert list(segments) == ["page 2 ", "page 3 "] and stats["pages"] == 3
+    assert next(batches)[0] == "b.pdf"
+    chunks = ["x", "y", "x"]
+    assert [chunk_id for chunk_id, _ in iter_chunk_ids("doc", iter(chunks))] == chunk_ids("doc", chunks)
+
+def test_chunk_sentences_respects_boundaries_and_budget():
+    from ingestion import chunk_sentences
+
+    text = " ".join(f"Sentence number {i} talks about vector search." for i in range(200))
+    # Segment breaks fall mid-sentence
+    segments = [text[i:i + 333] for i in range(0, len(text), 333)]
+    count = lambda chunk: len(chunk.split())
+
+    chunks = list(chunk_sentences(segments, chunk_tokens=40, overlap_tokens=8, count_tokens=count))
+
+    assert all(count(chunk) <= 40 for chunk in chunks)
+    assert all(chunk.startswith("Sentence") and chunk.endswith(".") for chunk in chunks)
+    # The last sentence of each chunk is repeated at the start of the next
+    assert chunks[1].startswith(chunks[0].rsplit(". ", 1)[-1])
+    assert "Sentence number 199 talks" in chunks[-1]
+
+def test_chunk_sentences_splits_text_without_boundaries():
+    from ingestion import chunk_sentences
+
+    chunks = list(chunk_sentences(["a" * 1000], chunk_tokens=100, overlap_tokens=0))
+
+    assert "".join(chunks) == "a" * 1000
+    assert all(len(chunk) <= 400 for chunk in chunks)
+
+def test_chunk_stage_times_the_chunking():
+    import time
+    from ingestion import chunk_segments
+    from metrics import collect_timings
+
+    def slow_segments():
+        for i in range(3):
+            time.sleep(0.02)
+            yield f"Sentence {i} about chunking. " * 20
+
+    with collect_timings() as timings:
+        chunks = list(chunk_segments(slow_segments()))
+
+    assert chunks
+    # Time spent producing the chunks, not just creating the chunker
+    assert timings["chunk"] >= 50
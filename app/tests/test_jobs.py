@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import socket
+import subprocess
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from jobs import JobManager, JobStore
+
+def _wait_for(manager, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.status(job_id)
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+def test_submit_runs_items_and_reports_progress():
+    pipeline = MagicMock()
+    pipeline.run.return_value = {"chunks": 2}
+    manager = JobManager(pipeline, JobStore(":memory:"), workers=1)
+
+    job_id = manager.submit("upsert", "docs", [{"id": None, "text": "a"}, {"id": None, "text": "b"}])
+    job = _wait_for(manager, job_id)
+
+    assert job["status"] == "completed"
+    assert job["done_items"] == 2
+    assert job["chunks"] == 4
+    assert pipeline.run.call_count == 2
+
+def test_resume_skips_committed_items(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    store = JobStore(db_path)
+    job_id = store.create("upsert", "docs", [{"text": "a"}, {"text": "b"}, {"text": "c"}])
+    # Simulate a worker that crashed after the first item was committed
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    assert store.claim(job_id, f"{socket.gethostname()}:{dead.pid}:earlier")
+    store.complete_item(job_id, 0, 1)
+
+    pipeline = MagicMock()
+    pipeline.run.return_value = {"chunks": 1}
+    manager = JobManager(pipeline, JobStore(db_path), workers=1)
+
+    assert manager.resume() == [job_id]
+    job = _wait_for(manager, job_id)
+
+    processed = [call.args[1][0]["text"] for call in pipeline.run.call_args_list]
+    assert processed == ["b", "c"]
+    assert job["done_items"] == 3
+
+def test_failed_item_is_recorded():
+    pipeline = MagicMock()
+    pipeline.run.side_effect = RuntimeError("embedding failed")
+    manager = JobManager(pipeline, JobStore(":memory:"), workers=1)
+
+    job = _wait_for(manager, manager.submit("upsert", "docs", [{"text": "a"}]))
+
+    assert job["status"] == "failed"
+    assert job["failed_items"] == 1
+
+def test_jobs_are_claimed_by_one_worker(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    store = JobStore(db_path)
+    queued = store.create("upsert", "docs", [{"text": "queued"}])
+    running = store.create("upsert", "docs", [{"text": "running"}])
+    # Still being run by a live process (this one)
+    assert store.claim(running, f"{socket.gethostname()}:{os.getpid()}:other")
+
+    pipeline = MagicMock()
+    pipeline.run.return_value = {"chunks": 1}
+    # Every forked worker resumes at startup
+    workers = [JobManager(pipeline, JobStore(db_path), workers=1) for _ in range(3)]
+    for manager in workers:
+        assert running not in manager.resume()
+    _wait_for(workers[0], queued)
+    for manager in workers:
+        manager._executor.shutdown(wait=True)
+
+    assert [call.args[1][0]["text"] for call in pipeline.run.call_args_list] == ["queued"]
+    assert store.get(running)["status"] == "running"
+
+def test_job_of_an_earlier_process_with_the_same_pid_is_taken_over(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    store = JobStore(db_path)
+    stale = store.create("upsert", "docs", [{"text": "stale"}])
+    fresh = store.create("upsert", "docs", [{"text": "fresh"}])
+    # A container restart: same hostname and PID as this process, but an earlier process
+    earlier = f"{socket.gethostname()}:{os.getpid()}:before-restart"
+    assert store.claim(stale, earlier) and store.claim(fresh, earlier)
+    with store._conn:
+        store._conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 120, stale))
+
+    pipeline = MagicMock()
+    pipeline.run.return_value = {"chunks": 1}
+    manager = JobManager(pipeline, JobStore(db_path), workers=1, lease_seconds=0.3)
+
+    # The PID looks alive, so only the expired lease gives the job away
+    assert manager.resume() == [stale]
+    assert _wait_for(manager, stale)["status"] == "completed"
+    # The other lease runs out without renewal and is taken over in the background
+    assert _wait_for(manager, fresh)["status"] == "completed"
+    manager.shutdown()
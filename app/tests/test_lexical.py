@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+def test_tokenize_keeps_identifiers_and_parts():
+    tokens = tokenize("Got ERR-4012 from v2.3")
+    assert "err-4012" in tokens and "err" in tokens and "4012" in tokens
+    assert "v2.3" in tokens
+
+def test_search_ranks_exact_identifier_first():
+    index = BM25Index()
+    index.add("1", "The service returned error ERR-4012 during checkout.")
+    index.add("2", "Errors during checkout are usually transient.")
+    index.add("3", "Qdrant is a vector database.")
+
+    results = index.search("ERR-4012", top_k=2)
+
+    assert results[0][0] == "1"
+    assert all(doc_id != "3" for doc_id, _ in results)
+
+def test_incremental_replace_remove_and_persist(tmp_path):
+    path = str(tmp_path / "docs.bm25")
+    index = BM25Index(path)
+    index.add("1", "alpha beta")
+    index.add("1", "gamma")  # replaces the previous version
+    index.add("2", "alpha")
+    index.remove("2")
+    index.save()
+
+    reloaded = BM25Index(path)
+    assert len(reloaded) == 1
+    assert reloaded.search("alpha") == []
+    assert reloaded.search("gamma")[0][0] == "1"
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "e"]])
+    assert fused[0][0] == "b"
+    assert {doc_id for doc_id, _ in fused} == {"a", "b", "c", "d", "e"}
+
+def test_instances_sharing_a_path_see_each_others_saves(tmp_path):
+    path = str(tmp_path / "docs.bm25")
+    first, second = BM25Index(path), BM25Index(path)
+    first.add("1", "alpha")
+    first.save()
+    second.add("2", "alpha beta")
+    second.remove("1")
+    second.save()
+
+    assert [doc_id for doc_id, _ in first.search("alpha")] == ["2"]
+    assert [doc_id for doc_id, _ in second.search("alpha")] == ["2"]
+
+def test_compaction_keeps_other_instances_current(tmp_path, monkeypatch):
+    import lexical
+    monkeypatch.setattr(lexical, "COMPACT_MIN_LOG_BYTES", 0)
+    path = str(tmp_path / "docs.bm25")
+    first, second = BM25Index(path), BM25Index(path)
+    for round_ in range(3):
+        first.add(str(round_), f"alpha round{round_}")
+        first.save()
+
+    assert first.generation > 0
+    assert not os.path.exists(path + ".0.log")
+    assert {doc_id for doc_id, _ in second.search("alpha")} == {"0", "1", "2"}
+    assert len(BM25Index(path)) == 3
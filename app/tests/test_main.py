@@ -0,0 +1,59 @@
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # The app opens its SQLite files at import time; keep them out of the working directory
+    for name in ("JOBS_DB_PATH", "MANIFEST_DB_PATH", "VERSIONS_DB_PATH", "CRAWL_CACHE_DB_PATH"):
+        monkeypatch.setenv(name, str(tmp_path / f"{name.lower()}.db"))
+    monkeypatch.setenv("QUERY_CACHE", "true")
+    sys.modules.pop("main", None)
+    import main
+    yield main
+    main.job_manager.shutdown()
+    sys.modules.pop("main", None)
+
+def test_query_batch_mixes_cached_answered_and_failed_items(app_module, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    main = app_module
+    pipeline = main.rag_pipeline
+    pipeline.embeddings = MagicMock()
+    pipeline.embeddings.encode_array.return_value = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+    pipeline.aretrieve_batch = AsyncMock(return_value=[
+        [("a", 0.9, "source for fresh")],
+        [("b", 0.8, "source for broken")],
+    ])
+
+    async def generate(prompt, priority=None, timeout=None):
+        if "broken" in prompt:
+            raise RuntimeError("LLM unavailable")
+        return "fresh answer"
+    monkeypatch.setattr(main, "agenerate", generate)
+
+    # Same variant as a default request: top_k, retrieval mode, rerank, tenant, filters
+    version = pipeline.collection_version(main.COLLECTION_NAME)
+    main.query_cache.put(
+        main.COLLECTION_NAME, "cached question", (5, "dense", False, None, None), version,
+        [0.5, 0.5], ["c"], "cached answer", ["cached source"],
+    )
+
+    response = TestClient(main.app).post(
+        "/query/batch", json={"queries": ["fresh question", "cached question", "broken question"]}
+    )
+
+    assert response.status_code == 200
+    fresh, cached, broken = response.json()["results"]
+    assert fresh["query"] == "fresh question" and fresh["answer"] == "fresh answer"
+    assert fresh["sources"] == ["source for fresh"]
+    assert cached["answer"] == "cached answer" and cached["sources"] == ["cached source"]
+    assert broken["answer"] is None and "LLM unavailable" in broken["error"]
+    # Only the uncached queries were embedded and searched, in request order
+    args, _ = pipeline.aretrieve_batch.call_args
+    assert args[1] == ["fresh question", "broken question"]
+    pipeline.embeddings.encode_array.assert_called_once_with(["fresh question", "broken question"])
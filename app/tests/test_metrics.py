@@ -0,0 +1,93 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from metrics import Metrics, collect_timings
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+@pytest.fixture
+def metrics():
+    return Metrics(registry=prometheus_client.CollectorRegistry())
+
+def sample(metrics, name, labels):
+    return metrics.registry.get_sample_value(name, labels) or 0
+
+def test_stages_feed_histograms_and_request_breakdown(metrics):
+    with collect_timings() as timings:
+        with metrics.stage("search"):
+            pass
+        with metrics.stage("search"):
+            pass
+        with pytest.raises(ValueError):
+            with metrics.stage("llm"):
+                raise ValueError("boom")
+
+    assert set(timings) == {"search", "llm", "total"}
+    assert sample(metrics, "rag_stage_seconds_count", {"stage": "search"}) == 2
+    assert sample(metrics, "rag_stage_errors_total", {"stage": "llm"}) == 1
+    # Outside collect_timings nothing is accumulated per request
+    with metrics.stage("search"):
+        pass
+    assert sample(metrics, "rag_stage_seconds_count", {"stage": "search"}) == 3
+
+def test_timed_counts_error_strings_and_stream_output(metrics):
+    completions = []
+
+    @metrics.timed("llm", on_complete=lambda args, text: completions.append(text))
+    async def call(prompt):
+        return "Error calling Ollama: down" if prompt == "bad" else "fine"
+
+    @metrics.timed("llm_stream", on_complete=lambda args, text: completions.append(text), first_item=True)
+    async def stream(prompt):
+        for token in ("a", "b"):
+            yield token
+
+    async def run():
+        await call("ok")
+        await call("bad")
+        return [token async for token in stream("ok")]
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert completions == ["fine", "Error calling Ollama: down", "ab"]
+    assert sample(metrics, "rag_stage_errors_total", {"stage": "llm"}) == 1
+    assert sample(metrics, "rag_stage_seconds_count", {"stage": "llm_stream_first_item"}) == 1
+    content, content_type = metrics.render()
+    assert b"rag_stage_seconds_bucket" in content
+    assert content_type.startswith("text/plain")
+
+def test_timed_generators_closed_early_record_and_close(metrics):
+    completions, closed = [], []
+
+    @metrics.timed("llm_stream", on_complete=lambda args, text: completions.append(text))
+    async def stream(prompt):
+        try:
+            for token in ("a", "b", "c"):
+                yield token
+        finally:
+            closed.append("async")
+
+    @metrics.timed("chunks", on_complete=lambda args, text: completions.append(text))
+    def chunks():
+        try:
+            yield from ("a", "b")
+        finally:
+            closed.append("sync")
+
+    async def run():
+        generator = stream("ok")
+        await generator.__anext__()
+        await generator.aclose()
+
+    asyncio.run(run())
+    generator = chunks()
+    next(generator)
+    generator.close()
+
+    assert closed == ["async", "sync"]
+    assert completions == []
+    assert sample(metrics, "rag_stage_seconds_count", {"stage": "llm_stream"}) == 1
+    assert sample(metrics, "rag_stage_seconds_count", {"stage": "chunks"}) == 1
+    assert sample(metrics, "rag_stage_errors_total", {"stage": "chunks"}) == 0
@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from query_cache import CollectionVersions, QueryCache
+
+def _put(cache, query, vector, source_ids, version=0):
+    cache.put("docs", query, 5, version, vector, source_ids, f"answer to {query}", ["ctx"])
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = QueryCache()
+    _put(cache, "What is Qdrant?", [1.0, 0.0], ["1"])
+
+    entry = cache.get_exact("docs", "  what is   qdrant ", 5, version=0)
+
+    assert entry["answer"] == "answer to What is Qdrant?"
+    assert cache.get_exact("docs", "What is Qdrant?", 3, version=0) is None
+
+def test_semantic_hit_requires_same_sources():
+    cache = QueryCache(similarity_threshold=0.9)
+    _put(cache, "What is Qdrant?", [1.0, 0.0], ["1", "2"])
+
+    assert cache.get_semantic("docs", [0.99, 0.05], ["1", "2"], 5, version=0) is not None
+    assert cache.get_semantic("docs", [0.99, 0.05], ["1", "3"], 5, version=0) is None
+    assert cache.get_semantic("docs", [0.0, 1.0], ["1", "2"], 5, version=0) is None
+
+def test_new_collection_version_invalidates():
+    cache = QueryCache()
+    _put(cache, "What is Qdrant?", [1.0, 0.0], ["1"], version=0)
+
+    assert cache.get_exact("docs", "What is Qdrant?", 5, version=1) is None
+    assert cache.stats()["entries"] == 0
+
+def test_lru_eviction():
+    cache = QueryCache(max_entries=2)
+    for i in range(3):
+        _put(cache, f"q{i}", [1.0, float(i)], [str(i)])
+
+    assert cache.get_exact("docs", "q0", 5, version=0) is None
+    assert cache.get_exact("docs", "q2", 5, version=0) is not None
+
+def test_collection_versions_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "versions.db")
+    # One per worker process
+    first, second = CollectionVersions(path), CollectionVersions(path)
+    assert first.bump("docs") == 1
+    assert second.get("docs") == 1
+    assert second.bump("docs") == 2
+    assert first.get("docs") == 2 and first.get("other") == 0
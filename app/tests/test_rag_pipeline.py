@@ -1,6 +1,6 @@
 import os
 import sys
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
@@ -9,6 +9,8 @@ from rag import RAGPipeline
 @pytest.fixture
 def mock_qdrant_client():
     with patch("rag.QdrantClient") as mock:
+        # Empty collection for the BM25 backfill
+        mock.return_value.scroll.return_value = ([], None)
         yield mock
 
 @pytest.fixture
@@ -17,6 +19,7 @@ def mock_embeddings():
         instance = mock.return_value
         # Mock get_embedding to return a dummy vector
         instance.get_embedding.return_value = [0.1] * 384
+        instance.aget_embedding = AsyncMock(return_value=[0.1] * 384)
         instance.batch_embeddings.return_value = [[0.1] * 384]
         yield instance
 
@@ -34,6 +37,8 @@ def test_upsert_documents(mock_qdrant_client, mock_embeddings):
     args, kwargs = pipeline.client.upsert.call_args
     assert kwargs['collection_name'] == "test_collection"
     assert len(kwargs['points']) == 1
+    # Writes bump the version that query caches are keyed on
+    assert pipeline.collection_version("test_collection") == 1
 
 def test_retrieve(mock_qdrant_client, mock_embeddings):
     pipeline = RAGPipeline()
@@ -56,3 +61,190 @@ def test_retrieve(mock_qdrant_client, mock_embeddings):
     assert len(results) == 1
     assert results[0] == ("1", 0.9, "Test result")
     pipeline.client.query_points.assert_called_once()
+
+def test_aretrieve(mock_qdrant_client, mock_embeddings):
+    import asyncio
+
+    pipeline = RAGPipeline()
+    pipeline.embeddings = mock_embeddings
+
+    mock_point = MagicMock()
+    mock_point.id = "1"
+    mock_point.score = 0.9
+    mock_point.payload = {"text": "Test result"}
+    mock_response = MagicMock()
+    mock_response.points = [mock_point]
+
+    pipeline._async_client = MagicMock()
+    pipeline._async_client.query_points = AsyncMock(return_value=mock_response)
+
+    results = asyncio.run(pipeline.aretrieve("test_collection", "query", top_k=2))
+
+    assert results == [("1", 0.9, "Test result")]
+    pipeline._async_client.query_points.assert_awaited_once()
+
+def test_retrieve_hybrid_fuses_lexical_hits(mock_qdrant_client, mock_embeddings):
+    pipeline = RAGPipeline()
+    pipeline.client = mock_qdrant_client.return_value
+    pipeline.embeddings = mock_embeddings
+
+    dense_point = MagicMock()
+    dense_point.id = "1"
+    dense_point.score = 0.9
+    dense_point.payload = {"text": "Checkout errors are transient."}
+    mock_response = MagicMock()
+    mock_response.points = [dense_point]
+    pipeline.client.query_points.return_value = mock_response
+
+    lexical_point = MagicMock()
+    lexical_point.id = "2"
+    lexical_point.payload = {"text": "Error ERR-4012 means the card was declined."}
+    pipeline.client.retrieve.return_value = [lexical_point]
+
+    pipeline.lexical_index("test_collection").add("2", lexical_point.payload["text"])
+    results = pipeline.retrieve("test_collection", "ERR-4012", top_k=2, mode="hybrid")
+
+    assert {res[0] for res in results} == {"1", "2"}
+    assert dict((res[0], res[2]) for res in results)["2"] == lexical_point.payload["text"]
+    pipeline.client.retrieve.assert_called_once()
+
+def test_build_filter_and_payload_matches():
+    from rag import build_filter, payload_matches
+
+    query_filter = build_filter("acme", {"lang": "en", "source": ["wiki", "faq"], "year": {"gte": 2020}})
+
+    assert [c.key for c in query_filter.must] == ["tenant", "metadata.lang", "metadata.source", "metadata.year"]
+    assert build_filter() is None
+    payload = {"tenant": "acme", "metadata": {"lang": "en", "source": "faq", "year": 2021}}
+    assert payload_matches(payload, "acme", {"lang": "en", "source": ["wiki", "faq"], "year": {"gte": 2020}})
+    assert not payload_matches(payload, "other")
+    assert not payload_matches(payload, "acme", {"year": {"lt": 2021}})
+    # List-valued fields match if any element does, as in Qdrant
+    tagged = {"metadata": {"tags": ["billing", "faq"], "years": [2019, 2024]}}
+    assert payload_matches(tagged, filters={"tags": ["faq", "wiki"], "years": {"gte": 2023}})
+    assert payload_matches(tagged, filters={"tags": "billing"})
+    assert not payload_matches(tagged, filters={"tags": ["wiki"]})
+    # Without a tenant, every tenant's documents match
+    assert payload_matches(payload)
+
+def test_tenant_filter_applies_to_dense_and_hybrid_results():
+    import numpy as np
+    from qdrant_client import QdrantClient
+
+    pipeline = RAGPipeline(client=QdrantClient(":memory:"), embeddings=MagicMock())
+    pipeline.lexical_dir = None
+    pipeline.embeddings.get_embedding.return_value = [1.0, 0.0]
+    pipeline.create_collection_if_not_exists("docs", dim=2)
+    docs = [
+        {"id": 1, "text": "ERR-1 acme runbook", "tenant": "acme", "metadata": {"lang": "en"}},
+        {"id": 2, "text": "ERR-1 globex runbook", "tenant": "globex", "metadata": {"lang": "en"}},
+        {"id": 3, "text": "acme notes", "tenant": "acme", "metadata": {"lang": "de"}},
+    ]
+    pipeline.write_vectors("docs", docs, np.array([[0.0, 1.0], [1.0, 0.0], [0.9, 0.1]], dtype=np.float32))
+
+    dense = pipeline.retrieve("docs", "ERR-1", top_k=3, tenant="acme")
+    hybrid = pipeline.retrieve("docs", "ERR-1", top_k=3, mode="hybrid", tenant="acme", filters={"lang": "en"})
+
+    assert {str(doc_id) for doc_id, _, _ in dense} == {"1", "3"}
+    assert [text for _, _, text in hybrid] == ["ERR-1 acme runbook"]
+
+def test_lexical_index_is_backfilled_from_the_collection():
+    import numpy as np
+    from qdrant_client import QdrantClient
+
+    client = QdrantClient(":memory:")
+    writer = RAGPipeline(client=client, embeddings=MagicMock())
+    writer.lexical_dir = None
+    writer.create_collection_if_not_exists("docs", dim=2)
+    docs = [{"id": 1, "text": "ERR-1 runbook"}, {"id": 2, "text": "billing notes"}]
+    writer.write_vectors("docs", docs, np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32))
+
+    # A fresh pipeline (e.g. after a restart) has no in-memory BM25 index yet
+    reader = RAGPipeline(client=client, embeddings=MagicMock())
+    reader.lexical_dir = None
+    index = reader.lexical_index("docs")
+
+    assert len(index) == 2
+    assert index.search("ERR-1")[0][0] == "1"
+    assert len(reader.lexical_index("missing")) == 0
+
+def test_retrieve_reports_chunk_positions():
+    import numpy as np
+    from qdrant_client import QdrantClient
+
+    pipeline = RAGPipeline(client=QdrantClient(":memory:"), embeddings=MagicMock())
+    pipeline.lexical_dir = None
+    pipeline.embeddings.get_embedding.return_value = [1.0, 0.0]
+    pipeline.create_collection_if_not_exists("docs", dim=2)
+    docs = [
+        {"id": 1, "text": "intro", "doc_id": "guide.md", "chunk_index": 0},
+        {"id": 2, "text": "details", "doc_id": "guide.md", "chunk_index": 1},
+        {"id": 3, "text": "no source"},
+    ]
+    pipeline.write_vectors("docs", docs, np.array([[1.0, 0.0], [0.9, 0.1], [0.8, 0.2]], dtype=np.float32))
+
+    positions = {}
+    results = pipeline.retrieve("docs", "intro", top_k=3, mode="hybrid", positions=positions)
+
+    assert len(results) == 3
+    assert positions == {"1": ("guide.md", 0), "2": ("guide.md", 1)}
+
+def test_retrieve_batch_embeds_once_and_keeps_query_order():
+    import numpy as np
+    from qdrant_client import QdrantClient
+
+    pipeline = RAGPipeline(client=QdrantClient(":memory:"), embeddings=MagicMock())
+    pipeline.lexical_dir = None
+    pipeline.embeddings.encode_array.side_effect = [
+        np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32),
+        # Hybrid queries: "ERR-2" is closest to doc 2, "ERR-1" to doc 1
+        np.array([[0.0, 1.0], [1.0, 0.0]], dtype=np.float32),
+    ]
+    pipeline.create_collection_if_not_exists("docs", dim=2)
+    docs = [
+        {"id": 1, "text": "ERR-1 acme runbook", "tenant": "acme"},
+        {"id": 2, "text": "ERR-2 acme runbook", "tenant": "acme"},
+        {"id": 3, "text": "globex notes", "tenant": "globex"},
+    ]
+    pipeline.write_vectors("docs", docs, np.array([[1.0, 0.0], [0.0, 1.0], [0.1, 0.9]], dtype=np.float32))
+
+    dense = pipeline.retrieve_batch("docs", ["first", "second"], top_k=1)
+    hybrid = pipeline.retrieve_batch("docs", ["ERR-2", "ERR-1"], top_k=1, mode="hybrid", tenant="acme")
+
+    assert [results[0][2] for results in dense] == ["ERR-1 acme runbook", "ERR-2 acme runbook"]
+    assert [[text for _, _, text in results] for results in hybrid] == [["ERR-2 acme runbook"], ["ERR-1 acme runbook"]]
+    assert pipeline.embeddings.encode_array.call_count == 2
+    assert pipeline.retrieve_batch("docs", []) == []
+
+def test_pipeline_defers_model_and_qdrant_until_used():
+    with patch("rag.EmbeddingsUtils") as embeddings_cls, patch("rag.QdrantClient") as client_cls:
+        pipeline = RAGPipeline()
+        embeddings_cls.assert_not_called()
+        client_cls.assert_not_called()
+
+        stats = pipeline.warmup()
+        pipeline.client
+        pipeline.client
+
+    embeddings_cls.assert_called_once()
+    embeddings_cls.return_value.encode_array.assert_called_once_with(["warmup"])
+    client_cls.assert_called_once()
+    assert {"model_load_seconds", "embedding_warmup_seconds"} <= set(stats)
+
+def test_cold_lexical_index_is_loaded_off_the_event_loop():
+    import asyncio
+    import threading
+
+    pipeline = RAGPipeline(client=MagicMock(), embeddings=MagicMock())
+    loop_thread = []
+
+    def backfill(collection_name, index, store):
+        loop_thread.append(threading.current_thread() is threading.main_thread())
+    pipeline._backfill_lexical = backfill
+
+    async def run():
+        first = await pipeline.alexical_index("docs")
+        return first, await pipeline.alexical_index("docs")
+
+    first, second = asyncio.run(run())
+    assert first is second and loop_thread == [False]
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from rerank import CrossEncoderReranker
+
+class _FakeModel:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def predict(self, pairs, batch_size=32):
+        time.sleep(self.delay)
+        # Relevance = number of query words in the text
+        return [sum(word in text for word in query.split()) for query, text in pairs]
+
+def _reranker(delay: float = 0.0, deadline_ms: float = 1000) -> CrossEncoderReranker:
+    reranker = CrossEncoderReranker(deadline_ms=deadline_ms)
+    reranker._model = _FakeModel(delay)
+    return reranker
+
+CANDIDATES = [
+    ("1", 0.9, "qdrant is fast"),
+    ("2", 0.8, "vector database qdrant stores embeddings"),
+    ("3", 0.7, "unrelated text"),
+]
+
+def test_rerank_orders_by_cross_encoder_score():
+    results = _reranker().rerank("vector database qdrant", CANDIDATES, top_k=2)
+
+    assert [doc_id for doc_id, _, _ in results] == ["2", "1"]
+    assert results[0][1] == 3.0
+
+def test_rerank_respects_token_budget():
+    # "2" alone is ~10 tokens; nothing else fits after it
+    results = _reranker().rerank("vector database qdrant", CANDIDATES, top_k=3, token_budget=12)
+
+    assert [doc_id for doc_id, _, _ in results] == ["2"]
+
+def test_arerank_falls_back_to_vector_order_after_deadline():
+    reranker = _reranker(delay=0.2, deadline_ms=20)
+
+    results = asyncio.run(reranker.arerank("vector database qdrant", CANDIDATES, top_k=2))
+
+    assert [doc_id for doc_id, _, _ in results] == ["1", "2"]
+    assert reranker.fallbacks == 1
+
+def test_rerank_cancels_queued_scoring_after_deadline():
+    reranker = CrossEncoderReranker(deadline_ms=20, workers=1)
+    reranker._model = _FakeModel(delay=0.2)
+    calls = []
+    predict = reranker._model.predict
+    reranker._model.predict = lambda pairs, batch_size=32: calls.append(pairs) or predict(pairs, batch_size)
+
+    first = reranker.rerank("vector database qdrant", CANDIDATES, top_k=2)
+    # Queued behind the first (still running) job, so it is dropped on timeout
+    second = reranker.rerank("vector database qdrant", CANDIDATES, top_k=2)
+    reranker._executor.shutdown(wait=True)
+
+    assert [doc_id for doc_id, _, _ in first] == [doc_id for doc_id, _, _ in second] == ["1", "2"]
+    assert len(calls) == 1 and reranker.fallbacks == 2
@@ -0,0 +1,96 @@
+import os
+import sys
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+from qdrant_client.http import models
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from vector_store import EmbeddedVectorStore, normalize
+from rag import RAGPipeline, build_filter
+
+def random_vectors(count, dim=16, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(count, dim)))
+
+def create(store, name="docs", dim=16):
+    store.create_collection(name, vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE))
+
+def test_replace_delete_filter_and_reload(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path))
+    create(store)
+    vectors = random_vectors(40)
+    store.upload_collection(
+        "docs", vectors[:20], ids=[f"p{i}" for i in range(20)],
+        payload=[{"text": f"t{i}", "tenant": "a" if i % 2 else "b", "metadata": {"n": i}} for i in range(20)],
+    )
+    # Replaces p0 with a new vector and text
+    store.upsert("docs", [models.PointStruct(id="p0", vector=vectors[30].tolist(), payload={"text": "new", "tenant": "b"})])
+    store.delete("docs", models.PointIdsList(points=["p1"]))
+
+    hits = store.query_points("docs", vectors[30], limit=3).points
+    assert hits[0].id == "p0" and hits[0].payload["text"] == "new"
+    assert abs(hits[0].score - 1.0) < 1e-5
+
+    filtered = store.query_points("docs", vectors[3], query_filter=build_filter("a", {"n": {"gte": 3}}), limit=20).points
+    assert filtered[0].id == "p3"
+    assert {hit.id for hit in filtered} == {f"p{i}" for i in range(3, 20, 2)}
+
+    # One process per directory: a second store would overwrite this one's segments
+    with pytest.raises(RuntimeError, match="another process"):
+        EmbeddedVectorStore(str(tmp_path))
+    store.close()
+    reloaded = EmbeddedVectorStore(str(tmp_path))
+    assert reloaded.count("docs").count == 19
+    assert reloaded.retrieve("docs", ["p1", "p0"])[0].payload["text"] == "new"
+    points, next_offset = reloaded.scroll("docs", limit=5)
+    assert len(points) == 19 and next_offset is None
+    assert [hit.id for hit in reloaded.query_points("docs", vectors[5], limit=3).points] == [hit.id for hit in store.query_points("docs", vectors[5], limit=3).points]
+
+def test_segments_are_merged_and_deleted_rows_dropped(tmp_path):
+    store = EmbeddedVectorStore(str(tmp_path), max_segments=4)
+    create(store)
+    vectors = random_vectors(60)
+    for batch in range(6):
+        ids = list(range(batch * 10, batch * 10 + 10))
+        store.upload_collection("docs", vectors[ids], ids=ids, payload=[{"text": str(i)} for i in ids])
+    collection = store.collections["docs"]
+    assert len(collection.segments) <= 4
+
+    store.delete("docs", list(range(50)))
+    store.compact("docs")
+    assert [len(segment) for segment in collection.segments] == [10]
+    assert len(os.listdir(tmp_path / "docs")) == 4  # manifest + one segment's vectors, payloads, deletion mask
+    assert store.query_points("docs", vectors[55], limit=1).points[0].id == 55
+
+def test_ivf_matches_exact_search_on_clustered_data():
+    rng = np.random.default_rng(0)
+    centroids = rng.normal(size=(8, 16))
+    vectors = normalize(centroids[rng.integers(0, 8, 2000)] + 0.3 * rng.normal(size=(2000, 16)))
+    exact, approximate = EmbeddedVectorStore(), EmbeddedVectorStore(ivf_min_points=1000, nprobe=8)
+    for store in (exact, approximate):
+        create(store)
+        store.upload_collection("docs", vectors, ids=list(range(2000)))
+    assert approximate.collections["docs"].segments[0].centroids is not None
+
+    queries = vectors[:50]
+    requests = [models.QueryRequest(query=query.tolist(), limit=10) for query in queries]
+    recall = np.mean([
+        len({hit.id for hit in a.points} & {hit.id for hit in b.points}) / 10
+        for a, b in zip(exact.query_batch_points("docs", requests), approximate.query_batch_points("docs", requests))
+    ])
+    assert recall > 0.9
+
+def test_pipeline_hybrid_retrieval_on_embedded_store(monkeypatch, tmp_path):
+    monkeypatch.setenv("VECTOR_BACKEND", "embedded")
+    monkeypatch.setenv("EMBEDDED_INDEX_DIR", str(tmp_path))
+    pipeline = RAGPipeline(embeddings=MagicMock())
+    pipeline.create_collection_if_not_exists("docs", dim=16)
+    docs = [{"id": f"d{i}", "text": f"error ERR-{4000 + i} in shard {i}"} for i in range(10)]
+    pipeline.write_vectors("docs", docs, random_vectors(10))
+    pipeline.embeddings.get_embedding.return_value = random_vectors(1, seed=1)[0].tolist()
+
+    results = pipeline.retrieve("docs", "ERR-4007", top_k=3, mode="hybrid")
+
+    assert isinstance(pipeline.client, EmbeddedVectorStore)
+    # The keyword match is fused in with its text fetched from the store
+    assert {doc_id: text for doc_id, _, text in results}["d7"] == "error ERR-4007 in shard 7"
@@ -0,0 +1,818 @@
+import os
+import json
+import uuid
+import heapq
+import pickle
+import shutil
+import fcntl
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client.http import models
+
+# Rows widened from int8 to float32 at a time; small enough for the block to stay in cache
+SCORE_BLOCK_ROWS = 2048
+# Held exclusively by the process that opened the store directory
+LOCK_FILE = "store.lock"
+
+def normalize(vectors) -> np.ndarray:
+    """Rows scaled to unit length (cosine similarity becomes a dot product)."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means on a sample of unit vectors.
+
+    Args:
+        vectors (np.ndarray): Unit vectors, shape (n, dim).
+        nlist (int): Number of clusters (inverted lists).
+        iterations (int): Lloyd iterations over the sample.
+        seed (int): Random seed for sampling and initialization.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Unit centroids (nlist, dim) and each vector's cluster.
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), nlist * 64), replace=False))]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        # Empty clusters keep their previous centroid
+        filled = counts > 0
+        sums = np.add.reduceat(sample[np.argsort(assign, kind="stable")], starts[filled], axis=0)
+        centroids[filled] = normalize(sums)
+    assign = np.concatenate([
+        np.argmax(vectors[start:start + 32768] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), 32768)
+    ])
+    return centroids, assign
+
+def top_rows(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Positions of the `limit` highest finite scores, best first."""
+    if len(scores) > limit:
+        positions = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        positions = np.arange(len(scores))
+    positions = positions[np.argsort(-scores[positions], kind="stable")]
+    return positions[np.isfinite(scores[positions])]
+
+def segment_files(directory: str, name: str) -> Dict[str, str]:
+    return {
+        kind: os.path.join(directory, f"{name}.{kind}")
+        for kind in ("vectors.npy", "scales.npy", "payloads.pkl", "deleted.npy", "ivf.npz")
+    }
+
+def as_list(conditions) -> list:
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+class Segment:
+    """
+    Immutable block of unit vectors with their IDs and payloads.
+
+    Only the deletion mask and payloads change after a segment is written.
+    On disk the vectors are a .npy file that is memory-mapped, so they are
+    paged in by the OS instead of loaded. Segments built with an IVF index
+    store their rows grouped by cluster, so each probed list is one
+    contiguous slice of the file.
+    """
+    def __init__(
+        self,
+        name: str,
+        vectors: np.ndarray,
+        ids: List[Any],
+        payloads: List[Dict[str, Any]],
+        deleted: Optional[np.ndarray] = None,
+        centroids: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            name (str): File name stem within the collection directory.
+            vectors (np.ndarray): float32 or int8 vectors, shape (n, dim).
+            ids (List[Any]): Point ID per row.
+            payloads (List[Dict[str, Any]]): Payload per row.
+            deleted (Optional[np.ndarray]): Boolean mask of deleted rows.
+            centroids (Optional[np.ndarray]): IVF centroids, if the segment is indexed.
+            offsets (Optional[np.ndarray]): Start row of each IVF list, plus the end.
+            scales (Optional[np.ndarray]): Per-row factor that turns int8 vectors back into floats.
+        """
+        self.name = name
+        self.vectors = vectors
+        self.ids = ids
+        self.payloads = payloads
+        self.deleted = deleted if deleted is not None else np.zeros(len(ids), dtype=bool)
+        self.centroids = centroids
+        self.offsets = offsets
+        self.scales = scales
+        self._keyword_indexes: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._numeric_values: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def live(self) -> int:
+        return len(self.ids) - int(self.deleted.sum())
+
+    @classmethod
+    def build(
+        cls,
+        name: str,
+        vectors: np.ndarray,
+        ids: List[Any],
+        payloads: List[Dict[str, Any]],
+        dtype: str = "float32",
+        ivf_min_points: int = 20000,
+    ) -> "Segment":
+        """
+        Create a segment from unit float32 vectors, clustering them first if there are enough.
+        """
+        centroids = offsets = None
+        if len(ids) >= ivf_min_points:
+            nlist = max(1, int(np.sqrt(len(ids))))
+            centroids, assign = train_ivf(vectors, nlist)
+            order = np.argsort(assign, kind="stable")
+            vectors = vectors[order]
+            ids = [ids[row] for row in order]
+            payloads = [payloads[row] for row in order]
+            offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+        scales = None
+        if dtype == "int8":
+            # Each row's largest component maps to 127, so small components keep their resolution
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            vectors = np.rint(vectors / scales[:, None]).astype(np.int8)
+            scales = scales.astype(np.float32)
+        return cls(name, np.ascontiguousarray(vectors), ids, payloads, centroids=centroids, offsets=offsets, scales=scales)
+
+    def files(self, directory: str) -> Dict[str, str]:
+        return segment_files(directory, self.name)
+
+    def save(self, directory: str):
+        """Write the segment and re-open its vectors memory-mapped."""
+        files = self.files(directory)
+        np.save(files["vectors.npy"], self.vectors)
+        self.save_payloads(directory)
+        self.save_deleted(directory)
+        if self.scales is not None:
+            np.save(files["scales.npy"], self.scales)
+        if self.centroids is not None:
+            np.savez(files["ivf.npz"], centroids=self.centroids, offsets=self.offsets)
+        self.vectors = np.load(files["vectors.npy"], mmap_mode="r")
+
+    def save_payloads(self, directory: str):
+        path = self.files(directory)["payloads.pkl"]
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump((self.ids, self.payloads), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def save_deleted(self, directory: str):
+        path = self.files(directory)["deleted.npy"]
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, self.deleted)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> "Segment":
+        """Open a saved segment (payloads are a trusted local pickle)."""
+        files = segment_files(directory, name)
+        with open(files["payloads.pkl"], "rb") as f:
+            ids, payloads = pickle.load(f)
+        ivf = np.load(files["ivf.npz"]) if os.path.exists(files["ivf.npz"]) else None
+        return cls(
+            name,
+            np.load(files["vectors.npy"], mmap_mode="r"),
+            ids,
+            payloads,
+            deleted=np.load(files["deleted.npy"]),
+            centroids=ivf["centroids"] if ivf is not None else None,
+            offsets=ivf["offsets"] if ivf is not None else None,
+            scales=np.load(files["scales.npy"]) if os.path.exists(files["scales.npy"]) else None,
+        )
+
+    def remove_files(self, directory: str):
+        for path in self.files(directory).values():
+            if os.path.exists(path):
+                os.remove(path)
+
+    def float_vectors(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows as unit float32 vectors (int8 segments are widened)."""
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if self.scales is not None:
+            scales = self.scales if rows is None else self.scales[rows]
+            return vectors.astype(np.float32) * scales[:, None]
+        return np.asarray(vectors)
+
+    def scores(self, queries: np.ndarray, start: int = 0, stop: Optional[int] = None, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cosine scores of unit queries against rows[start:stop] (or the given rows), shape (len(queries), rows).
+        """
+        vectors = self.vectors[start:stop] if rows is None else self.vectors[rows]
+        if self.scales is None:
+            return queries @ np.asarray(vectors).T
+        out = np.empty((len(queries), len(vectors)), dtype=np.float32)
+        buffer = np.empty((min(SCORE_BLOCK_ROWS, len(vectors)), vectors.shape[1]), dtype=np.float32)
+        for block in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            chunk = vectors[block:block + SCORE_BLOCK_ROWS]
+            widened = buffer[:len(chunk)]
+            np.copyto(widened, chunk, casting="unsafe")
+            out[:, block:block + len(chunk)] = queries @ widened.T
+        return out * (self.scales[start:stop] if rows is None else self.scales[rows])
+
+    def search(
+        self,
+        queries: np.ndarray,
+        limit: int,
+        allowed: Optional[np.ndarray] = None,
+        nprobe: int = 32,
+        deleted: Optional[np.ndarray] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Best `limit` live rows per query: (rows, scores), best first.
+
+        Exact unless the segment has an IVF index, in which case the `nprobe`
+        closest lists are scanned. A selective filter that leaves fewer rows
+        than the probed lists would hold is searched exactly over those rows.
+        `deleted` overrides the segment's current deletion mask (a snapshot).
+        """
+        deleted = self.deleted if deleted is None else deleted
+        live = ~deleted if allowed is None else ~deleted & allowed
+        if self.centroids is not None:
+            nprobe = min(nprobe, len(self.centroids))
+            if allowed is None or live.sum() > len(self) * nprobe / len(self.centroids):
+                return self._search_ivf(queries, limit, live, nprobe)
+
+        if live.all():
+            scores = self.scores(queries)
+            rows = None
+        else:
+            rows = np.flatnonzero(live)
+            if len(rows) == 0:
+                return [(rows, rows.astype(np.float32)) for _ in queries]
+            scores = self.scores(queries, rows=rows)
+        results = []
+        for query_scores in scores:
+            positions = top_rows(query_scores, limit)
+            results.append((positions if rows is None else rows[positions], query_scores[positions]))
+        return results
+
+    def _search_ivf(self, queries: np.ndarray, limit: int, live: np.ndarray, nprobe: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        centroid_scores = queries @ self.centroids.T
+        results = []
+        for query, scores_to_centroids in zip(queries, centroid_scores):
+            probes = np.sort(np.argpartition(-scores_to_centroids, nprobe - 1)[:nprobe])
+            rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes])
+            scores = np.concatenate([
+                self.scores(query[None], self.offsets[c], self.offsets[c + 1])[0] for c in probes
+            ])
+            scores[~live[rows]] = -np.inf
+            positions = top_rows(scores, limit)
+            results.append((rows[positions], scores[positions]))
+        return results
+
+    def field_values(self, key: str) -> List[Any]:
+        """Each row's payload value at a dotted key ("metadata.lang"), or None."""
+        parts = key.split(".")
+        values = []
+        for payload in self.payloads:
+            value = payload
+            for part in parts:
+                value = value.get(part) if isinstance(value, dict) else None
+            values.append(value)
+        return values
+
+    def keyword_index(self, key: str) -> Dict[Any, np.ndarray]:
+        """Value -> rows holding it; list values index each element. Built on first use."""
+        index = self._keyword_indexes.get(key)
+        if index is None:
+            rows: Dict[Any, List[int]] = {}
+            for row, value in enumerate(self.field_values(key)):
+                for item in value if isinstance(value, list) else [value]:
+                    try:
+                        rows.setdefault(item, []).append(row)
+                    except TypeError:
+                        continue
+            index = {value: np.asarray(value_rows) for value, value_rows in rows.items() if value is not None}
+            self._keyword_indexes[key] = index
+        return index
+
+    def numeric_values(self, key: str) -> np.ndarray:
+        """Each row's numeric value at `key` (NaN if missing or not a number). Built on first use."""
+        values = self._numeric_values.get(key)
+        if values is None:
+            values = np.array([
+                value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+                for value in self.field_values(key)
+            ], dtype=np.float64)
+            self._numeric_values[key] = values
+        return values
+
+    def filter_mask(self, query_filter: models.Filter) -> np.ndarray:
+        """Rows whose payload matches a Qdrant filter (must / should / must_not)."""
+        mask = np.ones(len(self), dtype=bool)
+        for condition in as_list(query_filter.must):
+            mask &= self._condition_mask(condition)
+        should = as_list(query_filter.should)
+        if should:
+            mask &= np.logical_or.reduce([self._condition_mask(condition) for condition in should])
+        for condition in as_list(query_filter.must_not):
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def _condition_mask(self, condition) -> np.ndarray:
+        if isinstance(condition, models.Filter):
+            return self.filter_mask(condition)
+        if isinstance(condition, models.HasIdCondition):
+            wanted = set(condition.has_id)
+            return np.array([point_id in wanted for point_id in self.ids], dtype=bool)
+        if not isinstance(condition, models.FieldCondition):
+            raise ValueError(f"Unsupported filter condition: {type(condition).__name__}")
+
+        mask = np.zeros(len(self), dtype=bool)
+        if isinstance(condition.match, models.MatchValue):
+            values = [condition.match.value]
+        elif isinstance(condition.match, models.MatchAny):
+            values = list(condition.match.any)
+        elif condition.match is None and condition.range is not None:
+            numbers = self.numeric_values(condition.key)
+            mask = ~np.isnan(numbers)
+            bounds = condition.range
+            with np.errstate(invalid="ignore"):
+                for bound, passes in (
+                    (bounds.gt, numbers.__gt__), (bounds.gte, numbers.__ge__),
+                    (bounds.lt, numbers.__lt__), (bounds.lte, numbers.__le__),
+                ):
+                    if bound is not None:
+                        mask &= passes(bound)
+            return mask
+        else:
+            raise ValueError(f"Unsupported condition on '{condition.key}'")
+        index = self.keyword_index(condition.key)
+        for value in values:
+            rows = index.get(value)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def set_payload(self, row: int, payload: Dict[str, Any]):
+        self.payloads[row] = {**self.payloads[row], **payload}
+        self._keyword_indexes.clear()
+        self._numeric_values.clear()
+
+class EmbeddedCollection:
+    """
+    One collection: an append-only list of segments plus the live ID -> (segment, row) map.
+
+    Every write adds a new segment and marks replaced or deleted rows in
+    older segments' deletion masks; nothing is rewritten in place. When
+    there are more than `max_segments` segments, the smallest are merged
+    (size-tiered, so each row is rewritten O(log n) times), and segments
+    that are mostly deleted rows are rewritten without them. Searches don't
+    take the write lock: they snapshot the segment list and deletion masks,
+    which writers replace together under a short publish lock.
+    """
+    def __init__(
+        self,
+        path: Optional[str],
+        dim: int,
+        dtype: str = "float32",
+        ivf_min_points: int = 20000,
+        nprobe: int = 32,
+        max_segments: int = 8,
+        compact_deleted_ratio: float = 0.3,
+    ):
+        """
+        Args:
+            path (Optional[str]): Collection directory. In-memory only if None.
+            dim (int): Vector dimension.
+            dtype (str): "float32", or "int8" for 4x smaller (lossy) vectors.
+            ivf_min_points (int): Segments with at least this many rows get an IVF index.
+            nprobe (int): IVF lists scanned per query.
+            max_segments (int): Merge the smallest segments when there are more than this.
+            compact_deleted_ratio (float): Rewrite segments with more deleted rows than this.
+        """
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unknown vector dtype: {dtype}")
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        self.ivf_min_points = ivf_min_points
+        self.nprobe = nprobe
+        self.max_segments = max_segments
+        self.compact_deleted_ratio = compact_deleted_ratio
+        self.segments: List[Segment] = []
+        self.locations: Dict[Any, Tuple[Segment, int]] = {}
+        self.next_segment = 0
+        self._lock = threading.Lock()
+        # Held only to swap in, or snapshot, the segment list together with the deletion masks
+        self._publish_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, **settings) -> "EmbeddedCollection":
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        collection = cls(path, manifest["dim"], manifest["dtype"], **settings)
+        collection.next_segment = manifest["next_segment"]
+        collection.segments = [Segment.load(path, name) for name in manifest["segments"]]
+        touched = set()
+        for segment in collection.segments:
+            for row, point_id in enumerate(segment.ids):
+                if segment.deleted[row]:
+                    continue
+                # A crash after the manifest was written but before older rows were marked deleted
+                previous = collection.locations.get(point_id)
+                if previous is not None:
+                    previous[0].deleted[previous[1]] = True
+                    touched.add(previous[0])
+                collection.locations[point_id] = (segment, row)
+        for segment in touched:
+            segment.save_deleted(path)
+        return collection
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def _save_manifest(self):
+        if self.path is None:
+            return
+        manifest = {
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "next_segment": self.next_segment,
+            "segments": [segment.name for segment in self.segments],
+        }
+        path = os.path.join(self.path, "manifest.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def _new_segment(self, vectors: np.ndarray, ids: List[Any], payloads: List[Dict[str, Any]]) -> Segment:
+        segment = Segment.build(
+            f"{self.next_segment:08d}", vectors, ids, payloads, self.dtype, self.ivf_min_points
+        )
+        self.next_segment += 1
+        if self.path is not None:
+            segment.save(self.path)
+        return segment
+
+    def upsert(self, ids: List[Any], vectors, payloads: List[Dict[str, Any]]):
+        """
+        Add or replace points.
+
+        Args:
+            ids (List[Any]): Point IDs; the last occurrence wins within a call.
+            vectors: Array-like of shape (len(ids), dim); normalized here.
+            payloads (List[Dict[str, Any]]): Payload per point.
+        """
+        if not ids:
+            return
+        vectors = normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+        last = list({point_id: row for row, point_id in enumerate(ids)}.values())
+        if len(last) < len(ids):
+            ids = [ids[row] for row in last]
+            vectors = vectors[last]
+            payloads = [payloads[row] for row in last]
+
+        with self._lock:
+            segment = self._new_segment(vectors, list(ids), list(payloads))
+            # Replaced rows are masked in copies, published together with the new segment,
+            # so a concurrent search sees each point exactly once
+            masks: Dict[Segment, np.ndarray] = {}
+            for row, point_id in enumerate(segment.ids):
+                previous = self.locations.get(point_id)
+                if previous is not None:
+                    if previous[0] not in masks:
+                        masks[previous[0]] = previous[0].deleted.copy()
+                    masks[previous[0]][previous[1]] = True
+                self.locations[point_id] = (segment, row)
+            with self._publish_lock:
+                for old, mask in masks.items():
+                    old.deleted = mask
+                self.segments = self.segments + [segment]
+            self._save_manifest()
+            self._save_deleted(masks)
+            self._maybe_compact()
+
+    def delete(self, ids: List[Any]):
+        with self._lock:
+            touched = set()
+            for point_id in ids:
+                location = self.locations.pop(point_id, None)
+                if location is not None:
+                    location[0].deleted[location[1]] = True
+                    touched.add(location[0])
+            self._save_deleted(touched)
+            self._maybe_compact()
+
+    def set_payload(self, point_id: Any, payload: Dict[str, Any]):
+        with self._lock:
+            location = self.locations.get(point_id)
+            if location is None:
+                return
+            segment, row = location
+            segment.set_payload(row, payload)
+            if self.path is not None:
+                segment.save_payloads(self.path)
+
+    def _save_deleted(self, segments):
+        if self.path is not None:
+            for segment in segments:
+                segment.save_deleted(self.path)
+
+    def _maybe_compact(self):
+        """Pick segments to merge: mostly-deleted ones, then the smallest while there are too many."""
+        group = [s for s in self.segments if len(s) and 1 - s.live / len(s) > self.compact_deleted_ratio]
+        rest = sorted((s for s in self.segments if s not in group), key=lambda s: s.live)
+        if len(rest) + min(len(group), 1) > self.max_segments:
+            # Merging the smallest half keeps segment sizes roughly geometric
+            count = len(rest) - self.max_segments // 2 + 1
+            group += rest[:max(count, 2)]
+        if group:
+            self._merge(group)
+
+    def compact(self):
+        """Merge every segment into one, dropping deleted rows."""
+        with self._lock:
+            if len(self.segments) > 1 or any(segment.live < len(segment) for segment in self.segments):
+                self._merge(list(self.segments))
+
+    def _merge(self, group: List[Segment]):
+        # Keep the original write order so later segments still win on load
+        group = [segment for segment in self.segments if segment in group]
+        keep = [np.flatnonzero(~segment.deleted) for segment in group]
+        ids = [segment.ids[row] for segment, rows in zip(group, keep) for row in rows]
+        merged = None
+        if ids:
+            vectors = np.concatenate([segment.float_vectors(rows) for segment, rows in zip(group, keep)])
+            payloads = [segment.payloads[row] for segment, rows in zip(group, keep) for row in rows]
+            merged = self._new_segment(vectors, ids, payloads)
+        position = self.segments.index(group[0])
+        remaining = [segment for segment in self.segments if segment not in group]
+        with self._publish_lock:
+            self.segments = remaining[:position] + ([merged] if merged is not None else []) + remaining[position:]
+        if merged is not None:
+            for row, point_id in enumerate(merged.ids):
+                self.locations[point_id] = (merged, row)
+        self._save_manifest()
+        if self.path is not None:
+            for segment in group:
+                segment.remove_files(self.path)
+
+    def search(self, queries, limit: int, query_filter: Optional[models.Filter] = None) -> List[List[Tuple[float, Segment, int]]]:
+        """
+        Top `limit` (score, segment, row) per query across all segments.
+        """
+        queries = normalize(queries)
+        with self._publish_lock:
+            snapshot = [(segment, segment.deleted) for segment in self.segments]
+        per_query: List[List[Tuple[float, Segment, int]]] = [[] for _ in queries]
+        for segment, deleted in snapshot:
+            allowed = segment.filter_mask(query_filter) if query_filter is not None else None
+            for hits, (rows, scores) in zip(per_query, segment.search(queries, limit, allowed, self.nprobe, deleted)):
+                hits.extend(zip(scores.tolist(), [segment] * len(rows), rows.tolist()))
+        return [heapq.nlargest(limit, hits, key=lambda hit: hit[0]) for hits in per_query]
+
+class EmbeddedVectorStore:
+    """
+    In-process vector store that answers the Qdrant client calls `RAGPipeline` makes.
+
+    This is the storage backend interface: `get_collections`,
+    `collection_exists`, `create_collection`, `create_payload_index`,
+    `upsert`, `upload_collection`, `delete`, `batch_update_points`,
+    `retrieve`, `scroll`, `query_points` and `query_batch_points`, with Qdrant's
+    request and response models. Vectors are compared by cosine similarity.
+    HNSW, quantization and search-parameter settings are ignored; payload
+    filters are evaluated with in-memory indexes built on first use.
+    Payloads are held in memory, so the store targets up to a few hundred
+    thousand chunks per process.
+
+    Segment lists and point locations live in this process only, so a store
+    directory can be opened by one process at a time; a second one fails
+    fast instead of overwriting the first one's segments.
+    """
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        ivf_min_points: int = 20000,
+        nprobe: int = 32,
+        max_segments: int = 8,
+    ):
+        """
+        Args:
+            path (Optional[str]): Directory holding one subdirectory per collection. In-memory only if None.
+            dtype (str): Vector storage type for new collections, "float32" or "int8".
+            ivf_min_points (int): Segments with at least this many points are searched approximately (IVF).
+            nprobe (int): IVF lists scanned per query; higher is slower and more accurate.
+            max_segments (int): Segments per collection before the smallest are merged.
+        """
+        self.path = path
+        self.dtype = dtype
+        self.settings = {"ivf_min_points": ivf_min_points, "nprobe": nprobe, "max_segments": max_segments}
+        self.collections: Dict[str, EmbeddedCollection] = {}
+        self._lock = threading.Lock()
+        self._lock_file = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._lock_file = open(os.path.join(path, LOCK_FILE), "a")
+            try:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                raise RuntimeError(
+                    f"Embedded vector store {path} is open in another process; "
+                    "run a single worker with VECTOR_BACKEND=embedded"
+                )
+            for name in sorted(os.listdir(path)):
+                if os.path.exists(os.path.join(path, name, "manifest.json")):
+                    self.collections[name] = EmbeddedCollection.load(os.path.join(path, name), **self.settings)
+
+    def _collection(self, collection_name: str) -> EmbeddedCollection:
+        collection = self.collections.get(collection_name)
+        if collection is None:
+            raise ValueError(f"Collection {collection_name} not found")
+        return collection
+
+    def get_collections(self) -> models.CollectionsResponse:
+        return models.CollectionsResponse(
+            collections=[models.CollectionDescription(name=name) for name in self.collections]
+        )
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return collection_name in self.collections
+
+    def create_collection(self, collection_name: str, vectors_config: models.VectorParams, **kwargs) -> bool:
+        if vectors_config.distance != models.Distance.COSINE:
+            raise ValueError(f"Only cosine distance is supported, got {vectors_config.distance}")
+        with self._lock:
+            if collection_name in self.collections:
+                raise ValueError(f"Collection {collection_name} already exists")
+            path = None
+            if self.path is not None:
+                path = os.path.join(self.path, collection_name)
+                os.makedirs(path, exist_ok=True)
+            collection = EmbeddedCollection(path, vectors_config.size, self.dtype, **self.settings)
+            collection._save_manifest()
+            self.collections[collection_name] = collection
+        return True
+
+    def delete_collection(self, collection_name: str) -> bool:
+        with self._lock:
+            collection = self.collections.pop(collection_name, None)
+        if collection is not None and collection.path is not None:
+            shutil.rmtree(collection.path, ignore_errors=True)
+        return collection is not None
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs):
+        """No-op: filter indexes are built in memory when a filter first uses the field."""
+        self._collection(collection_name)
+
+    def count(self, collection_name: str, **kwargs) -> models.CountResult:
+        return models.CountResult(count=len(self._collection(collection_name)))
+
+    def upsert(self, collection_name: str, points: List[models.PointStruct], wait: bool = True, **kwargs):
+        self._collection(collection_name).upsert(
+            [point.id for point in points],
+            [point.vector for point in points],
+            [point.payload or {} for point in points],
+        )
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def upload_collection(
+        self,
+        collection_name: str,
+        vectors,
+        payload: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[Any]] = None,
+        **kwargs,
+    ):
+        """Write all vectors as one segment (`batch_size`, retries etc. don't apply in-process)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+        if payload is None:
+            payload = [{} for _ in range(len(vectors))]
+        self._collection(collection_name).upsert(list(ids), vectors, list(payload))
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs):
+        ids = points_selector.points if isinstance(points_selector, models.PointIdsList) else points_selector
+        self._collection(collection_name).delete(list(ids))
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def set_payload(self, collection_name: str, payload: Dict[str, Any], points: List[Any], **kwargs):
+        collection = self._collection(collection_name)
+        for point_id in points:
+            collection.set_payload(point_id, payload)
+
+    def batch_update_points(self, collection_name: str, update_operations: list, wait: bool = True, **kwargs):
+        for operation in update_operations:
+            if not isinstance(operation, models.SetPayloadOperation):
+                raise ValueError(f"Unsupported update operation: {type(operation).__name__}")
+            self.set_payload(collection_name, operation.set_payload.payload, operation.set_payload.points)
+        return [models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED) for _ in update_operations]
+
+    def retrieve(self, collection_name: str, ids: List[Any], **kwargs) -> List[models.Record]:
+        collection = self._collection(collection_name)
+        records = []
+        for point_id in ids:
+            location = collection.locations.get(point_id)
+            if location is not None:
+                segment, row = location
+                records.append(models.Record(id=point_id, payload=segment.payloads[row]))
+        return records
+
+    def scroll(self, collection_name: str, limit: int = 10, offset: Any = None, **kwargs) -> Tuple[List[models.Record], Any]:
+        """All points in one page (`limit` and `offset` don't apply in-process); vectors are not returned."""
+        locations = list(self._collection(collection_name).locations.items())
+        return [models.Record(id=point_id, payload=segment.payloads[row]) for point_id, (segment, row) in locations], None
+
+    def query_points(
+        self,
+        collection_name: str,
+        query,
+        query_filter: Optional[models.Filter] = None,
+        limit: int = 10,
+        **kwargs,
+    ) -> models.QueryResponse:
+        hits = self._collection(collection_name).search([query], limit, query_filter)[0]
+        return models.QueryResponse(points=self._scored_points(hits))
+
+    def query_batch_points(self, collection_name: str, requests: List[models.QueryRequest], **kwargs) -> List[models.QueryResponse]:
+        """Requests sharing a filter are scored together as one matrix product."""
+        collection = self._collection(collection_name)
+        groups: Dict[str, List[int]] = {}
+        for position, request in enumerate(requests):
+            key = request.filter.model_dump_json() if request.filter is not None else ""
+            groups.setdefault(key, []).append(position)
+
+        responses: List[Optional[models.QueryResponse]] = [None] * len(requests)
+        for positions in groups.values():
+            limit = max(requests[position].limit or 10 for position in positions)
+            hits = collection.search(
+                [requests[position].query for position in positions], limit, requests[positions[0]].filter
+            )
+            for position, query_hits in zip(positions, hits):
+                responses[position] = models.QueryResponse(
+                    points=self._scored_points(query_hits[:requests[position].limit or 10])
+                )
+        return responses
+
+    def compact(self, collection_name: str):
+        """Merge a collection's segments into one, dropping deleted points."""
+        self._collection(collection_name).compact()
+
+    @staticmethod
+    def _scored_points(hits: List[Tuple[float, Segment, int]]) -> List[models.ScoredPoint]:
+        return [
+            models.ScoredPoint(id=segment.ids[row], version=0, score=score, payload=segment.payloads[row])
+            for score, segment, row in hits
+        ]
+
+    def close(self):
+        """Release the store directory for other processes."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+class ThreadedAsyncQdrant:
+    """
+    `AsyncQdrantClient` stand-in that runs a sync client's methods in worker threads.
+
+    Used for the embedded store, so NumPy search doesn't block the event loop,
+    and by the benchmarks: `QdrantClient(":memory:")` and
+    `AsyncQdrantClient(":memory:")` keep separate stores, so wrapping the sync
+    client lets the async query path see points written by sync ingestion.
+    """
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+def embedded_store_from_env() -> EmbeddedVectorStore:
+    """
+    Store configured by EMBEDDED_INDEX_DIR (":memory:" for no persistence) and EMBEDDED_* settings.
+    """
+    path = os.getenv("EMBEDDED_INDEX_DIR", "vector_index")
+    return EmbeddedVectorStore(
+        path=None if path == ":memory:" else path,
+        dtype=os.getenv("EMBEDDED_VECTOR_DTYPE", "float32"),
+        ivf_min_points=int(os.getenv("EMBEDDED_IVF_MIN_POINTS", 20000)),
+        nprobe=int(os.getenv("EMBEDDED_IVF_NPROBE", 32)),
+        max_segments=int(os.getenv("EMBEDDED_MAX_SEGMENTS", 8)),
+    )